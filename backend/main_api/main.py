@@ -8,6 +8,7 @@ from fastapi import FastAPI, UploadFile, File
 import time
 import logging
 from pydantic import BaseModel
+from typing import Literal, Optional
 import uuid
 import httpx
 from fastapi.responses import StreamingResponse
@@ -17,6 +18,8 @@ from fastapi import UploadFile, File, HTTPException, Form
 from fastapi import FastAPI, HTTPException, Query, Request, Response
 from outline_client import A2AOutlineClientWrapper
 from content_client import A2AContentClientWrapper
+import a2a_client_pool
+import metrics
 
 logger = logging.getLogger(__name__)
 dotenv.load_dotenv()
@@ -42,6 +45,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup():
+    # 预先获取Agent的AgentCard，第一次请求不再需要额外的往返
+    await a2a_client_pool.warmup([OUTLINE_API, CONTENT_API])
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await a2a_client_pool.shutdown()
+
 class AipptRequest(BaseModel):
     content: str
     language: str
@@ -50,11 +63,26 @@ class AipptRequest(BaseModel):
 
 async def stream_agent_response(prompt: str, language: str = "chinese"):
     """A generator that yields parts of the agent response."""
+    start_time = time.perf_counter()
+    has_text = False
     outline_wrapper = A2AOutlineClientWrapper(session_id=uuid.uuid4().hex, agent_url=OUTLINE_API)
     async for chunk_data in outline_wrapper.generate(prompt, language=language):
         logger.info(f"生成大纲输出的chunk_data: {chunk_data}")
         if chunk_data["type"] == "text":
-            yield chunk_data["text"]
+            text = chunk_data["text"]
+        elif chunk_data["type"] == "artifact" and not has_text:
+            # 非流式模式下，大纲只在最终的artifact中返回
+            text = chunk_data["text"]
+        else:
+            continue
+        if not text:
+            continue
+        if not has_text:
+            has_text = True
+            ttfb = time.perf_counter() - start_time
+            metrics.observe("outline_ttfb", ttfb)
+            logger.info(f"大纲首个token耗时: {ttfb:.3f}s")
+        yield text
 
 
 @app.post("/tools/aippt_outline")
@@ -74,7 +102,7 @@ async def aippt_outline_from_file(
     language: str = Form("chinese"),  # 添加language参数，默认为chinese
 ):
     """
-    对齐 personaldb 的 /upload/：
+    对齐 personaldb 的 /upload/ 和 /convert：
     - 必填: userId, fileId
     - 可选: folderId (默认0), fileType
     - file 与 url 互斥，至少一个
@@ -111,19 +139,24 @@ async def aippt_outline_from_file(
 
     files_payload = None
     if has_file:
-        # 读取一次到内存，httpx 需要 (filename, bytes/obj, content_type)
-        file_bytes = await file.read()
-        if not file_bytes:
+        # 上传内容已由FastAPI写入SpooledTemporaryFile(大文件落盘)，直接把文件对象交给 httpx，
+        # 按块流式发送 multipart，不把整个文件读入内存
+        file.file.seek(0, os.SEEK_END)
+        file_size = file.file.tell()
+        file.file.seek(0)
+        if not file_size:
             raise HTTPException(status_code=400, detail="文件内容为空")
+        logger.info(f"转发上传文件到 personaldb: {file.filename}, 大小: {file_size} 字节")
         files_payload = {
             "file": (
                 file.filename or "uploaded_file",
-                file_bytes,
+                file.file,
                 file.content_type or "application/octet-stream",
             )
         }
 
-    upload_url = f"{personaldb_api_url.rstrip('/')}/upload/"
+    # /convert 转换完成即返回markdown，向量化在 personaldb 后台继续执行，大纲生成不必等待向量化
+    upload_url = f"{personaldb_api_url.rstrip('/')}/convert"
 
     async with httpx.AsyncClient() as client:
         try:
@@ -166,8 +199,9 @@ class AipptContentRequest(BaseModel):
     sessionId: str = ""  # 当使用知识库时，需要根据用户的user_id查询对应的知识库
     generateFromUploadedFile: bool = False  # 是否从上传的文件中生成PPT内容
     generateFromWebSearch: bool = True  # 是否从网络搜索中生成PPT内容
+    emitMode: Optional[Literal["ordered", "ready"]] = None  # 幻灯片输出模式，ordered按页码顺序，ready每页完成即返回(带slide_index)，为空时使用Agent的默认配置
 
-async def stream_content_response(markdown_content: str, language, generateFromUploadedFile, generateFromWebSearch, user_id):
+async def stream_content_response(markdown_content: str, language, generateFromUploadedFile, generateFromWebSearch, user_id, emit_mode=None):
     match = re.search(r"(# .*)", markdown_content, flags=re.DOTALL)
     result = markdown_content[match.start():] if match else markdown_content
     logger.info(f"用户输入的markdown大纲是：{result}")
@@ -181,9 +215,13 @@ async def stream_content_response(markdown_content: str, language, generateFromU
         search_engine.append("DocumentSearch")
 
     metadata = {"user_id": user_id, "search_engine": search_engine, "language": language}
+    if emit_mode:
+        metadata["emit_mode"] = emit_mode
     logger.info(f"前端*内容**=====>metadata数据为：{metadata}")
 
     last_flush = asyncio.get_event_loop().time()
+    start_time = time.perf_counter()
+    first_slide = True
 
     async for chunk_data in content_wrapper.generate(user_question=result, metadata=metadata):
         logger.info(f"生成正文输出的chunk_data: {chunk_data}")
@@ -195,6 +233,11 @@ async def stream_content_response(markdown_content: str, language, generateFromU
             last_flush = now
 
         if chunk_data.get("type") == "text":
+            if first_slide:
+                first_slide = False
+                ttfb = time.perf_counter() - start_time
+                metrics.observe("content_first_slide", ttfb)
+                logger.info(f"首页幻灯片耗时: {ttfb:.3f}s")
             # 注意：每条 SSE 事件以空行结束
             payload = chunk_data["text"]
             yield f"data: {payload}\n\n".encode("utf-8")
@@ -214,7 +257,8 @@ async def aippt_content(request: AipptContentRequest):
             language=request.language,
             generateFromUploadedFile=request.generateFromUploadedFile,
             generateFromWebSearch=request.generateFromWebSearch,
-            user_id=user_id
+            user_id=user_id,
+            emit_mode=request.emitMode
         ):
             yield chunk
 
@@ -308,18 +352,20 @@ async def aippt_by_id(request: AipptByIDRequest):
 
 
 @app.get("/files/{user_id}")
-async def list_user_files(user_id: int):
+async def list_user_files(user_id: int, response: Response, offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
     """
-    列出指定用户的所有文件信息
+    分页列出指定用户的文件信息，文件总数在响应头 X-Total-Count 中
     """
     personaldb_api_url = os.environ["PERSONAL_DB"]
     url = f"{personaldb_api_url}/files/{user_id}"
 
     async with httpx.AsyncClient() as client:
         try:
-            response = await client.get(url)
-            response.raise_for_status()
-            return response.json()
+            db_response = await client.get(url, params={"offset": offset, "limit": limit})
+            db_response.raise_for_status()
+            if "X-Total-Count" in db_response.headers:
+                response.headers["X-Total-Count"] = db_response.headers["X-Total-Count"]
+            return db_response.json()
         except httpx.RequestError as exc:
             raise HTTPException(status_code=500, detail=f"Error connecting to personaldb: {exc}")
         except httpx.HTTPStatusError as exc:
@@ -381,6 +427,12 @@ def healthz():
     return {"ok": True}
 
 
+@app.get("/metrics")
+def get_metrics():
+    """首字节耗时等指标，单位秒"""
+    return metrics.snapshot()
+
+
 if __name__ == "__main__":
     import uvicorn
     host = os.environ.get("HOST", "0.0.0.0")
@@ -0,0 +1,55 @@
+"""
+进程内的简单延迟指标，记录最近的若干次耗时，通过 /metrics 接口查看
+"""
+import threading
+from collections import deque
+from typing import Deque, Dict
+
+
+class LatencyRecorder:
+    """记录最近 window 次的耗时（秒），计算平均值和分位数"""
+
+    def __init__(self, window: int = 500):
+        self._values: Deque[float] = deque(maxlen=window)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._values.append(seconds)
+            self._count += 1
+
+    def summary(self) -> Dict[str, float]:
+        with self._lock:
+            values = sorted(self._values)
+            count = self._count
+        if not values:
+            return {"count": count}
+
+        def percentile(p: float) -> float:
+            return round(values[min(len(values) - 1, int(p * len(values)))], 4)
+
+        return {
+            "count": count,
+            "avg": round(sum(values) / len(values), 4),
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "max": round(values[-1], 4),
+        }
+
+
+_recorders: Dict[str, LatencyRecorder] = {}
+
+
+def get_recorder(name: str) -> LatencyRecorder:
+    if name not in _recorders:
+        _recorders[name] = LatencyRecorder()
+    return _recorders[name]
+
+
+def observe(name: str, seconds: float) -> None:
+    get_recorder(name).observe(seconds)
+
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    return {name: recorder.summary() for name, recorder in _recorders.items()}
@@ -4,8 +4,13 @@
 
 from .document_processor import DocumentProcessor
 from .file_cache_manager import FileCacheManager
+from .embedding_cache import EmbeddingCache
+from .embedding_dispatcher import EmbeddingDispatcher, EmbeddingDispatchError
 
 __all__ = [
     "DocumentProcessor",
     "FileCacheManager",
+    "EmbeddingCache",
+    "EmbeddingDispatcher",
+    "EmbeddingDispatchError",
 ]
@@ -23,7 +23,7 @@ from .chunkers import (
     DocumentChunk
 )
 from .markitdown_converter import MarkItDownConverter
-from .file_cache_manager import FileCacheManager
+from .file_cache_manager import FileCacheManager, package_version
 
 logger = logging.getLogger(__name__)
 
@@ -87,10 +87,16 @@ class DocumentProcessor:
             # 根据use_magic_pdf确定处理模式
             if processing_mode is None:
                 processing_mode = "magic_pdf" if use_magic_pdf else "markitdown"
+            # DocumentProcessor缓存的是清理后的内容，与MarkItDownConverter的原始转换结果使用不同的缓存键
             self._cache_manager = FileCacheManager(
                 cache_dir=cache_dir,
                 cache_ttl_hours=cache_ttl_hours,
-                processing_mode=processing_mode
+                processing_mode=processing_mode,
+                options={
+                    "converter": "DocumentProcessor",
+                    "markitdown": package_version("markitdown"),
+                    "use_magic_pdf": use_magic_pdf,
+                }
             )
 
         # 创建temp目录
@@ -0,0 +1,92 @@
+"""
+向量缓存 - 按单条文本缓存embedding结果
+键为 hash(模型, 维度, 文本)，值为float32向量，存储在SQLite中。
+同一文档重复上传、不同文档包含相同的分块时，只需要对未命中的文本调用向量模型。
+"""
+
+import os
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# SQLite单条语句的参数个数有限制，批量查询时分批
+_SQLITE_MAX_VARIABLES = 500
+
+
+class EmbeddingCache:
+    """基于SQLite的单条文本向量缓存，线程安全"""
+
+    def __init__(self, db_path: str = "cache/embedding_cache.sqlite"):
+        """
+        Args:
+            db_path: SQLite文件路径
+        """
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, "
+            "dim INTEGER NOT NULL, "
+            "vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        logger.info(f"向量缓存初始化完成，缓存文件: {db_path}")
+
+    @staticmethod
+    def make_key(model: str, dimensions: Optional[int], text: str) -> bytes:
+        """计算缓存键，模型或维度不同的向量互不混用"""
+        return hashlib.sha256(f"{model}\x00{dimensions or 0}\x00{text}".encode("utf-8")).digest()
+
+    def get_many(self, keys: Sequence[bytes]) -> Dict[bytes, List[float]]:
+        """批量查询，返回命中的 {key: 向量}"""
+        result: Dict[bytes, List[float]] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            for i in range(0, len(unique_keys), _SQLITE_MAX_VARIABLES):
+                batch = unique_keys[i:i + _SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, vector in rows:
+                    result[bytes(key)] = np.frombuffer(vector, dtype=np.float32).tolist()
+            self.hits += len(result)
+            self.misses += len(unique_keys) - len(result)
+        return result
+
+    def put_many(self, items: Iterable[Tuple[bytes, Sequence[float]]]) -> None:
+        """批量写入 (key, 向量)"""
+        rows = []
+        for key, vector in items:
+            array = np.asarray(vector, dtype=np.float32)
+            rows.append((key, int(array.shape[0]), array.tobytes()))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": self.count()}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
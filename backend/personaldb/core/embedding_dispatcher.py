@@ -0,0 +1,160 @@
+"""
+向量请求调度器 - 多线程并发请求向量模型
+- 按提供方的批大小分批，多个批次并发请求
+- 并发窗口使用AIMD调整：请求成功且延迟正常时缓慢增大，遇到限流(429)或延迟过高时减半
+- 失败的批次按指数退避重试，重试次数用完后抛出异常，不会静默丢失向量
+"""
+
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 各提供方单次请求的默认批大小
+DEFAULT_BATCH_SIZES = {
+    "aliyun": 10,
+    "doubao": 16,
+    "vllm": 64,
+    "xinference": 32,
+    "ollama": 8,
+    "local": 32,
+}
+
+
+class EmbeddingDispatchError(RuntimeError):
+    """某个批次重试后仍然失败"""
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """判断是否是限流错误，OpenAI兼容接口的异常带有status_code，其它实现通过错误信息判断"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        response = getattr(error, "response", None)
+        status_code = getattr(response, "status_code", None)
+    if status_code == 429:
+        return True
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message or "too many requests" in message
+
+
+class EmbeddingDispatcher:
+    """并发、自适应的分批向量请求"""
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], List[List[float]]],
+        batch_size: int = 10,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        latency_target: float = 10.0,
+    ):
+        """
+        Args:
+            embed_batch: 对一批文本进行embedding，返回与输入对齐的向量列表
+            batch_size: 单次请求的文本数
+            max_concurrency: 最大并发请求数，也是AIMD窗口的上限
+            max_retries: 单个批次的最大重试次数
+            backoff_base: 退避的基础时间（秒），第n次重试等待 backoff_base * 2^(n-1)，带随机抖动
+            backoff_max: 单次退避的最长时间（秒）
+            latency_target: 单批请求的期望耗时（秒），超过时视为后端压力过大，减小并发窗口
+        """
+        self.embed_batch = embed_batch
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.latency_target = latency_target
+        # 并发窗口在多次调用之间保持，限流状态可以延续到下一个文档
+        self._window = float(self.max_concurrency)
+        self._lock = threading.Lock()
+
+    @property
+    def window(self) -> int:
+        return max(1, int(self._window))
+
+    def _on_success(self, latency: float) -> None:
+        with self._lock:
+            if latency > self.latency_target:
+                self._window = max(1.0, self._window / 2)
+                logger.warning(f"向量请求耗时{latency:.1f}s，超过{self.latency_target}s，并发窗口降为{self.window}")
+            else:
+                # 每个窗口的请求都成功后，窗口大约增加1
+                self._window = min(float(self.max_concurrency), self._window + 1 / self._window)
+
+    def _on_rate_limited(self) -> None:
+        with self._lock:
+            self._window = max(1.0, self._window / 2)
+            logger.warning(f"向量模型限流，并发窗口降为{self.window}")
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return delay * (0.5 + random.random() / 2)
+
+    def _call(self, batch: List[str]) -> Tuple[List[List[float]], float]:
+        start = time.monotonic()
+        vectors = self.embed_batch(batch)
+        if len(vectors) != len(batch):
+            raise EmbeddingDispatchError(f"向量模型返回{len(vectors)}个向量，但输入了{len(batch)}个文本")
+        return vectors, time.monotonic() - start
+
+    def embed(self, texts: Sequence[str], progress_callback: Optional[Callable[[int, int], None]] = None) -> List[List[float]]:
+        """
+        对所有文本进行embedding，返回与texts对齐的向量；有批次最终失败时抛出EmbeddingDispatchError
+        progress_callback: 每完成一个批次调用一次 progress_callback(已完成数, 总数)
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        # 待请求的批次: (可以开始的时间, 起始位置, 已重试次数)
+        pending: List[Tuple[float, int, int]] = [(0.0, start, 0) for start in range(0, len(texts), self.batch_size)]
+        batch_num = len(pending)
+        in_flight: Dict[Future, Tuple[int, int]] = {}
+        done_num = 0
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="embedding") as pool:
+            try:
+                while pending or in_flight:
+                    now = time.monotonic()
+                    pending.sort()
+                    while pending and len(in_flight) < self.window and pending[0][0] <= now:
+                        _, start, attempt = pending.pop(0)
+                        future = pool.submit(self._call, texts[start:start + self.batch_size])
+                        in_flight[future] = (start, attempt)
+                    if not in_flight:
+                        # 都在退避等待中
+                        time.sleep(max(0.0, pending[0][0] - now))
+                        continue
+                    # 窗口未满时，最多等到下一个退避中的批次可以开始；窗口已满时等待有请求完成
+                    timeout = max(0.0, pending[0][0] - now) if pending and len(in_flight) < self.window else None
+                    done, _ = wait(list(in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        start, attempt = in_flight.pop(future)
+                        batch_index = start // self.batch_size + 1
+                        try:
+                            vectors, latency = future.result()
+                        except Exception as e:
+                            if is_rate_limited(e):
+                                self._on_rate_limited()
+                            if attempt >= self.max_retries:
+                                raise EmbeddingDispatchError(f"嵌入批次 {batch_index}/{batch_num} 重试{attempt}次后仍然失败: {e}") from e
+                            delay = self._backoff(attempt + 1)
+                            logger.warning(f"嵌入批次 {batch_index}/{batch_num} 失败，{delay:.1f}s后第{attempt + 1}次重试: {e}")
+                            pending.append((time.monotonic() + delay, start, attempt + 1))
+                            continue
+                        self._on_success(latency)
+                        results[start:start + len(vectors)] = vectors
+                        done_num += len(vectors)
+                        if progress_callback is not None:
+                            progress_callback(done_num, len(texts))
+                        logger.info(f"成功嵌入批次 {batch_index}/{batch_num}，包含 {len(vectors)} 个文本，耗时{latency:.2f}s，并发窗口{self.window}")
+            finally:
+                for future in in_flight:
+                    future.cancel()
+        return results
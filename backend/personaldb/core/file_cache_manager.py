@@ -1,36 +1,169 @@
 """
-文件缓存管理器 - 基于MD5哈希值缓存文件处理结果
+文件缓存管理器 - 按文件内容寻址的转换结果缓存
+缓存键为 文件MD5 + 转换器/版本/参数的摘要，与文件路径无关，同一个文件重复上传时直接使用缓存。
+- 内存热层：同一进程内按字节数限制的LRU，命中时不读磁盘
+- 磁盘层：markdown文件 + SQLite索引(键、大小、缓存时间、最近访问时间、元数据)，
+  查找只查索引，不解析JSON、不遍历目录；过期清理和容量淘汰都通过索引完成
 """
 
 import os
 import json
+import time
+import sqlite3
 import hashlib
 import tempfile
 import shutil
 import logging
+import threading
+from collections import OrderedDict
+from importlib import metadata as importlib_metadata
 from pathlib import Path
 from typing import Optional, Tuple, Dict, Any
-from datetime import datetime, timedelta
+from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# 计算文件哈希时每次读取的字节数
+HASH_BUFFER_SIZE = 1024 * 1024
+
+
+def package_version(name: str) -> str:
+    """获取已安装包的版本，用于区分不同版本转换器的缓存，未安装时返回unknown"""
+    try:
+        return importlib_metadata.version(name)
+    except importlib_metadata.PackageNotFoundError:
+        return "unknown"
+
+
+class _MemoryTier:
+    """进程内的转换结果LRU，按markdown的字符数限制大小，线程安全"""
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self._items: "OrderedDict[str, Tuple[str, Dict[str, Any]]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item
+
+    def put(self, key: str, content: str, metadata: Dict[str, Any]) -> None:
+        if len(content) > self.max_chars:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0])
+            self._items[key] = (content, metadata)
+            self._size += len(content)
+            while self._size > self.max_chars:
+                _, (evicted, _) = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0])
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._items), "chars": self._size, "hits": self.hits, "misses": self.misses}
+
+
+# 同一缓存目录的所有FileCacheManager实例共享一个内存热层（转换器通常每次调用都会新建）
+_memory_tiers: Dict[str, _MemoryTier] = {}
+_memory_tiers_lock = threading.Lock()
+
+
+def _get_memory_tier(cache_dir: str, max_chars: int) -> _MemoryTier:
+    with _memory_tiers_lock:
+        tier = _memory_tiers.get(cache_dir)
+        if tier is None:
+            tier = _memory_tiers[cache_dir] = _MemoryTier(max_chars)
+        return tier
+
+
+class _CacheIndex:
+    """缓存目录的SQLite索引，同一进程内同一目录共享一个连接，多进程通过WAL并发访问"""
+
+    def __init__(self, db_path: Path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, "
+            "size INTEGER NOT NULL, "
+            "cached_at REAL NOT NULL, "
+            "last_access REAL NOT NULL, "
+            "markdown_path TEXT NOT NULL, "
+            "backup_path TEXT, "
+            "metadata TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_cached_at ON entries (cached_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+        self._conn.commit()
+
+    def execute(self, sql: str, params: tuple = (), commit: bool = False) -> list:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            if commit:
+                self._conn.commit()
+            return rows
+
+
+_indexes: Dict[str, _CacheIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def _get_index(cache_dir: Path) -> _CacheIndex:
+    with _indexes_lock:
+        index = _indexes.get(str(cache_dir))
+        if index is None:
+            index = _indexes[str(cache_dir)] = _CacheIndex(cache_dir / "index.sqlite")
+        return index
+
 
 class FileCacheManager:
     """文件缓存管理器，用于缓存文件处理结果"""
     
-    def __init__(self, cache_dir: Optional[str] = None, cache_ttl_hours: int = 24 * 7, processing_mode: Optional[str] = None):
+    def __init__(self, cache_dir: Optional[str] = None, cache_ttl_hours: int = 24 * 7, processing_mode: Optional[str] = None,
+                 options: Optional[Dict[str, Any]] = None, max_size_mb: Optional[int] = None,
+                 memory_size_mb: Optional[int] = None):
         """
         初始化文件缓存管理器
 
         Args:
-            cache_dir: 缓存目录，默认为系统临时目录下的summeryanyfile_cache
+            cache_dir: 缓存目录，默认为环境变量CONVERSION_CACHE_DIR，未设置时为系统临时目录下的summeryanyfile_cache
             cache_ttl_hours: 缓存过期时间（小时），默认7天
             processing_mode: 处理模式（如markitdown、magic_pdf等），用于分离不同模式的缓存
+            options: 转换器名称、版本和参数，参与计算缓存键，任何一项变化都不会命中旧的结果
+            max_size_mb: 磁盘缓存的容量上限（MB），超过后按最近访问时间淘汰，默认为环境变量CONVERSION_CACHE_MAX_MB或1024
+            memory_size_mb: 内存热层的大小（MB），默认为环境变量CONVERSION_CACHE_MEMORY_MB或64，为0时不使用
         """
         self.cache_ttl_hours = cache_ttl_hours
         self.processing_mode = processing_mode or "default"
+        self.options = options or {}
+        # 转换器/版本/参数的摘要，作为缓存键的后缀
+        self.variant = hashlib.md5(json.dumps(self.options, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:12] if self.options else ""
+        if max_size_mb is None:
+            max_size_mb = int(os.environ.get("CONVERSION_CACHE_MAX_MB", "1024"))
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        if memory_size_mb is None:
+            memory_size_mb = int(os.environ.get("CONVERSION_CACHE_MEMORY_MB", "64"))
 
         # 设置缓存目录
+        cache_dir = cache_dir or os.environ.get("CONVERSION_CACHE_DIR")
         if cache_dir:
             self.cache_dir = Path(cache_dir)
         else:
@@ -40,20 +173,28 @@ class FileCacheManager:
         if self.processing_mode != "default":
             self.cache_dir = self.cache_dir / self.processing_mode
 
-        # 创建缓存目录结构
+        # 创建缓存目录结构，metadata目录只用于导入旧版本的JSON元数据
         self.files_cache_dir = self.cache_dir / "files"
         self.markdown_cache_dir = self.cache_dir / "markdown"
         self.metadata_cache_dir = self.cache_dir / "metadata"
 
         # 确保目录存在
-        for dir_path in [self.files_cache_dir, self.markdown_cache_dir, self.metadata_cache_dir]:
+        for dir_path in [self.files_cache_dir, self.markdown_cache_dir]:
             dir_path.mkdir(parents=True, exist_ok=True)
 
+        self._index = _get_index(self.cache_dir)
+        self._import_legacy_metadata()
+
+        # markdown按字符计，中文约3字节，这里按字符数近似限制
+        self._memory = _get_memory_tier(str(self.cache_dir), memory_size_mb * 1024 * 1024) if memory_size_mb > 0 else None
+        # 已计算过的文件哈希: (路径, 大小, 修改时间) -> MD5，同一个文件只读一遍
+        self._hash_memo: Dict[Tuple[str, int, int], str] = {}
+
         logger.info(f"文件缓存管理器初始化完成，缓存目录: {self.cache_dir}，处理模式: {self.processing_mode}")
     
     def calculate_file_md5(self, file_path: str) -> str:
         """
-        计算文件的MD5哈希值
+        计算文件的MD5哈希值，使用1MB的缓冲区一次读完，同一个未修改的文件只计算一次
         
         Args:
             file_path: 文件路径
@@ -61,15 +202,26 @@ class FileCacheManager:
         Returns:
             MD5哈希值字符串
         """
-        hash_md5 = hashlib.md5()
-        
         try:
-            with open(file_path, "rb") as f:
-                # 分块读取文件以处理大文件
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
+            stat = os.stat(file_path)
+            memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+            md5_hash = self._hash_memo.get(memo_key)
+            if md5_hash:
+                return md5_hash
+
+            hash_md5 = hashlib.md5()
+            buffer = bytearray(HASH_BUFFER_SIZE)
+            view = memoryview(buffer)
+            with open(file_path, "rb", buffering=0) as f:
+                # 读入同一块缓冲区，大文件也不会反复分配内存
+                while True:
+                    n = f.readinto(buffer)
+                    if not n:
+                        break
+                    hash_md5.update(view[:n])
             
             md5_hash = hash_md5.hexdigest()
+            self._hash_memo[memo_key] = md5_hash
             logger.debug(f"文件 {file_path} 的MD5: {md5_hash}")
             return md5_hash
             
@@ -77,83 +229,83 @@ class FileCacheManager:
             logger.error(f"计算文件MD5失败 {file_path}: {e}")
             raise
     
-    def is_cached(self, file_path: str) -> Tuple[bool, Optional[str]]:
+    def cache_key(self, md5_hash: str) -> str:
+        """文件MD5加上转换器/版本/参数的摘要"""
+        return f"{md5_hash}_{self.variant}" if self.variant else md5_hash
+
+    @property
+    def ttl_seconds(self) -> float:
+        return self.cache_ttl_hours * 3600
+
+    def is_cached(self, file_path: str, md5_hash: Optional[str] = None) -> Tuple[bool, Optional[str]]:
         """
-        检查文件是否已缓存且未过期
+        检查文件是否已缓存且未过期，只查询索引，不读取元数据文件
         
         Args:
             file_path: 文件路径
+            md5_hash: 已知的文件MD5（例如下载时已经计算），传入时不再读取文件计算
             
         Returns:
-            (是否已缓存, MD5哈希值)
+            (是否已缓存, 缓存键)，缓存键传给get_cached_content和save_to_cache
         """
         try:
-            md5_hash = self.calculate_file_md5(file_path)
-            
-            # 检查元数据文件是否存在
-            metadata_file = self.metadata_cache_dir / f"{md5_hash}.json"
-            if not metadata_file.exists():
+            md5_hash = self.cache_key(md5_hash or self.calculate_file_md5(file_path))
+            if self._memory is not None:
+                item = self._memory.get(md5_hash)
+                if item is not None and not self._is_expired(item[1].get('cached_at', 0)):
+                    logger.info(f"找到有效缓存(内存): {md5_hash}")
+                    return True, md5_hash
+
+            rows = self._index.execute("SELECT cached_at FROM entries WHERE key = ?", (md5_hash,))
+            if not rows:
                 return False, md5_hash
-            
-            # 检查缓存是否过期
-            try:
-                with open(metadata_file, 'r', encoding='utf-8') as f:
-                    metadata = json.load(f)
-                
-                cached_time = datetime.fromisoformat(metadata.get('cached_time', ''))
-                expiry_time = cached_time + timedelta(hours=self.cache_ttl_hours)
-                
-                if datetime.now() > expiry_time:
-                    logger.info(f"缓存已过期: {md5_hash}")
-                    self._remove_cache_entry(md5_hash)
-                    return False, md5_hash
-                
-                # 检查markdown文件是否存在
-                markdown_file = self.markdown_cache_dir / f"{md5_hash}.md"
-                if not markdown_file.exists():
-                    logger.warning(f"缓存元数据存在但markdown文件缺失: {md5_hash}")
-                    self._remove_cache_entry(md5_hash)
-                    return False, md5_hash
-                
-                logger.info(f"找到有效缓存: {md5_hash}")
-                return True, md5_hash
-                
-            except (json.JSONDecodeError, ValueError, KeyError) as e:
-                logger.warning(f"缓存元数据文件损坏: {metadata_file}, 错误: {e}")
+            if self._is_expired(rows[0][0]):
+                logger.info(f"缓存已过期: {md5_hash}")
                 self._remove_cache_entry(md5_hash)
                 return False, md5_hash
+
+            # 更新访问时间，磁盘缓存超过容量时按访问时间淘汰
+            self._index.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), md5_hash), commit=True)
+            logger.info(f"找到有效缓存: {md5_hash}")
+            return True, md5_hash
                 
         except Exception as e:
             logger.error(f"检查缓存状态失败: {e}")
             return False, None
-    
+
+    def _is_expired(self, cached_at: float) -> bool:
+        return time.time() > cached_at + self.ttl_seconds
+
     def get_cached_content(self, md5_hash: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
         """
         获取缓存的内容和元数据
         
         Args:
-            md5_hash: 文件MD5哈希值
+            md5_hash: is_cached返回的缓存键
             
         Returns:
             (markdown内容, 元数据)
         """
+        if self._memory is not None:
+            item = self._memory.get(md5_hash)
+            if item is not None:
+                return item
         try:
-            # 读取markdown内容
-            markdown_file = self.markdown_cache_dir / f"{md5_hash}.md"
-            if not markdown_file.exists():
+            rows = self._index.execute("SELECT markdown_path, metadata FROM entries WHERE key = ?", (md5_hash,))
+            if not rows:
+                return None, None
+            markdown_path, metadata_text = rows[0]
+            try:
+                with open(self.cache_dir / markdown_path, 'r', encoding='utf-8') as f:
+                    markdown_content = f.read()
+            except FileNotFoundError:
+                logger.warning(f"缓存索引存在但markdown文件缺失: {md5_hash}")
+                self._remove_cache_entry(md5_hash)
                 return None, None
             
-            with open(markdown_file, 'r', encoding='utf-8') as f:
-                markdown_content = f.read()
-            
-            # 读取元数据
-            metadata_file = self.metadata_cache_dir / f"{md5_hash}.json"
-            if not metadata_file.exists():
-                return markdown_content, {}
-            
-            with open(metadata_file, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-            
+            metadata = json.loads(metadata_text)
+            if self._memory is not None:
+                self._memory.put(md5_hash, markdown_content, metadata)
             logger.info(f"成功读取缓存内容: {md5_hash}")
             return markdown_content, metadata
             
@@ -162,7 +314,7 @@ class FileCacheManager:
             return None, None
     
     def save_to_cache(self, file_path: str, markdown_content: str, 
-                     processing_metadata: Optional[Dict[str, Any]] = None) -> str:
+                     processing_metadata: Optional[Dict[str, Any]] = None, md5_hash: Optional[str] = None) -> str:
         """
         保存文件处理结果到缓存
         
@@ -170,71 +322,114 @@ class FileCacheManager:
             file_path: 原始文件路径
             markdown_content: 处理后的markdown内容
             processing_metadata: 处理过程的元数据
+            md5_hash: 已知的文件MD5或is_cached返回的缓存键，传入时不再读取文件计算
             
         Returns:
-            MD5哈希值
+            缓存键
         """
         try:
-            md5_hash = self.calculate_file_md5(file_path)
+            md5_hash = md5_hash or self.calculate_file_md5(file_path)
+            if self.variant and not md5_hash.endswith(f"_{self.variant}"):
+                md5_hash = self.cache_key(md5_hash)
             
-            # 保存markdown内容
+            # 保存markdown内容，先写临时文件再改名，并发读取时不会读到写了一半的内容
             markdown_file = self.markdown_cache_dir / f"{md5_hash}.md"
-            with open(markdown_file, 'w', encoding='utf-8') as f:
-                f.write(markdown_content)
+            self._atomic_write(markdown_file, markdown_content)
+            entry_size = markdown_file.stat().st_size
             
             # 准备元数据
+            now = time.time()
             file_info = Path(file_path)
+            original_size = file_info.stat().st_size
             metadata = {
                 'md5_hash': md5_hash,
                 'original_file_path': str(file_info.absolute()),
                 'original_file_name': file_info.name,
-                'original_file_size': file_info.stat().st_size,
+                'original_file_size': original_size,
                 'original_file_extension': file_info.suffix.lower(),
-                'cached_time': datetime.now().isoformat(),
+                'cached_time': datetime.fromtimestamp(now).isoformat(),
+                'cached_at': now,
                 'markdown_length': len(markdown_content),
                 'processing_metadata': processing_metadata or {}
             }
             
-            # 保存元数据
-            metadata_file = self.metadata_cache_dir / f"{md5_hash}.json"
-            with open(metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, ensure_ascii=False, indent=2)
-            
             # 可选：保存原始文件副本（用于调试或备份）
-            if self._should_backup_file(file_path):
-                self._backup_original_file(file_path, md5_hash)
-            
+            backup_path = None
+            if self._should_backup_file(original_size):
+                backup_file = self._backup_original_file(file_path, md5_hash)
+                if backup_file is not None:
+                    backup_path = str(backup_file.relative_to(self.cache_dir))
+                    entry_size += original_size
+
+            self._index.execute(
+                "INSERT OR REPLACE INTO entries (key, size, cached_at, last_access, markdown_path, backup_path, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (md5_hash, entry_size, now, now, str(markdown_file.relative_to(self.cache_dir)), backup_path,
+                 json.dumps(metadata, ensure_ascii=False)),
+                commit=True,
+            )
+            
+            if self._memory is not None:
+                self._memory.put(md5_hash, markdown_content, metadata)
             logger.info(f"成功缓存文件处理结果: {md5_hash} ({file_info.name})")
+            self._enforce_size_limit()
             return md5_hash
             
         except Exception as e:
             logger.error(f"保存缓存失败 {file_path}: {e}")
             raise
-    
-    def _should_backup_file(self, file_path: str) -> bool:
+
+    @staticmethod
+    def _atomic_write(path: Path, text: str) -> None:
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def _enforce_size_limit(self) -> None:
+        """磁盘缓存超过容量上限时，按最近访问时间从旧到新淘汰，直到降到上限的90%"""
+        if self.max_size_bytes <= 0:
+            return
+        total_size = self._index.execute("SELECT COALESCE(SUM(size), 0) FROM entries")[0][0]
+        if total_size <= self.max_size_bytes:
+            return
+        target = self.max_size_bytes * 0.9
+        evicted = 0
+        while total_size > target:
+            rows = self._index.execute("SELECT key, size FROM entries ORDER BY last_access LIMIT 64")
+            if not rows:
+                break
+            for key, size in rows:
+                if total_size <= target:
+                    break
+                self._remove_cache_entry(key)
+                total_size -= size
+                evicted += 1
+        logger.info(f"转换缓存超过 {self.max_size_bytes // (1024 * 1024)}MB，淘汰了 {evicted} 个最久未使用的条目")
+
+    def _should_backup_file(self, file_size: int) -> bool:
         """
         判断是否应该备份原始文件
         
         Args:
-            file_path: 文件路径
+            file_size: 文件大小（字节）
             
         Returns:
             是否应该备份
         """
         # 对于小文件（<10MB）进行备份
-        try:
-            file_size = Path(file_path).stat().st_size
-            return file_size < 10 * 1024 * 1024  # 10MB
-        except:
-            return False
+        return file_size < 10 * 1024 * 1024  # 10MB
     
-    def _backup_original_file(self, file_path: str, md5_hash: str):
+    def _backup_original_file(self, file_path: str, md5_hash: str) -> Optional[Path]:
         """
         备份原始文件
         
         Args:
             file_path: 原始文件路径
-            md5_hash: MD5哈希值
+            md5_hash: 缓存键
+
+        Returns:
+            备份文件路径，失败时返回None
         """
         try:
             file_info = Path(file_path)
@@ -242,60 +437,77 @@ class FileCacheManager:
             
             shutil.copy2(file_path, backup_file)
             logger.debug(f"已备份原始文件: {backup_file}")
+            return backup_file
             
         except Exception as e:
             logger.warning(f"备份原始文件失败: {e}")
+            return None
     
     def _remove_cache_entry(self, md5_hash: str):
         """
         删除缓存条目
         
         Args:
-            md5_hash: MD5哈希值
+            md5_hash: 缓存键
         """
+        if self._memory is not None:
+            self._memory.pop(md5_hash)
         try:
-            # 删除markdown文件
-            markdown_file = self.markdown_cache_dir / f"{md5_hash}.md"
-            if markdown_file.exists():
-                markdown_file.unlink()
-            
-            # 删除元数据文件
-            metadata_file = self.metadata_cache_dir / f"{md5_hash}.json"
-            if metadata_file.exists():
-                metadata_file.unlink()
-            
-            # 删除备份文件（如果存在）
-            for backup_file in self.files_cache_dir.glob(f"{md5_hash}.*"):
-                backup_file.unlink()
+            rows = self._index.execute("SELECT markdown_path, backup_path FROM entries WHERE key = ?", (md5_hash,))
+            self._index.execute("DELETE FROM entries WHERE key = ?", (md5_hash,), commit=True)
+            if rows:
+                for relative_path in rows[0]:
+                    if relative_path:
+                        (self.cache_dir / relative_path).unlink(missing_ok=True)
             
             logger.debug(f"已删除缓存条目: {md5_hash}")
             
         except Exception as e:
             logger.warning(f"删除缓存条目失败 {md5_hash}: {e}")
+
+    def _import_legacy_metadata(self) -> None:
+        """把旧版本的JSON元数据导入索引，导入后删除JSON文件，只在第一次使用旧缓存目录时执行"""
+        if not self.metadata_cache_dir.exists():
+            return
+        imported = 0
+        now = time.time()
+        for metadata_file in self.metadata_cache_dir.glob("*.json"):
+            key = metadata_file.stem
+            markdown_file = self.markdown_cache_dir / f"{key}.md"
+            try:
+                with open(metadata_file, 'r', encoding='utf-8') as f:
+                    metadata = json.load(f)
+                if markdown_file.exists():
+                    cached_at = datetime.fromisoformat(metadata.get('cached_time', '')).timestamp()
+                    metadata['cached_at'] = cached_at
+                    backups = list(self.files_cache_dir.glob(f"{key}.*"))
+                    size = markdown_file.stat().st_size + sum(p.stat().st_size for p in backups)
+                    self._index.execute(
+                        "INSERT OR IGNORE INTO entries (key, size, cached_at, last_access, markdown_path, backup_path, metadata) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (key, size, cached_at, now, str(markdown_file.relative_to(self.cache_dir)),
+                         str(backups[0].relative_to(self.cache_dir)) if backups else None,
+                         json.dumps(metadata, ensure_ascii=False)),
+                        commit=True,
+                    )
+                    imported += 1
+            except Exception as e:
+                logger.warning(f"导入旧的缓存元数据失败 {metadata_file}: {e}")
+            metadata_file.unlink(missing_ok=True)
+        if imported:
+            logger.info(f"已将 {imported} 个旧的缓存条目导入索引")
     
     def cleanup_expired_cache(self):
-        """清理过期的缓存条目"""
+        """清理过期的缓存条目，通过索引只查询已过期的条目"""
         try:
-            cleaned_count = 0
-            
-            for metadata_file in self.metadata_cache_dir.glob("*.json"):
-                try:
-                    with open(metadata_file, 'r', encoding='utf-8') as f:
-                        metadata = json.load(f)
-                    
-                    cached_time = datetime.fromisoformat(metadata.get('cached_time', ''))
-                    expiry_time = cached_time + timedelta(hours=self.cache_ttl_hours)
-                    
-                    if datetime.now() > expiry_time:
-                        md5_hash = metadata_file.stem
-                        self._remove_cache_entry(md5_hash)
-                        cleaned_count += 1
-                        
-                except Exception as e:
-                    logger.warning(f"清理缓存条目失败 {metadata_file}: {e}")
+            expired = self._index.execute(
+                "SELECT key FROM entries WHERE cached_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            for (md5_hash,) in expired:
+                self._remove_cache_entry(md5_hash)
             
-            if cleaned_count > 0:
-                logger.info(f"清理了 {cleaned_count} 个过期缓存条目")
+            if expired:
+                logger.info(f"清理了 {len(expired)} 个过期缓存条目")
             
         except Exception as e:
             logger.error(f"清理过期缓存失败: {e}")
@@ -308,23 +520,18 @@ class FileCacheManager:
             缓存统计信息
         """
         try:
-            metadata_files = list(self.metadata_cache_dir.glob("*.json"))
-            markdown_files = list(self.markdown_cache_dir.glob("*.md"))
-            backup_files = list(self.files_cache_dir.glob("*"))
-            
-            total_size = 0
-            for file_path in [*metadata_files, *markdown_files, *backup_files]:
-                try:
-                    total_size += file_path.stat().st_size
-                except:
-                    pass
+            total_entries, total_size, backup_files = self._index.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COUNT(backup_path) FROM entries"
+            )[0]
             
             return {
                 'cache_dir': str(self.cache_dir),
-                'total_entries': len(metadata_files),
-                'markdown_files': len(markdown_files),
-                'backup_files': len(backup_files),
+                'total_entries': total_entries,
+                'markdown_files': total_entries,
+                'backup_files': backup_files,
                 'total_size_mb': round(total_size / (1024 * 1024), 2),
+                'max_size_mb': round(self.max_size_bytes / (1024 * 1024), 2),
+                'memory': self._memory.stats() if self._memory is not None else None,
                 'cache_ttl_hours': self.cache_ttl_hours
             }
             
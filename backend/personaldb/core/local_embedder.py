@@ -0,0 +1,99 @@
+"""
+本地向量模型 - 在进程内用ONNX Runtime(CPU)运行句向量模型，不需要网络
+- 模型目录中需要 model.onnx(或 onnx/model.onnx) 和 tokenizer.json，例如用optimum导出的bge、m3e、gte等模型
+- 每个批次按批内最长的文本补齐(动态长度)，调用方先按长度排序再分批，长度相近的文本在同一批，减少补齐的计算量
+- InferenceSession.run 是线程安全的并且会释放GIL，多个批次可以由EmbeddingDispatcher的线程池并发执行
+依赖(可选安装): pip install onnxruntime tokenizers
+"""
+
+import os
+import logging
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class LocalEmbedder:
+    """进程内的句向量模型"""
+
+    def __init__(
+        self,
+        model_dir: str,
+        max_length: int = 512,
+        pooling: str = "mean",
+        intra_op_threads: int = 0,
+        dimensions: Optional[int] = None,
+    ):
+        """
+        Args:
+            model_dir: 模型目录，包含model.onnx和tokenizer.json
+            max_length: 单条文本的最大token数，超过时截断
+            pooling: mean(按attention_mask求平均) 或 cls(取第一个token)，需要与模型训练时一致
+            intra_op_threads: 单个批次使用的线程数，0表示由ONNX Runtime决定
+            dimensions: 只保留前dimensions维(适用于Matryoshka训练的模型)，为空时使用模型的输出维度
+        """
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError:
+            raise ImportError("EMBEDDING_PROVIDER=local 需要安装onnxruntime和tokenizers: pip install onnxruntime tokenizers")
+
+        model_path = os.path.join(model_dir, "model.onnx")
+        if not os.path.exists(model_path):
+            model_path = os.path.join(model_dir, "onnx", "model.onnx")
+        tokenizer_path = os.path.join(model_dir, "tokenizer.json")
+        if not os.path.exists(model_path) or not os.path.exists(tokenizer_path):
+            raise FileNotFoundError(f"模型目录 {model_dir} 中需要 model.onnx(或 onnx/model.onnx) 和 tokenizer.json")
+        if pooling not in ("mean", "cls"):
+            raise ValueError(f"不支持的pooling: {pooling}，可选 mean 或 cls")
+
+        self.max_length = max_length
+        self.pooling = pooling
+        self.dimensions = dimensions
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.no_padding()
+        self.pad_id = self.tokenizer.token_to_id("[PAD]")
+        if self.pad_id is None:
+            self.pad_id = self.tokenizer.token_to_id("<pad>") or 0
+
+        options = ort.SessionOptions()
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {one.name for one in self.session.get_inputs()}
+        logger.info(f"本地向量模型加载完成: {model_path}，pooling={pooling}，max_length={max_length}")
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """对一批文本计算归一化后的句向量，按批内最长的文本补齐"""
+        if not texts:
+            return []
+        encodings = self.tokenizer.encode_batch(texts)
+        seq_len = max(len(one.ids) for one in encodings)
+        input_ids = np.full((len(texts), seq_len), self.pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(texts), seq_len), dtype=np.int64)
+        for i, one in enumerate(encodings):
+            input_ids[i, :len(one.ids)] = one.ids
+            attention_mask[i, :len(one.ids)] = 1
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        feeds = {name: value for name, value in feeds.items() if name in self.input_names}
+        output = self.session.run(None, feeds)[0]
+
+        if output.ndim == 2:
+            # 模型已经输出句向量
+            embeddings = output
+        elif self.pooling == "cls":
+            embeddings = output[:, 0]
+        else:
+            mask = attention_mask[..., None].astype(output.dtype)
+            embeddings = (output * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.dimensions and self.dimensions < embeddings.shape[1]:
+            embeddings = embeddings[:, :self.dimensions]
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.clip(norms, 1e-12, None)
+        return embeddings.astype(np.float32).tolist()
@@ -52,13 +52,20 @@ class MarkItDownConverter:
         # 初始化缓存管理器
         if enable_cache:
             try:
-                from .file_cache_manager import FileCacheManager
+                from .file_cache_manager import FileCacheManager, package_version
                 # 根据use_magic_pdf确定处理模式
                 if processing_mode is None:
                     processing_mode = "magic_pdf" if use_magic_pdf else "markitdown"
+                # 转换器版本和参数参与缓存键，升级markitdown后不会读到旧版本的结果
                 self._cache_manager = FileCacheManager(
                     cache_dir=cache_dir,
-                    processing_mode=processing_mode
+                    processing_mode=processing_mode,
+                    options={
+                        "converter": "MarkItDownConverter",
+                        "markitdown": package_version("markitdown"),
+                        "enable_plugins": enable_plugins,
+                        "use_magic_pdf": use_magic_pdf,
+                    }
                 )
                 logger.info("MarkItDown转换器缓存功能已启用")
             except ImportError as e:
@@ -102,12 +109,13 @@ class MarkItDownConverter:
                 self._magic_pdf_converter = None
         return self._magic_pdf_converter
     
-    def convert_file(self, file_path: str) -> Tuple[str, str]:
+    def convert_file(self, file_path: str, md5_hash: Optional[str] = None) -> Tuple[str, str]:
         """
         转换文件为Markdown格式
         
         Args:
             file_path: 文件路径
+            md5_hash: 已知的文件MD5（下载或上传时已经计算），传入时查缓存不再读取整个文件
             
         Returns:
             (转换后的Markdown内容, 检测到的编码)
@@ -128,7 +136,7 @@ class MarkItDownConverter:
 
         # 检查缓存
         if self.enable_cache and self._cache_manager:
-            is_cached, md5_hash = self._cache_manager.is_cached(file_path)
+            is_cached, md5_hash = self._cache_manager.is_cached(file_path, md5_hash)
             if is_cached and md5_hash:
                 logger.info(f"使用缓存的转换结果: {md5_hash}")
                 cached_content, cached_metadata = self._cache_manager.get_cached_content(md5_hash)
@@ -158,7 +166,7 @@ class MarkItDownConverter:
                                         'detected_encoding': encoding,
                                         'processing_method': 'magic_pdf'
                                     }
-                                    md5_hash = self._cache_manager.save_to_cache(file_path, content, processing_metadata)
+                                    md5_hash = self._cache_manager.save_to_cache(file_path, content, processing_metadata, md5_hash)
                                     logger.info(f"Magic-PDF转换结果已缓存: {md5_hash}")
                                 except Exception as e:
                                     logger.warning(f"保存Magic-PDF缓存失败: {e}")
@@ -188,7 +196,7 @@ class MarkItDownConverter:
                                 'detected_encoding': 'utf-8',
                                 'processing_method': 'markitdown'
                             }
-                            md5_hash = self._cache_manager.save_to_cache(file_path, content, processing_metadata)
+                            md5_hash = self._cache_manager.save_to_cache(file_path, content, processing_metadata, md5_hash)
                             logger.info(f"MarkItDown转换结果已缓存: {md5_hash}")
                         except Exception as e:
                             logger.warning(f"保存MarkItDown缓存失败: {e}")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2025/9/3
+# @Desc  : 文件转换和分块，都是CPU密集的操作，不依赖FastAPI，可以放到进程池中执行
+
+import os
+import logging
+from typing import List, Optional, Tuple
+from core.file_cache_manager import FileCacheManager, package_version
+from core.magic_pdf_converter import MagicPDFConverter
+from core.markitdown_converter import MarkItDownConverter
+from core.chunkers.fast_chunker import FastChunker
+
+logger = logging.getLogger(__name__)
+
+
+def _get_markdown_content(file_path: str, file_name: str, md5_hash: Optional[str] = None) -> str:
+    """
+    根据文件类型选择合适的转换器，将文件内容转换为Markdown格式。
+    PDF文件使用MagicPDFConverter（MinerU），其他文件使用MarkitdownConverter。
+    转换结果按文件内容缓存(FileCacheManager)，同一个文件再次上传时不再转换。
+    md5_hash: 下载或上传时已经计算的文件MD5，转换器查缓存时不必再读一遍文件
+    """
+    # 获取文件扩展名, 是否可以使用MinerU，如果不用显卡速度太慢
+    USE_MINERU = os.environ.get("USE_MINERU", "false")
+    if USE_MINERU.lower() == "true":
+        CAN_USE_MINERU = True
+    else:
+        CAN_USE_MINERU = False
+    file_extension = os.path.splitext(file_name)[1].lower() if file_name else ""
+
+    # 根据文件类型选择转换器
+    if CAN_USE_MINERU and file_extension == '.pdf':
+        # 使用 MinerU (MagicPDFConverter) 处理PDF
+        cache_manager = FileCacheManager(
+            processing_mode="mineru",
+            options={"converter": "MagicPDFConverter", "mineru": package_version("mineru")}
+        )
+        is_cached, cache_key = cache_manager.is_cached(file_path, md5_hash)
+        if is_cached:
+            content, _ = cache_manager.get_cached_content(cache_key)
+            if content:
+                logger.info(f"使用缓存的MinerU转换结果: {file_path}")
+                return True, content
+        logger.info(f"使用PDF转换器(MinerU)处理文件: {file_path}")
+        converter = MagicPDFConverter(output_dir="./output_pdf")
+        content, _ = converter.convert_pdf_file(file_path)
+        if content and content.strip():
+            try:
+                cache_manager.save_to_cache(file_path, content, {"processing_method": "mineru"}, cache_key)
+            except Exception as e:
+                logger.warning(f"保存MinerU转换缓存失败: {e}")
+        return True, content
+    else:
+        # 使用 markitdown 处理其他文件
+        logger.info(f"使用Markitdown转换器处理文件: {file_path}")
+        converter = MarkItDownConverter(use_magic_pdf=False)  #use_magic_pdf设定是否使用MinerU
+        content, _ = converter.convert_file(file_path, md5_hash=md5_hash)
+        return True, content
+
+
+def _chunk_text(text: str, max_chars: int = 1200, overlap: int = 200) -> List[str]:
+    """
+    使用 SemanticChunker 进行分块。
+    """
+    text = (text or "").strip()
+    if not text:
+        return []
+    chunker = FastChunker(max_tokens=max_chars)
+    chunks = chunker.chunk_text(text)
+    return [chunk.content for chunk in chunks]
+
+
+def convert_to_markdown(file_path: str, file_name: str, md5_hash: Optional[str] = None) -> str:
+    """
+    读取文件内容并转换为markdown，内容为空时抛出ValueError
+    """
+    logger.info(f"开始读取文件内容: {file_path}")
+    status, markdown_content = _get_markdown_content(file_path, file_name, md5_hash=md5_hash)
+    if not markdown_content or not markdown_content.strip():
+        logger.error(f"文件内容为空或无效: {file_path}")
+        raise ValueError("文件内容为空或无效")
+    logger.info(f"文件内容读取成功")
+    return markdown_content
+
+
+def chunk_markdown(markdown_content: str) -> List[str]:
+    """
+    对Markdown格式进行Trunk(分块)，分块为空时抛出ValueError
+    """
+    documents = _chunk_text(markdown_content)
+    if not documents:
+        raise ValueError("分块后内容为空")
+    logger.info(f"内容分块成功，共 {len(documents)} 块。")
+    return documents
+
+
+def convert_and_chunk(file_path: str, file_name: str, md5_hash: Optional[str] = None) -> Tuple[str, List[str]]:
+    """
+    读取文件内容并分块，返回 (markdown内容, 分块列表)
+    """
+    markdown_content = convert_to_markdown(file_path, file_name, md5_hash)
+    return markdown_content, chunk_markdown(markdown_content)
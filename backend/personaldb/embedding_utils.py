@@ -6,21 +6,24 @@
 # @Desc  : 对于给定的内容进行Embedding
 
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import time
 import copy
 import json
 import logging
 import requests
 import numpy as np
-import pickle
 import hashlib
-from functools import wraps
 import string
+import threading
 import chromadb  #pip install chromadb
 from chromadb.config import Settings
 from openai import OpenAI
 from dotenv import load_dotenv
+from core.embedding_cache import EmbeddingCache
+from core.embedding_dispatcher import EmbeddingDispatcher, DEFAULT_BATCH_SIZES
+from file_catalog import FileCatalog
+from keyword_index import KeywordIndex, reciprocal_rank_fusion
 # 加载环境变量
 load_dotenv()
 
@@ -41,69 +44,76 @@ def cal_md5(content):
     return md5
 
 
-def cache_decorator(func):
+def normalize_chunk(text: str) -> str:
+    """分块内容归一化：合并连续的空白字符，只有空白不同的分块视为相同"""
+    return " ".join(text.split())
+
+
+def chunk_ids(file_id: int, documents: List[str]) -> List[str]:
     """
-    cache从文件中读取, 当func中存在usecache时，并且为False时，不使用缓存
-    Args:
-        func ():
-    Returns:
+    按分块内容生成稳定的id: {file_id}_{归一化内容的md5}，同一个文件中重复的分块依次加上 _1、_2 后缀
     """
-    cache_path = "cache" #cache目录
-    if not os.path.exists(cache_path):
-        os.mkdir(cache_path)
-
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        # 将args和kwargs转换为哈希键， 当装饰类中的函数的时候，args的第一个参数是实例化的类，这会通常导致改变，我们不想检测它是否改变，那么就忽略它
-        usecache = kwargs.get("usecache", True)
-        if "usecache" in kwargs:
-            del kwargs["usecache"]
-        if len(args)> 0:
-            if isinstance(args[0],(int, float, str, list, tuple, dict)):
-                key = str(args) + str(kwargs)
-            else:
-                # 第1个参数以后的内容
-                key = str(args[1:]) + str(kwargs)
-        else:
-            key = str(args) + str(kwargs)
-        # 变成md5字符串
-        key_file = os.path.join(cache_path, cal_md5(key) + "_cache.pkl")
-        # 如果结果已缓存，则返回缓存的结果
-        if os.path.exists(key_file) and usecache:
-            # 去掉kwargs中的usecache
-            print(f"函数{func.__name__}被调用，缓存被命中，使用已缓存结果，对于参数{key}")
-            try:
-                with open(key_file, 'rb') as f:
-                    result = pickle.load(f)
-                    return result
-            except Exception as e:
-                print(f"函数{func.__name__}被调用，缓存被命中，读取文件:{key_file}失败，错误信息:{e}")
-        result = func(*args, **kwargs)
-        # 将结果缓存到文件中
-        # 如果返回的数据是一个元祖，并且第1个参数是False,说明这个函数报错了，那么就不缓存了，这是我们自己的一个设定
-        if isinstance(result, tuple) and result[0] == False:
-            print(f"函数{func.__name__}被调用，返回结果为False，对于参数{key}, 不缓存")
-        else:
-            with open(key_file, 'wb') as f:
-                pickle.dump(result, f)
-            print(f"函数{func.__name__}被调用，缓存未命中，结果被缓存，对于参数{key}, 写入文件:{key_file}")
-        return result
-
-    return wrapper
+    ids = []
+    seen: Dict[str, int] = {}
+    for document in documents:
+        base = f"{file_id}_{cal_md5(normalize_chunk(document))}"
+        n = seen.get(base, 0)
+        seen[base] = n + 1
+        ids.append(base if n == 0 else f"{base}_{n}")
+    return ids
 
 
 class ChromaDB(object):
-    def __init__(self, embedder, db_dir="cache/chromadb"):
+    def __init__(self, embedder, db_dir="cache/chromadb", write_batch_size: Optional[int] = None):
         """
         Args:
             embedder: 实例化后的embedding
             chromadb的相关操作
+            write_batch_size: 写入文件向量时每批的分块数，默认读取环境变量PERSONALDB_WRITE_BATCH_SIZE(256)，不超过ChromaDB的单批上限
         """
         # 目前支持的模型,
         self.embedder = embedder
         if not os.path.exists(db_dir):
             os.makedirs(db_dir)
         self.client = chromadb.PersistentClient(path=db_dir, settings=Settings(anonymized_telemetry=False))
+        if write_batch_size is None:
+            write_batch_size = int(os.environ.get("PERSONALDB_WRITE_BATCH_SIZE", "256"))
+        # 旧版本的chromadb没有get_max_batch_size
+        max_batch_size = getattr(self.client, "get_max_batch_size", lambda: write_batch_size)()
+        self.write_batch_size = max(1, min(write_batch_size, max_batch_size))
+        # 每个用户的文件目录，列出文件时不必读取所有分块
+        self.catalog = FileCatalog(os.path.join(db_dir, "file_catalog.sqlite"))
+        # 分块文本的倒排索引，混合检索(mode="hybrid")时使用
+        self.keyword_index = KeywordIndex(os.path.join(db_dir, "keyword_index.sqlite"))
+        self.search_mode = os.environ.get("PERSONALDB_SEARCH_MODE", "vector").lower()
+        # 混合检索时，向量和BM25各自取 topk * hybrid_candidates 个候选再融合
+        self.hybrid_candidates = int(os.environ.get("PERSONALDB_HYBRID_CANDIDATES", "4"))
+        # 缓存collection句柄，避免每次请求都去查询collection
+        self._collections: Dict[str, Any] = {}
+        self._collections_lock = threading.Lock()
+
+    def get_collection(self, collection: str, create: bool = True):
+        """
+        获取collection句柄，已经获取过的直接复用
+        Args:
+            collection: collection名称
+            create: 不存在时是否创建，不创建时返回None
+        """
+        col = self._collections.get(collection)
+        if col is not None:
+            return col
+        with self._collections_lock:
+            col = self._collections.get(collection)
+            if col is not None:
+                return col
+            if create:
+                col = self.client.get_or_create_collection(collection, metadata={"hnsw:space": "cosine"})
+            else:
+                if collection not in self.list_exist_collections():
+                    return None
+                col = self.client.get_collection(collection)
+            self._collections[collection] = col
+            return col
 
     def delete_one_collection(self, collection):
         """
@@ -113,7 +123,12 @@ class ChromaDB(object):
         Returns:
         """
         try:
+            with self._collections_lock:
+                self._collections.pop(collection, None)
             self.client.delete_collection(name=collection)
+            if collection.startswith("user_"):
+                self.catalog.delete_user(collection[len("user_"):])
+                self.keyword_index.remove_user(collection[len("user_"):])
         except Exception as e:
             print(f"删除collection:{collection}失败，错误信息:{e}")
             return "fail"
@@ -129,7 +144,7 @@ class ChromaDB(object):
             str: "success" 表示删除成功，"fail" 表示失败。
         """
         try:
-            col = self.client.get_or_create_collection(collection)
+            col = self.get_collection(collection)
             # 删除指定 ID 的文档
             col.delete(ids=[doc_id])
             print(f"尝试删除集合 '{collection}' 中的文档 ID '{doc_id}'。")
@@ -156,7 +171,7 @@ class ChromaDB(object):
             meta: 插入collection的meta信息, list[]
         Returns:
         """
-        col = self.client.get_or_create_collection(collection, metadata={"hnsw:space": "cosine"})
+        col = self.get_collection(collection)
         vectors_result = self.embedder.do_embedding(documents)
         vectors = vectors_result["data"]
         embeddings = [one["embedding"] for one in vectors]
@@ -168,34 +183,131 @@ class ChromaDB(object):
         )
         return "success"
 
-    def query2collection(self, collection, query_documents, keyword="", topk=3):
+    def query2collection(self, collection, query_documents, keyword="", topk=3, mode: Optional[str] = None):
         """
         查询向量，混合搜索
         Args:
             collection ():
             query_documents (): list[str]
             keyword: 是否同时对documents执行关键字搜索
+            mode: vector 只用向量检索; hybrid 向量检索和BM25关键词检索的结果按RRF融合，结果中额外带有scores。
+                  默认读取环境变量PERSONALDB_SEARCH_MODE
         Returns:
         """
-        col = self.client.get_or_create_collection(collection)
+        mode = (mode or self.search_mode).lower()
+        col = self.get_collection(collection)
         vectors_result = self.embedder.do_embedding(texts=query_documents)
         vectors = vectors_result["data"]
         embeddings = [one["embedding"] for one in vectors]
+        n_results = topk * max(1, self.hybrid_candidates) if mode == "hybrid" else topk
         if keyword:
             query_result = col.query(
                 query_embeddings=embeddings,
-                n_results=topk,
+                n_results=n_results,
                 where_document={"$contains": keyword},
                 include=["metadatas", "documents", "distances"]
             )
         else:
             query_result = col.query(
                 query_embeddings=embeddings,
-                n_results=topk,
+                n_results=n_results,
                 include=["metadatas", "documents", "distances"]
             )
+        if mode == "hybrid":
+            return self._fuse_keyword_results(collection, col, query_documents, query_result, keyword, topk, n_results)
         return query_result
 
+    def _fuse_keyword_results(self, collection, col, query_documents, query_result, keyword, topk, n_results):
+        """BM25检索每个查询，与向量检索的结果按RRF融合，返回与col.query相同结构的结果"""
+        user_id = collection[len("user_"):] if collection.startswith("user_") else collection
+        if not self.keyword_index.is_synced(user_id):
+            def load_chunks():
+                existing = col.get(include=["documents", "metadatas"])
+                return [
+                    (chunk_id, (meta or {}).get("file_id"), document)
+                    for chunk_id, document, meta in zip(existing["ids"], existing["documents"], existing["metadatas"])
+                ]
+            self.keyword_index.rebuild_user(user_id, load_chunks)
+        # (查询序号, 分块id) -> (内容, 元数据, 向量距离)
+        known: Dict[Tuple[int, str], Tuple[str, Any, Optional[float]]] = {}
+        fused_per_query = []
+        for i, query in enumerate(query_documents):
+            vector_ids = query_result["ids"][i]
+            for chunk_id, document, meta, distance in zip(vector_ids, query_result["documents"][i],
+                                                          query_result["metadatas"][i], query_result["distances"][i]):
+                known[(i, chunk_id)] = (document, meta, distance)
+            keyword_ids = [chunk_id for chunk_id, _ in self.keyword_index.search(user_id, query, n_results)]
+            fused_per_query.append((keyword_ids, reciprocal_rank_fusion([vector_ids, keyword_ids])))
+        # 只被BM25召回的分块，一次取回内容和元数据
+        missing = {chunk_id for i, (keyword_ids, _) in enumerate(fused_per_query) for chunk_id in keyword_ids if (i, chunk_id) not in known}
+        extra = {}
+        if missing:
+            got = col.get(ids=list(missing), include=["documents", "metadatas"])
+            extra = {chunk_id: (document, meta) for chunk_id, document, meta in zip(got["ids"], got["documents"], got["metadatas"])}
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": [], "scores": [],
+                  "included": ["metadatas", "documents", "distances", "scores"]}
+        for i, (_, fused) in enumerate(fused_per_query):
+            row = {"ids": [], "documents": [], "metadatas": [], "distances": [], "scores": []}
+            for chunk_id, score in fused:
+                if (i, chunk_id) in known:
+                    document, meta, distance = known[(i, chunk_id)]
+                elif chunk_id in extra:
+                    document, meta = extra[chunk_id]
+                    distance = None
+                    # BM25的结果也要满足关键字过滤条件
+                    if keyword and keyword not in (document or ""):
+                        continue
+                else:
+                    # 索引中有但ChromaDB中已经删除
+                    continue
+                for field, value in (("ids", chunk_id), ("documents", document), ("metadatas", meta),
+                                     ("distances", distance), ("scores", score)):
+                    row[field].append(value)
+                if len(row["ids"]) >= topk:
+                    break
+            for field, values in row.items():
+                result[field].append(values)
+        return result
+
+    def batch_query(self, collection, queries: List[str], keyword="", topk=3, merge_topk: Optional[int] = None, mode: Optional[str] = None):
+        """
+        批量查询，所有查询一次向量化、一次ChromaDB查询，重复的查询只计算一次
+        Args:
+            collection: 集合名称
+            queries: 查询列表
+            keyword: 是否同时对documents执行关键字搜索，对所有查询生效
+            topk: 每个查询返回的结果数
+            merge_topk: 不为空时，额外返回所有查询结果去重后的前merge_topk条，向量检索按距离排序，混合检索按融合分数排序
+            mode: vector 或 hybrid，见query2collection
+        Returns:
+            dict: {"results": [{"query", "ids", "documents", "metadatas", "distances"(, "scores")}, ...], "merged": [...]}
+        """
+        unique_queries = list(dict.fromkeys(queries))
+        query_result = self.query2collection(collection, unique_queries, keyword=keyword, topk=topk, mode=mode)
+        fields = ("ids", "documents", "metadatas", "distances") + (("scores",) if "scores" in query_result else ())
+        per_query = {}
+        for i, query in enumerate(unique_queries):
+            per_query[query] = {
+                "query": query,
+                **{field: (query_result.get(field) or [[]] * len(unique_queries))[i] for field in fields},
+            }
+        result = {"results": [per_query[query] for query in queries]}
+        if merge_topk is not None:
+            # 同一个分块被多个查询召回时，保留排名最靠前的那一次：融合分数越大越好，距离越小越好
+            def rank_key(item):
+                return -item["score"] if "score" in item else item["distance"]
+            best = {}
+            for one in per_query.values():
+                scores = one.get("scores") or [None] * len(one["ids"])
+                for doc_id, document, metadata, distance, score in zip(one["ids"], one["documents"], one["metadatas"], one["distances"], scores):
+                    item = {"id": doc_id, "document": document, "metadata": metadata, "distance": distance, "query": one["query"]}
+                    if score is not None:
+                        item["score"] = score
+                    if doc_id not in best or rank_key(item) < rank_key(best[doc_id]):
+                        best[doc_id] = item
+            result["merged"] = sorted(best.values(), key=rank_key)[:merge_topk]
+        return result
+
 
     def delete_file_vectors(self, user_id: int, file_id: int):
         """
@@ -208,17 +320,33 @@ class ChromaDB(object):
         """
         try:
             collection_name = f"user_{user_id}"
-            col = self.client.get_or_create_collection(collection_name)
+            col = self.get_collection(collection_name)
             col.delete(where={"file_id": file_id})
+            self.catalog.delete(user_id, file_id)
+            self.keyword_index.remove_file(user_id, file_id)
             logger.info(f"成功删除用户 {user_id} 的文件 {file_id} 对应的向量")
             return "success"
         except Exception as e:
             logger.error(f"删除用户 {user_id} 的文件 {file_id} 向量失败: {str(e)}", exc_info=True)
             return "fail"
 
-    def insert_file_vectors(self, file_name:str, user_id: int|str, file_id: int, file_type: str, url: str, folder_id: int, documents: List[str]):
+    def get_file_chunk_ids(self, collection, file_id: int) -> Dict[str, Dict[str, Any]]:
+        """
+        获取文件已有的分块id和元数据
+        Returns:
+            dict: {chunk_id: metadata}
+        """
+        col = self.get_collection(collection)
+        existing = col.get(where={"file_id": file_id}, include=["metadatas"])
+        return dict(zip(existing.get("ids") or [], existing.get("metadatas") or []))
+
+    def insert_file_vectors(self, file_name:str, user_id: int|str, file_id: int, file_type: str, url: str, folder_id: int, documents: List[str], progress_callback=None):
         """
         将文件内容插入到ChromaDB中，生成并存储embedding向量
+        分块id由分块内容的哈希生成，与文件已有的分块对比，只对新增的分块做向量化并写入，只删除不再存在的分块，
+        重新上传只修改了一段的文件时，只需要计算修改的分块
+        新增的分块按write_batch_size分批向量化和写入，每批写入后上报进度；中途失败时已写入的批次保留，
+        重试时这些分块已经存在，直接从失败的位置继续。所有新分块写入后才删除旧的分块，重新入库失败时用户仍然可以搜索旧的内容
         Args:
             file_name: file_name, 文件名称
             user_id (int): 用户ID
@@ -227,28 +355,57 @@ class ChromaDB(object):
             url (str): 文件URL
             folder_id (int): 文件夹ID
             documents (List[str]): 文件内容列表
+            progress_callback: 可选，进度回调 progress_callback(已完成数, 总数)，没有变化和已经写入的分块算作已完成
         Returns:
-            dict: 包含embedding结果
+            dict: {"data": 新增分块的向量, "count": 文件的分块数, "added": 新增数, "deleted": 删除数, "unchanged": 未变化数}
         """
-        # 首先删除已有存在的相同文件
-        del_status = self.delete_file_vectors(user_id, file_id)
-        # 然后插入新的向量
         try:
             collection_name = f"user_{user_id}"
-            vectors_result = self.embedder.do_embedding(texts=documents)
-            vectors = vectors_result["data"]
-            embeddings = [one["embedding"] for one in vectors]
-            meta = [{"file_name": file_name,"file_id": file_id, "user_id": user_id, "folder_id": folder_id, "url": url, "file_type": file_type} for _ in documents]
-            ids = [f"{file_id}_{i}" for i in range(len(documents))]
-            col = self.client.get_or_create_collection(collection_name, metadata={"hnsw:space": "cosine"})
-            col.add(
-                embeddings=embeddings,
-                documents=documents,
-                metadatas=meta,
-                ids=ids
-            )
-            logger.info(f"成功插入文件 {file_id} 的向量到集合 {collection_name}")
-            return vectors_result
+            col = self.get_collection(collection_name)
+            meta = {"file_name": file_name, "file_id": file_id, "user_id": user_id, "folder_id": folder_id, "url": url, "file_type": file_type}
+            ids = chunk_ids(file_id, documents)
+            existing = self.get_file_chunk_ids(collection_name, file_id)
+            new_positions = [i for i, chunk_id in enumerate(ids) if chunk_id not in existing]
+            unchanged_ids = [chunk_id for chunk_id in ids if chunk_id in existing]
+            stale_ids = list(existing.keys() - set(ids))
+            if unchanged_ids and new_positions:
+                logger.info(f"文件 {file_id} 已有 {len(unchanged_ids)} 个分块，继续写入剩余的 {len(new_positions)} 个")
+
+            vectors = []
+            written = len(unchanged_ids)
+            if progress_callback is not None:
+                progress_callback(written, len(documents))
+            for start in range(0, len(new_positions), self.write_batch_size):
+                batch = new_positions[start:start + self.write_batch_size]
+                batch_documents = [documents[i] for i in batch]
+                callback = None
+                if progress_callback is not None:
+                    callback = lambda done, total, base=written: progress_callback(base + done, len(documents))
+                batch_vectors = self.embedder.do_embedding(texts=batch_documents, progress_callback=callback)["data"]
+                col.upsert(
+                    embeddings=[one["embedding"] for one in batch_vectors],
+                    documents=batch_documents,
+                    metadatas=[dict(meta) for _ in batch],
+                    ids=[ids[i] for i in batch]
+                )
+                self.keyword_index.add(user_id, file_id, [(ids[i], documents[i]) for i in batch])
+                vectors.extend(batch_vectors)
+                written += len(batch)
+                if progress_callback is not None:
+                    progress_callback(written, len(documents))
+                logger.info(f"文件 {file_id} 已写入 {written}/{len(documents)} 个分块")
+            # 内容没变但文件名、文件夹等信息变化的分块，只更新元数据
+            changed_meta_ids = [chunk_id for chunk_id in unchanged_ids if existing[chunk_id] != meta]
+            for start in range(0, len(changed_meta_ids), self.write_batch_size):
+                batch_ids = changed_meta_ids[start:start + self.write_batch_size]
+                col.update(ids=batch_ids, metadatas=[dict(meta) for _ in batch_ids])
+            # 新的分块全部写入后再删除不再存在的分块
+            for start in range(0, len(stale_ids), self.write_batch_size):
+                col.delete(ids=stale_ids[start:start + self.write_batch_size])
+            self.keyword_index.remove(user_id, stale_ids)
+            self.catalog.upsert(user_id, file_id, file_name, file_type, url, folder_id, len(ids))
+            logger.info(f"文件 {file_id} 的向量已同步到集合 {collection_name}: 新增 {len(new_positions)}，删除 {len(stale_ids)}，未变化 {len(unchanged_ids)}")
+            return {"data": vectors, "count": len(ids), "added": len(new_positions), "deleted": len(stale_ids), "unchanged": len(unchanged_ids)}
         except Exception as e:
             logger.error(f"插入用户 {user_id} 的文件 {file_id} 向量失败: {str(e)}", exc_info=True)
             raise ValueError(f"插入向量失败: {str(e)}")
@@ -260,7 +417,7 @@ class ChromaDB(object):
         列出某个集后的内容
         Returns:
         """
-        col = self.client.get_or_create_collection(collection)
+        col = self.get_collection(collection)
         data = col.peek(number)
         total = col.count()
         result = {
@@ -270,58 +427,24 @@ class ChromaDB(object):
         }
         return result
 
-    def list_files_by_user(self, user_id: int) -> List[Dict[str, Any]]:
+    def list_files_by_user(self, user_id: int, offset: int = 0, limit: int = 100) -> Tuple[List[Dict[str, Any]], int]:
         """
-        根据用户ID列出该用户的所有文件信息
+        根据用户ID分页列出该用户的文件信息，从文件目录中查询，不读取分块
+        旧数据库第一次查询某个用户时，从ChromaDB的元数据中补建一次目录
         Args:
             user_id (int): 用户ID
+            offset: 跳过的文件数
+            limit: 返回的最大文件数
         Returns:
-            List[Dict[str, Any]]: 文件信息列表
+            (文件信息列表, 文件总数)
         """
-        try:
+        if not self.catalog.is_synced(user_id):
             collection_name = f"user_{user_id}"
-            # 确认集合存在
-            collections = self.list_exist_collections()
-            if collection_name not in collections:
-                logger.warning(f"集合 {collection_name} 不存在，用户 {user_id} 没有任何文件。")
-                return []
-
-            col = self.client.get_collection(collection_name)
-
-            # 获取所有与该用户ID相关的文档元数据
-            # 注意：get()方法在没有where条件时返回所有文档，数据量可能很大
-            # 但由于我们是按用户集合来操作的，所以这里获取的是该用户的所有数据
-            results = col.get()
-
-            metadatas = results.get('metadatas', [])
-
-            # 文件信息可能重复，需要去重
-            unique_files = {}
-            for meta in metadatas:
-                # 确保meta是字典且包含file_id
-                if isinstance(meta, dict) and 'file_id' in meta:
-                    file_id = meta.get('file_id')
-                    # 过滤掉无效的file_id
-                    if file_id is None:
-                        continue
-
-                    # 检查用户ID是否匹配
-                    if meta.get('user_id') == user_id:
-                        if file_id not in unique_files:
-                            unique_files[file_id] = {
-                                "file_id": file_id,
-                                "file_name": meta.get('file_name'),
-                                "file_type": meta.get('file_type'),
-                                "url": meta.get('url'),
-                                "folder_id": meta.get('folder_id'),
-                                "user_id": meta.get('user_id')
-                            }
-
-            return list(unique_files.values())
-        except Exception as e:
-            # 如果collection不存在或其他异常
-            logger.error(f"为用户 {user_id} 列出文件失败: {str(e)}", exc_info=True)
-            return []
+            col = self.get_collection(collection_name, create=False)
+            self.catalog.sync_user(
+                user_id, lambda: col.get(include=["metadatas"]).get("metadatas", []) if col is not None else []
+            )
+        return self.catalog.list_files(user_id, offset=offset, limit=limit)
 
     def list_exist_collections(self):
         """
@@ -336,7 +459,7 @@ class EmbeddingModel(object):
     def __init__(self):
         """
         环境变量：
-        - EMBEDDING_PROVIDER: aliyun | ollama | vllm | xinference
+        - EMBEDDING_PROVIDER: aliyun | ollama | vllm | xinference | local
         - EMBEDDING_MODEL:    各提供方的模型名
         - 通用：EMBEDDING_DIM (可选，部分提供方不支持自定义维度)
         - aliyun:   ALI_API_KEY
@@ -344,10 +467,20 @@ class EmbeddingModel(object):
         - vllm:     VLLM_BASE_URL(如 http://127.0.0.1:8000/v1)，VLLM_API_KEY(可选)
         - xinference:XINFERENCE_BASE_URL(如 http://127.0.0.1:9997/v1)，XINFERENCE_API_KEY(可选)
         - ollama:   OLLAMA_BASE_URL(默认 http://127.0.0.1:11434)
+        - local:    进程内ONNX Runtime(CPU)运行，LOCAL_EMBEDDING_MODEL_DIR(包含model.onnx和tokenizer.json)，
+                    LOCAL_EMBEDDING_MAX_LENGTH(默认512)，LOCAL_EMBEDDING_POOLING(mean/cls，默认mean)，
+                    LOCAL_EMBEDDING_THREADS(单批线程数，默认 CPU核数/EMBEDDING_CONCURRENCY)，EMBEDDING_MODEL只用作缓存键
+        - 向量缓存：EMBEDDING_CACHE(默认true)，EMBEDDING_CACHE_PATH(默认 cache/embedding_cache.sqlite)
+        - 并发请求：EMBEDDING_BATCH_SIZE(默认按提供方)，EMBEDDING_CONCURRENCY(默认4)，EMBEDDING_MAX_RETRIES(默认3)，EMBEDDING_LATENCY_TARGET(默认10秒)
         """
         self.model = os.environ["EMBEDDING_MODEL"]
         self.provider = os.environ["EMBEDDING_PROVIDER"].lower()
         self.dimensions = int(os.getenv("EMBEDDING_DIM", "0")) or None
+        # 按单条文本缓存向量，只对未命中的文本调用向量模型
+        if os.getenv("EMBEDDING_CACHE", "true").lower() == "true":
+            self.embedding_cache = EmbeddingCache(os.getenv("EMBEDDING_CACHE_PATH", "cache/embedding_cache.sqlite"))
+        else:
+            self.embedding_cache = None
 
         if self.provider == "aliyun":
             api_key = os.getenv("ALI_API_KEY")
@@ -386,33 +519,84 @@ class EmbeddingModel(object):
             self.ollama_base = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434").rstrip("/")
             self.session = requests.Session()
             self._impl = self._impl_ollama_native
+        elif self.provider == "local":
+            from core.local_embedder import LocalEmbedder
+            model_dir = os.getenv("LOCAL_EMBEDDING_MODEL_DIR")
+            assert model_dir, "LOCAL_EMBEDDING_MODEL_DIR 未设置，需要包含 model.onnx 和 tokenizer.json 的目录"
+            concurrency = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+            self.local_embedder = LocalEmbedder(
+                model_dir,
+                max_length=int(os.getenv("LOCAL_EMBEDDING_MAX_LENGTH", "512")),
+                pooling=os.getenv("LOCAL_EMBEDDING_POOLING", "mean").lower(),
+                # 多个批次由dispatcher的线程池并发执行，线程总数约等于 EMBEDDING_CONCURRENCY * LOCAL_EMBEDDING_THREADS
+                intra_op_threads=int(os.getenv("LOCAL_EMBEDDING_THREADS", "0")) or max(1, (os.cpu_count() or 1) // max(1, concurrency)),
+                dimensions=self.dimensions,
+            )
+            self._impl = self.local_embedder.embed
         else:
             raise Exception(f"不支持的EMBEDDING_PROVIDER: {self.provider}")
 
-    @cache_decorator
-    def do_embedding(self, texts: List[str]):
+        batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "0")) or DEFAULT_BATCH_SIZES.get(self.provider, 10)
+        self.dispatcher = EmbeddingDispatcher(
+            embed_batch=self._embed_one_batch,
+            batch_size=batch_size,
+            max_concurrency=int(os.getenv("EMBEDDING_CONCURRENCY", "4")),
+            max_retries=int(os.getenv("EMBEDDING_MAX_RETRIES", "3")),
+            latency_target=float(os.getenv("EMBEDDING_LATENCY_TARGET", "10")),
+        )
+
+    def do_embedding(self, texts: List[str], usecache: bool = True, progress_callback=None):
         """
-        对数据进行embedding。返回：{"data":[{"embedding":[...]}, ...]}
+        对数据进行embedding。返回：{"data":[{"embedding":[...]}, ...]}，顺序与texts一致
+        先按单条文本查询向量缓存，只把未命中（且去重后）的文本分批发给向量模型
+        progress_callback: 可选，progress_callback(已完成数, 总数)，缓存命中的文本直接算作已完成
         """
         assert isinstance(texts, list) and all(isinstance(t, str) for t in texts), "texts必须为字符串列表"
-        max_batch_size = 10  # 可根据不同后端调整
-        result = {"data": []}
-        for i in range(0, len(texts), max_batch_size):
-            batch = texts[i:i + max_batch_size]
-            try:
-                batch_out = self._impl(batch)
-                # 规范化为 {"data":[{"embedding":[...]}...]}
-                if isinstance(batch_out, dict) and "data" in batch_out:
-                    result["data"].extend(batch_out["data"])
-                else:
-                    # 兜底：如果只是返回了向量列表
-                    result["data"].extend([{"embedding": emb} for emb in batch_out])
-                logger.info(f"成功嵌入批次 {i // max_batch_size + 1}，包含 {len(batch)} 个文本")
-            except Exception as e:
-                logger.error(f"嵌入批次 {i // max_batch_size + 1} 失败: {e}", exc_info=True)
-        logger.info(f"所有 {len(texts)} 个文本嵌入完成")
+        use_cache = usecache and self.embedding_cache is not None
+        if use_cache:
+            keys = [EmbeddingCache.make_key(self.model, self.dimensions, t) for t in texts]
+            cached = self.embedding_cache.get_many(keys)
+        else:
+            keys = list(texts)
+            cached = {}
+        # 未命中的文本，相同的文本只请求一次
+        miss_texts = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in miss_texts:
+                miss_texts[key] = text
+        if miss_texts:
+            miss_keys = list(miss_texts.keys())
+            # 有批次重试后仍失败时抛出异常，不会返回缺少向量的结果
+            dispatch_callback = None
+            if progress_callback is not None:
+                hit_num = len(texts) - len(miss_keys)
+                progress_callback(hit_num, len(texts))
+                dispatch_callback = lambda done, total: progress_callback(hit_num + done, len(texts))
+            if self.provider == "local":
+                # 本地模型每批按最长的文本补齐，按长度排序后分批，长度相近的文本在同一批
+                miss_keys.sort(key=lambda k: len(miss_texts[k]))
+            vectors = self.dispatcher.embed([miss_texts[k] for k in miss_keys], progress_callback=dispatch_callback)
+            new_vectors = dict(zip(miss_keys, vectors))
+            if use_cache:
+                self.embedding_cache.put_many(new_vectors.items())
+            cached.update(new_vectors)
+        logger.info(f"所有 {len(texts)} 个文本嵌入完成，其中缓存命中 {len(texts) - len(miss_texts)} 个，请求向量模型 {len(miss_texts)} 个")
+        if progress_callback is not None and not miss_texts:
+            progress_callback(len(texts), len(texts))
+        result = {"data": [{"embedding": cached[key]} for key in keys]}
         return result
 
+    def _embed_one_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        调用向量模型对一批文本进行embedding，返回与texts对齐的向量列表，由dispatcher并发调用
+        """
+        batch_out = self._impl(texts)
+        # 规范化为向量列表
+        if isinstance(batch_out, dict) and "data" in batch_out:
+            return [one["embedding"] for one in batch_out["data"]]
+        # 兜底：如果只是返回了向量列表
+        return list(batch_out)
+
     # ---------- 各提供方实现 ----------
     def _impl_openai_compatible(self, texts: List[str]):
         """
@@ -440,10 +624,17 @@ class EmbeddingModel(object):
 
     def _impl_ollama_native(self, texts: List[str]):
         """
-        适用于Ollama原生接口：POST {OLLAMA_BASE_URL}/api/embeddings
-        body: {"model": "...", "prompt": "..."}
-        不支持批量输入 => 逐条请求
+        适用于Ollama原生接口，优先使用批量接口 POST {OLLAMA_BASE_URL}/api/embed，body: {"model": "...", "input": [...]}
+        旧版本的Ollama没有/api/embed(返回404)，退回 /api/embeddings 逐条请求
         """
+        if getattr(self, "_ollama_batch", True):
+            r = self.session.post(f"{self.ollama_base}/api/embed", json={"model": self.model, "input": texts}, timeout=120)
+            if r.status_code == 200:
+                return {"data": [{"embedding": one} for one in r.json().get("embeddings", [])]}
+            if r.status_code != 404:
+                raise RuntimeError(f"Ollama embeddings失败: {r.status_code} {r.text}")
+            logger.warning("Ollama不支持/api/embed，使用/api/embeddings逐条请求")
+            self._ollama_batch = False
         url = f"{self.ollama_base}/api/embeddings"
         data = []
         for t in texts:
@@ -457,6 +648,43 @@ class EmbeddingModel(object):
         return {"data": data}
 
 
+# ===== 进程内共享的实例 =====
+# EmbeddingModel 持有向量模型的客户端，ChromaDB 持有 PersistentClient（打开SQLite和HNSW索引文件），
+# 创建成本都比较高，整个服务只创建一次，所有请求共用
+_embedder: Optional[EmbeddingModel] = None
+_chroma: Optional[ChromaDB] = None
+_instance_lock = threading.Lock()
+
+
+def get_embedder() -> EmbeddingModel:
+    global _embedder
+    if _embedder is None:
+        with _instance_lock:
+            if _embedder is None:
+                _embedder = EmbeddingModel()
+    return _embedder
+
+
+def get_chroma() -> ChromaDB:
+    global _chroma
+    if _chroma is None:
+        embedder = get_embedder()
+        with _instance_lock:
+            if _chroma is None:
+                _chroma = ChromaDB(embedder)
+    return _chroma
+
+
+def reset_instances():
+    """释放共享实例，服务关闭时调用"""
+    global _embedder, _chroma
+    with _instance_lock:
+        if _embedder is not None and _embedder.embedding_cache is not None:
+            _embedder.embedding_cache.close()
+        _embedder = None
+        _chroma = None
+
+
 if __name__ == '__main__':
     embedder = EmbeddingModel()
     chromadb_instance = ChromaDB(embedder=embedder)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2025/9/3
+# @Desc  : 阻塞操作的执行器，保证事件循环不被文件入库阻塞
+# - cpu: 进程池，文件转换(MarkItDown/MinerU)和分块
+# - ingest_io: 线程池，文件下载、向量模型请求、写入ChromaDB
+# - search: 单独的线程池，搜索不会排在入库任务后面
+# 每个执行器都有排队上限，超过上限直接返回503，而不是无限排队拖慢所有请求
+
+import os
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(RuntimeError):
+    """执行器排队的任务数超过上限"""
+
+
+class PendingLimiter:
+    """限制同时处理（执行中+排队）的任务数"""
+
+    def __init__(self, name: str, max_pending: int):
+        """
+        Args:
+            name: 名称，用于日志和错误信息
+            max_pending: 正在执行和排队的任务总数上限
+        """
+        self.name = name
+        self.max_pending = max_pending
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @contextmanager
+    def reserve(self):
+        """占用一个名额，超过上限时抛出QueueFullError"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"{self.name}任务繁忙，当前排队{self._pending}个，请稍后重试")
+            self._pending += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+class BoundedExecutor:
+    """带排队上限的执行器，在事件循环中 await run(...) 执行阻塞函数"""
+
+    def __init__(self, name: str, factory: Callable[[], Executor], max_pending: int):
+        """
+        Args:
+            name: 名称，用于日志和错误信息
+            factory: 创建底层执行器的函数，第一次使用时才创建
+            max_pending: 正在执行和排队的任务总数上限
+        """
+        self.name = name
+        self.limiter = PendingLimiter(name, max_pending)
+        self._factory = factory
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self.limiter.pending
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = self._factory()
+        return self._executor
+
+    async def run(self, func, *args, **kwargs):
+        with self.limiter.reserve():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+CPU_WORKERS = int(os.environ.get("PERSONALDB_CPU_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+IO_WORKERS = int(os.environ.get("PERSONALDB_IO_WORKERS", "8"))
+SEARCH_WORKERS = int(os.environ.get("PERSONALDB_SEARCH_WORKERS", "8"))
+
+# 同时处理的入库请求数（从读取上传内容到写入ChromaDB），超过后新的上传直接返回503
+ingest_limiter = PendingLimiter("文件入库", int(os.environ.get("PERSONALDB_MAX_PENDING_INGEST", "16")))
+
+cpu_executor = BoundedExecutor(
+    "文件转换",
+    lambda: ProcessPoolExecutor(max_workers=CPU_WORKERS),
+    max_pending=int(os.environ.get("PERSONALDB_MAX_PENDING_CPU", str(CPU_WORKERS * 4))),
+)
+ingest_io_executor = BoundedExecutor(
+    "文件下载和向量化",
+    lambda: ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="ingest"),
+    max_pending=int(os.environ.get("PERSONALDB_MAX_PENDING_IO", str(IO_WORKERS * 4))),
+)
+search_executor = BoundedExecutor(
+    "搜索",
+    lambda: ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search"),
+    max_pending=int(os.environ.get("PERSONALDB_MAX_PENDING_SEARCH", str(SEARCH_WORKERS * 8))),
+)
+
+
+def shutdown_executors() -> None:
+    for executor in (cpu_executor, ingest_io_executor, search_executor):
+        executor.shutdown()
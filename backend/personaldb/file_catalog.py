@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2025/9/3
+# @Desc  : 用户文件目录，每个文件一行，保存在ChromaDB目录下的SQLite中
+# - 写入和删除文件向量时同步维护，/files/{user_id} 直接查询这张表，不再读取用户所有分块的内容和元数据
+# - 旧的数据库没有目录，第一次查询某个用户时从ChromaDB的元数据中补建一次，补建在目录锁内的一个事务中完成
+
+import os
+import time
+import logging
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class FileCatalog:
+    """基于SQLite的文件目录，线程安全"""
+
+    def __init__(self, db_path: str = "cache/chromadb/file_catalog.sqlite"):
+        """
+        Args:
+            db_path: SQLite文件路径
+        """
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "user_id TEXT NOT NULL, "
+            "file_id INTEGER NOT NULL, "
+            "file_name TEXT, "
+            "file_type TEXT, "
+            "url TEXT, "
+            "folder_id INTEGER, "
+            "chunks INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, "
+            "updated_at REAL NOT NULL, "
+            "PRIMARY KEY (user_id, file_id))"
+        )
+        # 已经从ChromaDB补建过目录的用户
+        self._conn.execute("CREATE TABLE IF NOT EXISTS synced_users (user_id TEXT PRIMARY KEY)")
+        self._conn.commit()
+
+    def upsert(self, user_id, file_id: int, file_name: str, file_type: str, url: str, folder_id: int, chunks: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO files (user_id, file_id, file_name, file_type, url, folder_id, chunks, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (user_id, file_id) DO UPDATE SET file_name = excluded.file_name, file_type = excluded.file_type, "
+                "url = excluded.url, folder_id = excluded.folder_id, chunks = excluded.chunks, updated_at = excluded.updated_at",
+                (str(user_id), file_id, file_name, file_type, url, folder_id, chunks, now, now),
+            )
+            self._conn.commit()
+
+    def delete(self, user_id, file_id: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE user_id = ? AND file_id = ?", (str(user_id), file_id))
+            self._conn.commit()
+
+    def delete_user(self, user_id) -> None:
+        """删除用户的整个目录，对应删除用户的collection"""
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE user_id = ?", (str(user_id),))
+            self._conn.execute("DELETE FROM synced_users WHERE user_id = ?", (str(user_id),))
+            self._conn.commit()
+
+    def is_synced(self, user_id) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM synced_users WHERE user_id = ?", (str(user_id),)).fetchone()
+        return row is not None
+
+    def sync_user(self, user_id, load_metadatas: Callable[[], Iterable[Dict[str, Any]]]) -> bool:
+        """
+        用ChromaDB中分块的元数据补建用户的目录，只补充目录中还没有的文件
+        - 在锁内重新检查是否已经补建过，并发的请求只会补建一次
+        - load_metadatas 在锁内读取ChromaDB的快照，写入和删除文件时先修改ChromaDB再在锁内更新目录，
+          目录中已有的记录比快照新，不会被覆盖
+        Args:
+            load_metadatas: 返回分块元数据列表的函数
+        Returns:
+            是否执行了补建
+        """
+        user_id = str(user_id)
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM synced_users WHERE user_id = ?", (user_id,)).fetchone() is not None:
+                return False
+            files: Dict[Any, Dict[str, Any]] = {}
+            for meta in load_metadatas():
+                if not isinstance(meta, dict) or meta.get("file_id") is None:
+                    continue
+                one = files.get(meta["file_id"])
+                if one is None:
+                    files[meta["file_id"]] = dict(meta, chunks=1)
+                else:
+                    one["chunks"] += 1
+            now = time.time()
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO files (user_id, file_id, file_name, file_type, url, folder_id, chunks, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(user_id, one["file_id"], one.get("file_name"), one.get("file_type"), one.get("url"),
+                      one.get("folder_id"), one["chunks"], now, now) for one in files.values()],
+                )
+                self._conn.execute("INSERT OR IGNORE INTO synced_users (user_id) VALUES (?)", (user_id,))
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        logger.info(f"从ChromaDB补建用户 {user_id} 的文件目录，共 {len(files)} 个文件")
+        return True
+
+    def list_files(self, user_id, offset: int = 0, limit: int = 100) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        分页列出用户的文件，按文件id排序
+        Returns:
+            (文件列表, 文件总数)
+        """
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM files WHERE user_id = ?", (str(user_id),)).fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT file_id, file_name, file_type, url, folder_id, chunks FROM files WHERE user_id = ? "
+                "ORDER BY file_id LIMIT ? OFFSET ?",
+                (str(user_id), limit, offset),
+            ).fetchall()
+        return [dict(row, user_id=user_id) for row in rows], total
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2025/9/3
+# @Desc  : 文件入库的后台任务队列
+# - 任务保存在SQLite中，服务重启后未完成的任务会重新排队
+# - 多个worker协程从队列中取任务执行，上传接口只负责保存文件和提交任务，立即返回任务id
+# - 每个阶段(下载、转换、分块、向量化)的进度写回任务记录，供 /jobs/{job_id} 和 SSE 接口查询
+# - 转换完成后立即保存markdown，调用方不必等待向量化结束就可以开始生成大纲
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from executors import QueueFullError
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED_STATUSES = (DONE, FAILED)
+
+
+class IngestJobStore:
+    """基于SQLite的任务存储，线程安全，进度回调可以在线程池中直接调用"""
+
+    def __init__(self, db_path: str = "cache/ingest_jobs.sqlite"):
+        """
+        Args:
+            db_path: SQLite文件路径
+        """
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, "
+            "status TEXT NOT NULL, "
+            "stage TEXT NOT NULL, "
+            "progress TEXT NOT NULL DEFAULT '{}', "
+            "params TEXT NOT NULL, "
+            "markdown TEXT, "
+            "result TEXT, "
+            "error TEXT, "
+            "version INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def _to_dict(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["progress"] = json.loads(job["progress"] or "{}")
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def create(self, params: Dict[str, Any], markdown: Optional[str] = None) -> Dict[str, Any]:
+        """新建一个排队中的任务，已经转换好的文件可以同时保存markdown"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, stage, params, markdown, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, QUEUED, json.dumps(params, ensure_ascii=False), markdown, now, now),
+            )
+            self._conn.commit()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row)
+
+    def version(self, job_id: str) -> Optional[int]:
+        """任务记录的版本号，每次更新加1，SSE接口用它判断进度是否有变化"""
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """取出最早排队的任务并标记为执行中，没有任务时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, version = version + 1, updated_at = ? WHERE id = ?",
+                (RUNNING, "started", time.time(), row[0]),
+            )
+            self._conn.commit()
+            job_id = row[0]
+        return self.get(job_id)
+
+    def update(self, job_id: str, stage: Optional[str] = None, markdown: Optional[str] = None, **progress) -> None:
+        """更新任务的阶段和进度，progress中的字段会合并到已有的进度中"""
+        with self._lock:
+            row = self._conn.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            merged = json.loads(row[0] or "{}")
+            merged.update(progress)
+            sets = ["progress = ?", "version = version + 1", "updated_at = ?"]
+            values: list = [json.dumps(merged, ensure_ascii=False), time.time()]
+            if stage is not None:
+                sets.append("stage = ?")
+                values.append(stage)
+            if markdown is not None:
+                sets.append("markdown = ?")
+                values.append(markdown)
+            self._conn.execute(f"UPDATE jobs SET {', '.join(sets)} WHERE id = ?", (*values, job_id))
+            self._conn.commit()
+
+    def _set_status(self, job_id: str, status: str, stage: str, result=None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, result = ?, error = ?, version = version + 1, updated_at = ? WHERE id = ?",
+                (status, stage, json.dumps(result, ensure_ascii=False) if result is not None else None, error, time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def finish(self, job_id: str, result: Dict[str, Any]) -> None:
+        self._set_status(job_id, DONE, DONE, result=result)
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._set_status(job_id, FAILED, FAILED, error=error)
+
+    def requeue(self, job_id: str) -> None:
+        self._set_status(job_id, QUEUED, QUEUED)
+
+    def requeue_running(self) -> int:
+        """服务重启时，把上次没有执行完的任务重新排队"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, version = version + 1, updated_at = ? WHERE status = ?",
+                (QUEUED, QUEUED, time.time(), RUNNING),
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def purge(self, older_than: float) -> int:
+        """删除更新时间早于 older_than 秒之前的已结束任务"""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({','.join('?' * len(FINISHED_STATUSES))}) AND updated_at < ?",
+                (*FINISHED_STATUSES, time.time() - older_than),
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class JobProgress:
+    """传给任务处理函数的进度上报对象，可以在线程池中调用"""
+
+    def __init__(self, store: IngestJobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+
+    def update(self, stage: str, **progress) -> None:
+        self.store.update(self.job_id, stage=stage, **progress)
+
+    def set_markdown(self, markdown: str) -> None:
+        self.store.update(self.job_id, markdown=markdown)
+
+    def get_markdown(self) -> Optional[str]:
+        job = self.store.get(self.job_id)
+        return job["markdown"] if job else None
+
+
+JobHandler = Callable[[Dict[str, Any], JobProgress], Awaitable[Dict[str, Any]]]
+
+
+class IngestJobQueue:
+    """后台任务队列，多个worker协程从SQLite中取任务执行"""
+
+    def __init__(self, store: IngestJobStore, handler: JobHandler, workers: int = 2, max_queued: int = 100,
+                 retention: float = 7 * 24 * 3600):
+        """
+        Args:
+            store: 任务存储
+            handler: 执行任务的协程函数 handler(params, progress)，返回任务结果
+            workers: worker协程数量
+            max_queued: 排队任务数上限，超过后提交任务时抛出QueueFullError
+            retention: 已结束任务的保留时间（秒）
+        """
+        self.store = store
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.retention = retention
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks = []
+
+    async def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        requeued = self.store.requeue_running()
+        if requeued:
+            logger.info(f"重新排队上次未完成的入库任务 {requeued} 个")
+        purged = self.store.purge(self.retention)
+        if purged:
+            logger.info(f"清理过期的入库任务 {purged} 个")
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        # 重启后队列中可能已有任务
+        self._wakeup.set()
+        logger.info(f"入库任务队列已启动，worker数量: {self.workers}")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, params: Dict[str, Any], markdown: Optional[str] = None) -> Dict[str, Any]:
+        """提交任务，返回任务记录；markdown为已经转换好的内容，任务中不必再转换"""
+        queued = self.store.count(QUEUED)
+        if queued >= self.max_queued:
+            raise QueueFullError(f"入库任务队列已满，当前排队{queued}个，请稍后重试")
+        job = self.store.create(params, markdown=markdown)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        logger.info(f"提交入库任务: {job['id']}")
+        return job
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = self.store.claim_next()
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    # 定时检查一次，其它进程提交的任务也能被取到
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=5)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job, index)
+
+    async def _run(self, job: Dict[str, Any], index: int) -> None:
+        job_id = job["id"]
+        logger.info(f"worker {index} 开始执行入库任务: {job_id}")
+        try:
+            result = await self.handler(job["params"], JobProgress(self.store, job_id))
+        except asyncio.CancelledError:
+            # 服务关闭，任务保持执行中状态，下次启动时重新排队
+            raise
+        except QueueFullError as e:
+            # 执行器被同步请求占满，稍后重试，不算任务失败
+            logger.warning(f"入库任务 {job_id} 暂时无法执行，重新排队: {e}")
+            self.store.requeue(job_id)
+            await asyncio.sleep(1)
+            return
+        except Exception as e:
+            logger.error(f"入库任务 {job_id} 失败: {e}", exc_info=True)
+            self.store.fail(job_id, str(e))
+            return
+        self.store.finish(job_id, result)
+        logger.info(f"入库任务 {job_id} 完成")
+
+    async def watch(self, job_id: str, interval: float = 0.5) -> AsyncIterator[Dict[str, Any]]:
+        """任务记录每次变化时产出最新的记录，任务结束后停止"""
+        last_version = None
+        while True:
+            version = self.store.version(job_id)
+            if version is None:
+                return
+            if version != last_version:
+                last_version = version
+                job = self.store.get(job_id)
+                yield job
+                if job["status"] in FINISHED_STATUSES:
+                    return
+            await asyncio.sleep(interval)
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2025/9/3
+# @Desc  : 分块文本的倒排索引和BM25打分，用于混合检索(向量+关键词)
+# - 中文按连续汉字的二元组(bigram)切分，单个汉字保留为一元组，英文和数字按单词切分并转小写，不依赖分词库
+# - 索引保存在ChromaDB目录下的SQLite中，写入和删除文件向量时增量更新
+# - 旧的数据库没有索引，第一次混合检索某个用户时从ChromaDB中补建一次，补建在索引锁内的一个事务中完成
+# - reciprocal_rank_fusion 按排名融合向量检索和BM25的结果
+
+import os
+import re
+import math
+import logging
+import sqlite3
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 连续的汉字(含扩展A区和兼容区)、日文假名、韩文，或连续的字母数字
+_TOKEN_PATTERN = re.compile(r"[㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]+|[a-zA-Z0-9]+")
+_CJK_PATTERN = re.compile(r"[㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    切分文本，CJK部分使用二元组：'特斯拉汽车' -> ['特斯', '斯拉', '拉汽', '汽车']
+    """
+    tokens = []
+    for piece in _TOKEN_PATTERN.findall(text or ""):
+        if _CJK_PATTERN.match(piece):
+            if len(piece) == 1:
+                tokens.append(piece)
+            else:
+                tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+        else:
+            tokens.append(piece.lower())
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    RRF融合多个排序结果，score = Σ 1 / (k + 排名)，排名从1开始
+    Returns:
+        [(id, score)]，按score从大到小排序
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+
+
+class KeywordIndex:
+    """基于SQLite的按用户隔离的倒排索引，线程安全"""
+
+    def __init__(self, db_path: str = "cache/chromadb/keyword_index.sqlite", k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            db_path: SQLite文件路径
+            k1: BM25的词频饱和参数
+            b: BM25的文档长度归一化参数
+        """
+        self.db_path = db_path
+        self.k1 = k1
+        self.b = b
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "user_id TEXT NOT NULL, term TEXT NOT NULL, chunk_id TEXT NOT NULL, tf INTEGER NOT NULL, "
+            "PRIMARY KEY (user_id, term, chunk_id)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "user_id TEXT NOT NULL, chunk_id TEXT NOT NULL, file_id INTEGER, length INTEGER NOT NULL, terms TEXT NOT NULL, "
+            "PRIMARY KEY (user_id, chunk_id)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_file ON chunks (user_id, file_id)")
+        # 每个用户的分块数和总长度，计算BM25的idf和平均长度
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_stats (user_id TEXT PRIMARY KEY, chunks INTEGER NOT NULL, total_length INTEGER NOT NULL)"
+        )
+        # 已经从ChromaDB建立过索引的用户，之后只做增量更新
+        self._conn.execute("CREATE TABLE IF NOT EXISTS synced_users (user_id TEXT PRIMARY KEY)")
+        self._conn.commit()
+
+    def _remove_locked(self, user_id: str, chunk_ids: Iterable[str]) -> None:
+        removed_chunks = 0
+        removed_length = 0
+        for chunk_id in chunk_ids:
+            row = self._conn.execute(
+                "SELECT length, terms FROM chunks WHERE user_id = ? AND chunk_id = ?", (user_id, chunk_id)
+            ).fetchone()
+            if row is None:
+                continue
+            length, terms = row
+            self._conn.executemany(
+                "DELETE FROM postings WHERE user_id = ? AND term = ? AND chunk_id = ?",
+                [(user_id, term, chunk_id) for term in terms.split("\n") if term],
+            )
+            self._conn.execute("DELETE FROM chunks WHERE user_id = ? AND chunk_id = ?", (user_id, chunk_id))
+            removed_chunks += 1
+            removed_length += length
+        if removed_chunks:
+            self._conn.execute(
+                "UPDATE user_stats SET chunks = chunks - ?, total_length = total_length - ? WHERE user_id = ?",
+                (removed_chunks, removed_length, user_id),
+            )
+
+    def _add_locked(self, user_id: str, chunks: Iterable[Tuple[str, int, str]]) -> None:
+        """chunks: [(chunk_id, file_id, 分块文本)]，调用方需要先删除已存在的分块"""
+        added = 0
+        total_length = 0
+        for chunk_id, file_id, text in chunks:
+            counts = Counter(tokenize(text))
+            length = sum(counts.values())
+            added += 1
+            total_length += length
+            self._conn.execute(
+                "INSERT INTO chunks (user_id, chunk_id, file_id, length, terms) VALUES (?, ?, ?, ?, ?)",
+                (user_id, chunk_id, file_id, length, "\n".join(counts)),
+            )
+            self._conn.executemany(
+                "INSERT INTO postings (user_id, term, chunk_id, tf) VALUES (?, ?, ?, ?)",
+                [(user_id, term, chunk_id, tf) for term, tf in counts.items()],
+            )
+        if added:
+            self._conn.execute(
+                "INSERT INTO user_stats (user_id, chunks, total_length) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET chunks = chunks + excluded.chunks, total_length = total_length + excluded.total_length",
+                (user_id, added, total_length),
+            )
+
+    def add(self, user_id, file_id: int, chunks: Iterable[Tuple[str, str]]) -> None:
+        """
+        索引一个文件的分块，已存在的分块会先删除再重新索引
+        Args:
+            chunks: [(chunk_id, 分块文本)]
+        """
+        user_id = str(user_id)
+        chunks = list(chunks)
+        if not chunks:
+            return
+        with self._lock:
+            self._remove_locked(user_id, [chunk_id for chunk_id, _ in chunks])
+            self._add_locked(user_id, [(chunk_id, file_id, text) for chunk_id, text in chunks])
+            self._conn.commit()
+
+    def remove(self, user_id, chunk_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._remove_locked(str(user_id), chunk_ids)
+            self._conn.commit()
+
+    def remove_file(self, user_id, file_id: int) -> None:
+        user_id = str(user_id)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id FROM chunks WHERE user_id = ? AND file_id = ?", (user_id, file_id)
+            ).fetchall()
+            self._remove_locked(user_id, [row[0] for row in rows])
+            self._conn.commit()
+
+    def remove_user(self, user_id) -> None:
+        user_id = str(user_id)
+        with self._lock:
+            self._conn.execute("DELETE FROM postings WHERE user_id = ?", (user_id,))
+            self._conn.execute("DELETE FROM chunks WHERE user_id = ?", (user_id,))
+            self._conn.execute("DELETE FROM user_stats WHERE user_id = ?", (user_id,))
+            self._conn.execute("DELETE FROM synced_users WHERE user_id = ?", (user_id,))
+            self._conn.commit()
+
+    def is_synced(self, user_id) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM synced_users WHERE user_id = ?", (str(user_id),)).fetchone()
+        return row is not None
+
+    def rebuild_user(self, user_id, load_chunks: Callable[[], Iterable[Tuple[str, int, str]]]) -> bool:
+        """
+        用ChromaDB中的数据补建用户的索引，只补充索引中还没有的分块
+        - 在锁内重新检查是否已经补建过，并发的检索请求只会补建一次
+        - load_chunks 在锁内读取ChromaDB的快照，写入和删除分块时先修改ChromaDB再在锁内更新索引，
+          所以快照之前的修改已经反映在快照里，之后的修改会在补建完成后再更新索引，不会被补建覆盖
+        - 补建在一个事务中完成，其它请求不会看到补建到一半的索引
+        Args:
+            load_chunks: 返回 [(chunk_id, file_id, 分块文本)] 的函数
+        Returns:
+            是否执行了补建
+        """
+        user_id = str(user_id)
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM synced_users WHERE user_id = ?", (user_id,)).fetchone() is not None:
+                return False
+            indexed = {row[0] for row in self._conn.execute("SELECT chunk_id FROM chunks WHERE user_id = ?", (user_id,))}
+            missing = [(chunk_id, file_id, text or "") for chunk_id, file_id, text in load_chunks() if chunk_id not in indexed]
+            try:
+                self._add_locked(user_id, missing)
+                self._conn.execute("INSERT OR IGNORE INTO synced_users (user_id) VALUES (?)", (user_id,))
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        logger.info(f"补建用户 {user_id} 的关键词索引，新增 {len(missing)} 个分块，已有 {len(indexed)} 个")
+        return True
+
+    def search(self, user_id, query: str, topk: int = 10) -> List[Tuple[str, float]]:
+        """
+        BM25检索
+        Returns:
+            [(chunk_id, score)]，按score从大到小排序
+        """
+        user_id = str(user_id)
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        placeholders = ",".join("?" * len(terms))
+        with self._lock:
+            stats = self._conn.execute(
+                "SELECT chunks, total_length FROM user_stats WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if stats is None or stats[0] <= 0:
+                return []
+            doc_freq = dict(self._conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE user_id = ? AND term IN ({placeholders}) GROUP BY term",
+                (user_id, *terms),
+            ).fetchall())
+            rows = self._conn.execute(
+                f"SELECT p.chunk_id, p.term, p.tf, c.length FROM postings p "
+                f"JOIN chunks c ON c.user_id = p.user_id AND c.chunk_id = p.chunk_id "
+                f"WHERE p.user_id = ? AND p.term IN ({placeholders})",
+                (user_id, *terms),
+            ).fetchall()
+        chunk_num, total_length = stats
+        avg_length = total_length / chunk_num if chunk_num else 1.0
+        scores: Dict[str, float] = {}
+        for chunk_id, term, tf, length in rows:
+            df = doc_freq.get(term, 0)
+            idf = math.log(1 + (chunk_num - df + 0.5) / (df + 0.5))
+            norm = tf + self.k1 * (1 - self.b + self.b * length / (avg_length or 1.0))
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:topk]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
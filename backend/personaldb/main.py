@@ -10,16 +10,18 @@ import uvicorn
 import logging
 import asyncio
 import uuid
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Request
+import hashlib
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Request, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, ValidationError
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import embedding_utils
-from embedding_utils import cache_decorator
+import executors
+from executors import QueueFullError
+from ingest_jobs import IngestJobStore, IngestJobQueue, JobProgress
 from urllib.parse import urlparse
-from core.magic_pdf_converter import MagicPDFConverter
-from core.markitdown_converter import MarkItDownConverter
-from core.chunkers.semantic_chunker import SemanticChunker
-from core.chunkers.fast_chunker import FastChunker
+from document_pipeline import _chunk_text, chunk_markdown, convert_and_chunk, convert_to_markdown
+from utils.file_handler import FileHandler
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -32,6 +34,34 @@ TEMP_DIR = "temp_download"
 if not os.path.exists(TEMP_DIR):
     os.makedirs(TEMP_DIR)
 
+# URL文件下载器：流式写入磁盘、限制大小、中断后按Range续传，下载时同时计算MD5
+file_downloader = FileHandler(
+    timeout=60,
+    max_size=int(os.environ.get("PERSONALDB_MAX_DOWNLOAD_MB", "100")) * 1024 * 1024,
+    max_retries=int(os.environ.get("PERSONALDB_DOWNLOAD_RETRIES", "3")),
+)
+
+@app.on_event("startup")
+def init_shared_clients():
+    """启动时创建共享的向量模型客户端和ChromaDB，后续请求直接复用"""
+    try:
+        embedding_utils.get_chroma()
+        logger.info("向量模型和ChromaDB初始化完成")
+    except Exception as e:
+        # 配置有误时不影响服务启动，第一次请求时会再次尝试并返回错误信息
+        logger.error(f"初始化向量模型或ChromaDB失败: {e}", exc_info=True)
+
+
+@app.on_event("shutdown")
+def close_shared_clients():
+    executors.shutdown_executors()
+    embedding_utils.reset_instances()
+
+
+def _queue_full_exception(e: QueueFullError) -> HTTPException:
+    logger.warning(str(e))
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
 # RabbitMQ消息处理类
 
 class SearchQuery(BaseModel):
@@ -39,88 +69,99 @@ class SearchQuery(BaseModel):
     query: str
     keyword: Optional[str] = ""
     topk: Optional[int] = 3
+    mode: Optional[str] = None  # vector: 只用向量检索; hybrid: 向量检索+BM25关键词检索，按RRF融合; 默认读取PERSONALDB_SEARCH_MODE
+
+SEARCH_MODES = ("vector", "hybrid")
+
+def _check_search_mode(mode: Optional[str]) -> None:
+    if mode and mode.lower() not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode只支持{'/'.join(SEARCH_MODES)}")
 
 @app.post("/search")
-def search_personal_knowledge_base(query: SearchQuery):
+async def search_personal_knowledge_base(query: SearchQuery):
     """
-    搜索个人知识库
+    搜索个人知识库，在独立的搜索线程池中执行，不受文件入库影响
     """
+    _check_search_mode(query.mode)
     try:
         logger.info(f"收到搜索请求: {query}")
-        embedder = embedding_utils.EmbeddingModel()
-        chroma = embedding_utils.ChromaDB(embedder)
+        chroma = embedding_utils.get_chroma()
         collection_name = f"user_{query.userId}"
 
-        result = chroma.query2collection(
+        result = await executors.search_executor.run(
+            chroma.query2collection,
             collection=collection_name,
             query_documents=[query.query],
             keyword=query.keyword,
-            topk=query.topk
+            topk=query.topk,
+            mode=query.mode
         )
         logger.info(f"搜索成功: {result}")
         return result
+    except QueueFullError as e:
+        raise _queue_full_exception(e)
     except Exception as e:
         logger.error(f"搜索失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
 
-@cache_decorator
-def _get_markdown_content(file_path: str, file_name: str) -> str:
-    """
-    根据文件类型选择合适的转换器，将文件内容转换为Markdown格式。
-    PDF文件使用MagicPDFConverter（MinerU），其他文件使用MarkitdownConverter。
-    """
-    # 获取文件扩展名, 是否可以使用MinerU，如果不用显卡速度太慢
-    USE_MINERU = os.environ.get("USE_MINERU", "false")
-    if USE_MINERU.lower() == "true":
-        CAN_USE_MINERU = True
-    else:
-        CAN_USE_MINERU = False
-    file_extension = os.path.splitext(file_name)[1].lower() if file_name else ""
-
-    # 根据文件类型选择转换器
-    if CAN_USE_MINERU and file_extension == '.pdf':
-        # 使用 MinerU (MagicPDFConverter) 处理PDF
-        logger.info(f"使用PDF转换器(MinerU)处理文件: {file_path}")
-        converter = MagicPDFConverter(output_dir="./output_pdf")
-        content, _ = converter.convert_pdf_file(file_path)
-        return True, content
-    else:
-        # 使用 markitdown 处理其他文件
-        logger.info(f"使用Markitdown转换器处理文件: {file_path}")
-        converter = MarkItDownConverter(use_magic_pdf=False)  #use_magic_pdf设定是否使用MinerU
-        content, _ = converter.convert_file(file_path)
-        return True, content
+# 批量搜索单次最多的查询数
+MAX_BATCH_QUERIES = int(os.environ.get("PERSONALDB_MAX_BATCH_QUERIES", "64"))
 
+class BatchSearchQuery(BaseModel):
+    userId: int | str
+    queries: List[str]
+    keyword: Optional[str] = ""
+    topk: Optional[int] = 3
+    merge: Optional[bool] = False  # 是否返回所有查询结果去重后的合并结果
+    mergeTopk: Optional[int] = None  # 合并结果的数量，默认等于topk
+    mode: Optional[str] = None  # 同 /search
 
-def process_and_vectorize_local_file(file_name: str, temp_file_path: str, id: int, user_id: int|str, file_type: str, url: str, folder_id: int):
+@app.post("/search/batch")
+async def batch_search_personal_knowledge_base(query: BatchSearchQuery):
     """
-    从本地文件路径处理文件、进行向量化并存储
+    批量搜索个人知识库，所有查询一次向量化、一次ChromaDB查询，例如一次取回整份PPT各页需要的资料
+    返回 {"results": [每个查询的结果，顺序与queries一致], "merged": [去重后按距离排序的结果，merge为true时返回]}
     """
-    # 步骤2: 使用适当的转换器读取文件内容
-    logger.info(f"开始读取文件内容: {temp_file_path}")
-    
-    status, markdown_content = _get_markdown_content(temp_file_path, file_name)
-
-    if not markdown_content or not markdown_content.strip():
-        logger.error(f"文件内容为空或无效: {temp_file_path}")
-        raise ValueError("文件内容为空或无效")
-    logger.info(f"文件内容读取成功，准备进行分块。")
-
-    # 对Markdown格式进行Trunk(分块)
-    documents = _chunk_text(markdown_content)
-    if not documents:
-        raise ValueError("分块后内容为空")
-    logger.info(f"内容分块成功，共 {len(documents)} 块。")
+    _check_search_mode(query.mode)
+    queries = query.queries
+    if not queries:
+        raise HTTPException(status_code=400, detail="queries不能为空")
+    # 结果按位置与queries一一对应，不能静默跳过空查询
+    blank = [i for i, q in enumerate(queries) if not q or not q.strip()]
+    if blank:
+        raise HTTPException(status_code=400, detail=f"queries中下标为{blank}的查询为空")
+    if len(queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"单次最多{MAX_BATCH_QUERIES}个查询，当前{len(queries)}个")
+    try:
+        logger.info(f"收到批量搜索请求: userId={query.userId}, 查询数={len(queries)}")
+        chroma = embedding_utils.get_chroma()
+        collection_name = f"user_{query.userId}"
 
-    # 步骤3: 检查环境变量
-    if not os.getenv("ALI_API_KEY"):
-        logger.error("ALI_API_KEY环境变量未设置")
-        raise ValueError("ALI_API_KEY环境变量未设置")
+        result = await executors.search_executor.run(
+            chroma.batch_query,
+            collection=collection_name,
+            queries=queries,
+            keyword=query.keyword,
+            topk=query.topk,
+            merge_topk=(query.mergeTopk or query.topk) if query.merge else None,
+            mode=query.mode,
+        )
+        logger.info(f"批量搜索成功，查询数: {len(queries)}")
+        return result
+    except QueueFullError as e:
+        raise _queue_full_exception(e)
+    except Exception as e:
+        logger.error(f"批量搜索失败: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"批量搜索失败: {str(e)}")
 
+def _vectorize_documents(file_name: str, documents: List[str], id: int, user_id: int|str, file_type: str, url: str, folder_id: int, progress_callback=None):
+    """
+    对分块生成embedding向量并写入ChromaDB，返回embedding结果
+    progress_callback: 可选，向量化的进度回调 progress_callback(已完成数, 总数)
+    """
+    # 向量模型的配置(API Key、本地模型目录等)由 embedding_utils.get_embedder() 按 EMBEDDING_PROVIDER 校验
     # 步骤4: 使用embedding_utils生成embedding向量并插入向量
-    logger.info("初始化embedding模型")
-    embedder = embedding_utils.EmbeddingModel()
-    chroma = embedding_utils.ChromaDB(embedder)
+    chroma = embedding_utils.get_chroma()
     logger.info(f"开始插入文件 {id} 的向量")
     embedding_result = chroma.insert_file_vectors(
         file_name=file_name,
@@ -129,11 +170,15 @@ def process_and_vectorize_local_file(file_name: str, temp_file_path: str, id: in
         file_type=file_type or "unknown",
         url=url or "",
         folder_id=folder_id or 0,
-        documents=documents
+        documents=documents,
+        progress_callback=progress_callback
     )
     logger.info("向量插入成功")
+    return embedding_result
 
-    result = {
+
+def _build_file_result(file_name: str, id: int, user_id: int|str, file_type: str, url: str, folder_id: int, embedding_result, markdown_content: str):
+    return {
         "id": id,
         "file_name": file_name,
         "userId": user_id,
@@ -143,13 +188,33 @@ def process_and_vectorize_local_file(file_name: str, temp_file_path: str, id: in
         "embedding_result": embedding_result,
         "markdown_content": markdown_content
     }
+
+
+async def aprocess_and_vectorize_local_file(file_name: str, temp_file_path: str, id: int, user_id: int|str, file_type: str, url: str, folder_id: int, md5_hash: Optional[str] = None):
+    """
+    从本地文件路径处理文件、进行向量化并存储
+    文件转换和分块在进程池中执行，向量化和写入ChromaDB在线程池中执行，不阻塞事件循环
+    md5_hash: 保存或下载文件时已经计算的MD5，转换缓存查找时不必再读一遍文件
+    """
+    markdown_content, documents = await executors.cpu_executor.run(convert_and_chunk, temp_file_path, file_name, md5_hash)
+    embedding_result = await executors.ingest_io_executor.run(
+        _vectorize_documents, file_name, documents, id, user_id, file_type, url, folder_id
+    )
     logger.info(f"处理OK。。。")
-    return result
+    return _build_file_result(file_name, id, user_id, file_type, url, folder_id, embedding_result, markdown_content)
+
+
+def _download_file(url: str, temp_file_path: str) -> str:
+    """流式下载文件，返回文件的MD5"""
+    logger.info(f"开始下载文件: {url}")
+    file_size, md5_hash = file_downloader.download_to_file(url, temp_file_path)
+    logger.info(f"文件下载成功: {temp_file_path}, 大小: {file_size} 字节")
+    return md5_hash
 
 
-def process_file_sync(file_name:str, id: int, user_id: int|str, file_type: str, url: str, folder_id: int):
+async def process_url_file(file_name:str, id: int, user_id: int|str, file_type: str, url: str, folder_id: int):
     """
-    处理文件下载、读取和生成embedding的同步版本
+    处理文件下载、读取和生成embedding
     """
     if not url:
         logger.error("url为空")
@@ -166,15 +231,10 @@ def process_file_sync(file_name:str, id: int, user_id: int|str, file_type: str,
     try:
         # 步骤1: 下载文件
         # file_name = os.path.basename(parsed_url.path) or f"downloaded_file_{user_id}"
-        temp_file_path = os.path.join(TEMP_DIR, file_name)
-        logger.info(f"开始下载文件: {url}")
-        response = requests.get(url, timeout=60, proxies=None)
-        response.raise_for_status()
-        with open(temp_file_path, 'wb') as f:
-            f.write(response.content)
-        logger.info(f"文件下载成功: {temp_file_path}")
+        temp_file_path = os.path.join(TEMP_DIR, f"{uuid.uuid4()}_{file_name}")
+        md5_hash = await executors.ingest_io_executor.run(_download_file, url, temp_file_path)
 
-        return process_and_vectorize_local_file(file_name, temp_file_path, id, user_id, file_type, url, folder_id)
+        return await aprocess_and_vectorize_local_file(file_name, temp_file_path, id, user_id, file_type, url, folder_id, md5_hash)
 
     except requests.exceptions.Timeout as e:
         logger.error(f"下载文件超时: {str(e)}", exc_info=True)
@@ -182,7 +242,7 @@ def process_file_sync(file_name:str, id: int, user_id: int|str, file_type: str,
     except requests.exceptions.RequestException as e:
         logger.error(f"下载文件失败: {str(e)}", exc_info=True)
         raise ValueError(f"下载文件失败: {str(e)}")
-    except ValueError as e:
+    except (ValueError, QueueFullError) as e:
         logger.error(f"处理失败: {str(e)}", exc_info=True)
         raise
     except Exception as e:
@@ -194,6 +254,122 @@ def process_file_sync(file_name:str, id: int, user_id: int|str, file_type: str,
             logger.info(f"临时文件已删除: {temp_file_path}")
 
 
+# 保存上传文件时每次读写的字节数
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def _save_upload(src, file_path: str) -> Tuple[int, str]:
+    """
+    把上传的文件对象按块复制到 file_path，同时计算MD5，返回 (写入的字节数, MD5)
+    上传内容已由Starlette写入SpooledTemporaryFile，这里不会把整个文件读入内存
+    """
+    src.seek(0)
+    hash_md5 = hashlib.md5()
+    file_size = 0
+    with open(file_path, "wb") as buffer:
+        for chunk in iter(lambda: src.read(UPLOAD_CHUNK_SIZE), b""):
+            buffer.write(chunk)
+            hash_md5.update(chunk)
+            file_size += len(chunk)
+    return file_size, hash_md5.hexdigest()
+
+
+async def run_ingest_job(params: dict, progress: JobProgress) -> dict:
+    """
+    执行后台入库任务，依次上报进度：downloading -> converting -> converted(带分块数) -> embedding(N/M) -> 完成
+    转换完成后立即保存markdown，调用方可以先用markdown生成大纲
+    /convert 提交的任务已经保存了markdown(任务参数中converted为true)，这里读取后只做分块，不再转换文件
+    """
+    file_name = params["fileName"]
+    file_path = params.get("filePath")
+    url = params.get("url") or ""
+    md5_hash = params.get("md5")
+    try:
+        if params.get("converted"):
+            markdown_content = progress.get_markdown()
+            if not markdown_content:
+                raise ValueError("任务中没有转换后的markdown")
+            documents = await executors.cpu_executor.run(chunk_markdown, markdown_content)
+        else:
+            if not file_path:
+                # URL任务在worker中下载
+                progress.update("downloading")
+                file_path = os.path.join(TEMP_DIR, f"{uuid.uuid4()}_{file_name}")
+                try:
+                    md5_hash = await executors.ingest_io_executor.run(_download_file, url, file_path)
+                except requests.exceptions.RequestException as e:
+                    raise ValueError(f"下载文件失败: {str(e)}")
+
+            progress.update("converting")
+            markdown_content, documents = await executors.cpu_executor.run(convert_and_chunk, file_path, file_name, md5_hash)
+            progress.set_markdown(markdown_content)
+        progress.update("converted", chunks=len(documents), embedded=0, total=len(documents))
+
+        def on_embedded(done: int, total: int) -> None:
+            progress.update("embedding", embedded=done, total=total)
+
+        embedding_result = await executors.ingest_io_executor.run(
+            _vectorize_documents, file_name, documents, params["fileId"], params["userId"],
+            params.get("fileType"), url, params.get("folderId", 0), on_embedded
+        )
+    except (QueueFullError, asyncio.CancelledError):
+        # 任务会重新排队，上传的文件还需要使用，不删除；URL任务重新执行时会重新下载
+        if not params.get("filePath") and file_path and os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    except Exception:
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    if file_path and os.path.exists(file_path):
+        os.remove(file_path)
+        logger.info(f"临时文件已删除: {file_path}")
+    # 任务结果中不保存向量本身，只保存数量
+    summary = {k: v for k, v in embedding_result.items() if k != "data"}
+    return _build_file_result(file_name, params["fileId"], params["userId"], params.get("fileType"), url,
+                              params.get("folderId", 0), summary, markdown_content=None)
+
+
+# 后台入库任务队列，上传时传入 background=true 使用
+job_queue = IngestJobQueue(
+    IngestJobStore(os.environ.get("PERSONALDB_JOB_DB", "cache/ingest_jobs.sqlite")),
+    run_ingest_job,
+    workers=int(os.environ.get("PERSONALDB_JOB_WORKERS", "2")),
+    max_queued=int(os.environ.get("PERSONALDB_MAX_QUEUED_JOBS", "100")),
+)
+
+
+@app.on_event("startup")
+async def start_job_queue():
+    await job_queue.start()
+
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+
+
+def _job_response(job: dict, include_markdown: bool = True) -> dict:
+    result = {
+        "jobId": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": job["progress"],
+        "markdownReady": job["markdown"] is not None,
+        "result": job["result"],
+        "error": job["error"],
+        "createdAt": job["created_at"],
+        "updatedAt": job["updated_at"],
+    }
+    if include_markdown:
+        result["markdown_content"] = job["markdown"]
+    return result
+
+
+def _is_true(value) -> bool:
+    return str(value).strip().lower() in ("1", "true", "yes")
+
+
 @app.post("/upload/")
 async def upload_and_vectorize_endpoint(request: Request):
     """
@@ -209,91 +385,212 @@ async def upload_and_vectorize_endpoint(request: Request):
     - fileType: str (可选)
     - url: str (可选，与 file 互斥)
     - file: UploadFile (可选，与 url 互斥)
+    - background: bool (可选，默认false)，为true时提交后台任务并立即返回jobId(202)，
+      通过 /jobs/{jobId} 或 /jobs/{jobId}/events 查询进度和转换后的markdown
     """
-    temp_file_path = None
     try:
-        # 统一解析 body
-        content_type = request.headers.get("content-type", "")
-        data = {}
-        upload_file: UploadFile | None = None
+        # 同时处理的入库请求超过上限时直接返回503
+        with executors.ingest_limiter.reserve():
+            return await _handle_upload(request)
+    except QueueFullError as e:
+        raise _queue_full_exception(e)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"上传和向量化失败: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
 
-        if "application/json" in content_type:
-            data = await request.json()
-        else:
-            # 对 multipart/form-data 与 x-www-form-urlencoded 都适用
-            form = await request.form()
-            data = dict(form)
-            possible_file = form.get("file")
-            if possible_file:
-                upload_file = possible_file
-
-        # 参数解析与校验
-        userId = data.get("userId")
-        fileId = data.get("fileId")
-
-        if userId is None:
-            raise HTTPException(status_code=422, detail="缺少或非法参数: userId")
-        if fileId is None:
-            raise HTTPException(status_code=422, detail="缺少或非法参数: fileId")
-
-        folderId = int(data.get("folderId", 0))
-        fileType = data.get("fileType")
-        url = data.get("url")
-
-        # 互斥校验
-        has_url = bool(url and str(url).strip())
-        has_file = upload_file is not None
-        if not has_url and not has_file:
-            raise HTTPException(status_code=400, detail="必须提供 'url' 或 'file'")
-        if has_url and has_file:
-            raise HTTPException(status_code=400, detail="只能提供 'url' 或 'file' 中的一个")
-
-        # 分支：文件上传
-        if has_file:
-            # 推断 fileType
-            if not fileType and upload_file and upload_file.filename:
-                fileType = upload_file.filename.split(".")[-1] if "." in upload_file.filename else "unknown"
-
-            temp_file_name = f"{uuid.uuid4()}_{upload_file.filename or 'uploaded_file'}"
-            temp_file_path = os.path.join(TEMP_DIR, temp_file_name)
-            # 保存上传内容
-            content_bytes = await upload_file.read()
-            with open(temp_file_path, "wb") as buffer:
-                buffer.write(content_bytes)
-            logger.info(f"文件上传成功: {temp_file_path}")
-
-            return process_and_vectorize_local_file(
-                file_name=upload_file.filename or "uploaded_file",
-                temp_file_path=temp_file_path,
-                id=fileId,
-                user_id=userId,
-                file_type=fileType,
-                url="",  # 直接上传无 URL
-                folder_id=folderId
-            )
 
-        # 分支：URL 下载处理
-        else:
-            file_name = os.path.basename(urlparse(url).path) or f"downloaded_file_{userId}"
-            return process_file_sync(
-                file_name=file_name,
-                id=fileId,
-                user_id=userId,
-                file_type=fileType,
-                url=url,
-                folder_id=folderId
-            )
+async def _parse_upload_request(request: Request) -> dict:
+    """
+    解析/upload/和/convert的请求内容，上传的文件保存到临时目录
+    返回: userId, fileId, folderId, fileType, url, background, fileName, filePath(上传文件时)
+    """
+    # 统一解析 body
+    content_type = request.headers.get("content-type", "")
+    data = {}
+    upload_file: UploadFile | None = None
+
+    if "application/json" in content_type:
+        data = await request.json()
+    else:
+        # 对 multipart/form-data 与 x-www-form-urlencoded 都适用
+        form = await request.form()
+        data = dict(form)
+        possible_file = form.get("file")
+        if possible_file:
+            upload_file = possible_file
+
+    # 参数解析与校验
+    userId = data.get("userId")
+    fileId = data.get("fileId")
+
+    if userId is None:
+        raise HTTPException(status_code=422, detail="缺少或非法参数: userId")
+    if fileId is None:
+        raise HTTPException(status_code=422, detail="缺少或非法参数: fileId")
+
+    folderId = int(data.get("folderId", 0))
+    fileType = data.get("fileType")
+    url = data.get("url")
+    background = _is_true(data.get("background", False))
+
+    # 互斥校验
+    has_url = bool(url and str(url).strip())
+    has_file = upload_file is not None
+    if not has_url and not has_file:
+        raise HTTPException(status_code=400, detail="必须提供 'url' 或 'file'")
+    if has_url and has_file:
+        raise HTTPException(status_code=400, detail="只能提供 'url' 或 'file' 中的一个")
+
+    params = {
+        "userId": userId,
+        "fileId": fileId,
+        "folderId": folderId,
+        "fileType": fileType,
+        "url": "",
+        "background": background,
+    }
+    # 分支：文件上传
+    if has_file:
+        # 推断 fileType
+        if not fileType and upload_file and upload_file.filename:
+            params["fileType"] = upload_file.filename.split(".")[-1] if "." in upload_file.filename else "unknown"
+
+        temp_file_name = f"{uuid.uuid4()}_{upload_file.filename or 'uploaded_file'}"
+        temp_file_path = os.path.join(TEMP_DIR, temp_file_name)
+        # 保存上传内容
+        file_size, md5_hash = await executors.ingest_io_executor.run(_save_upload, upload_file.file, temp_file_path)
+        logger.info(f"文件上传成功: {temp_file_path}, 大小: {file_size} 字节")
+        params["fileName"] = upload_file.filename or "uploaded_file"
+        params["filePath"] = temp_file_path
+        params["md5"] = md5_hash
+
+    # 分支：URL 下载处理
+    else:
+        if not str(url).startswith(("http://", "https://")):
+            raise HTTPException(status_code=400, detail="url必须以http://或https://开头")
+        params["fileName"] = os.path.basename(urlparse(url).path) or f"downloaded_file_{userId}"
+        params["url"] = url
+    return params
+
+
+async def _handle_upload(request: Request):
+    """解析/upload/的请求内容，保存或下载文件后入库"""
+    params = await _parse_upload_request(request)
+    if params.pop("background"):
+        return _submit_job(**params)
+
+    if params.get("filePath"):
+        return await aprocess_and_vectorize_local_file(
+            file_name=params["fileName"],
+            temp_file_path=params["filePath"],
+            id=params["fileId"],
+            user_id=params["userId"],
+            file_type=params["fileType"],
+            url="",  # 直接上传无 URL
+            folder_id=params["folderId"],
+            md5_hash=params["md5"]
+        )
+    return await process_url_file(
+        file_name=params["fileName"],
+        id=params["fileId"],
+        user_id=params["userId"],
+        file_type=params["fileType"],
+        url=params["url"],
+        folder_id=params["folderId"]
+    )
+
 
+@app.post("/convert")
+async def convert_endpoint(request: Request):
+    """
+    只做文件转换：返回markdown后，向量化和写入ChromaDB作为后台任务继续执行
+    请求字段与 /upload/ 相同，返回:
+    - markdown_content: 转换后的markdown
+    - jobId: 后台向量化任务的id，可通过 /jobs/{jobId} 或 /jobs/{jobId}/events 查看进度
+    生成大纲只需要markdown，不必等待分块和向量化完成；markdown保存在任务中，任务只做分块和向量化，不再转换文件
+    """
+    try:
+        with executors.ingest_limiter.reserve():
+            params = await _parse_upload_request(request)
+            params.pop("background")
+            file_path = params.pop("filePath", None)
+            md5_hash = params.get("md5")
+            try:
+                if not file_path:
+                    file_path = os.path.join(TEMP_DIR, f"{uuid.uuid4()}_{params['fileName']}")
+                    md5_hash = await executors.ingest_io_executor.run(_download_file, params["url"], file_path)
+                markdown_content = await executors.cpu_executor.run(convert_to_markdown, file_path, params["fileName"], md5_hash)
+            finally:
+                if file_path and os.path.exists(file_path):
+                    os.remove(file_path)
+            # 任务参数中不保存分块，markdown和任务一起保存，任务中读取后再分块
+            job = job_queue.submit({**params, "converted": True}, markdown=markdown_content)
+            logger.info(f"文件转换完成，向量化任务: {job['id']}")
+            return {
+                **_job_response(job, include_markdown=False),
+                "markdown_content": markdown_content,
+            }
+    except QueueFullError as e:
+        raise _queue_full_exception(e)
     except HTTPException:
         raise
+    except requests.exceptions.RequestException as e:
+        logger.error(f"下载文件失败: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=400, detail=f"下载文件失败: {str(e)}")
+    except ValueError as e:
+        logger.error(f"文件转换失败: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"上传和向量化失败: {str(e)}", exc_info=True)
+        logger.error(f"文件转换失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        pass
-        # if temp_file_path and os.path.exists(temp_file_path):
-        #     os.remove(temp_file_path)
-        #     logger.info(f"临时文件已删除: {temp_file_path}")
+
+
+def _submit_job(**params) -> JSONResponse:
+    """提交后台入库任务，返回202和任务id"""
+    job = job_queue.submit(params)
+    return JSONResponse(status_code=202, content=_job_response(job, include_markdown=False))
+
+
+@app.get("/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """
+    查询后台入库任务的状态
+    - status: queued/running/done/failed
+    - stage: queued/started/downloading/converting/converted/embedding/done/failed
+    - progress: {"chunks": 分块数, "embedded": 已向量化数, "total": 总数}
+    - markdown_content: 转换完成后即有值，不必等待向量化结束
+    """
+    job = job_queue.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    return _job_response(job)
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_ingest_job(job_id: str):
+    """
+    SSE推送后台入库任务的进度，每次进度变化推送一条，任务结束后推送 [DONE]
+    markdown_content 只在第一次可用时推送一次
+    """
+    if job_queue.store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+
+    async def event_generator():
+        markdown_sent = False
+        async for job in job_queue.watch(job_id):
+            send_markdown = job["markdown"] is not None and not markdown_sent
+            markdown_sent = markdown_sent or send_markdown
+            payload = json.dumps(_job_response(job, include_markdown=send_markdown), ensure_ascii=False)
+            yield f"data: {payload}\n\n".encode("utf-8")
+        yield b"data: [DONE]\n\n"
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"},
+    )
 
 
 class TextVectorizeBody(BaseModel):
@@ -311,19 +608,7 @@ class TextVectorizeBody(BaseModel):
     folderId: Optional[int] = 0
 
 
-def _chunk_text(text: str, max_chars: int = 1200, overlap: int = 200) -> List[str]:
-    """
-    使用 SemanticChunker 进行分块。
-    """
-    text = (text or "").strip()
-    if not text:
-        return []
-    chunker = FastChunker(max_tokens=max_chars)
-    chunks = chunker.chunk_text(text)
-    return [chunk.content for chunk in chunks]
-
-
-def process_text_content(
+async def process_text_content(
     file_name: str,
     text: str,
     id: int,
@@ -335,26 +620,21 @@ def process_text_content(
     """
     直接对纯文本进行向量化并落库（Chroma）。
     其余参数默认空/0，以满足“无需额外参数”的需求。
+    分块在进程池中执行，向量化和写入在线程池中执行。
     """
     logger.info("开始处理纯文本向量化")
     if not text or not text.strip():
         raise ValueError("content 不能为空")
 
-    # 与现有流程保持一致的环境变量校验
-    if not os.getenv("ALI_API_KEY"):
-        logger.error("ALI_API_KEY环境变量未设置")
-        raise ValueError("ALI_API_KEY环境变量未设置")
-
-    documents = _chunk_text(text)
+    documents = await executors.cpu_executor.run(_chunk_text, text)
     if not documents:
         raise ValueError("content 无有效文本")
 
-    logger.info("初始化 embedding 模型与 Chroma")
-    embedder = embedding_utils.EmbeddingModel()
-    chroma = embedding_utils.ChromaDB(embedder)
+    chroma = embedding_utils.get_chroma()
 
     logger.info(f"插入文本向量：fileId={id}, userId={user_id}")
-    embedding_result = chroma.insert_file_vectors(
+    embedding_result = await executors.ingest_io_executor.run(
+        chroma.insert_file_vectors,
         file_name=file_name,
         user_id=user_id or 0,
         file_id=id,
@@ -379,7 +659,7 @@ def process_text_content(
 
 # ===== 纯文本向量化接口 =====
 @app.post("/vectorize/text")
-def vectorize_text_endpoint(body: TextVectorizeBody):
+async def vectorize_text_endpoint(body: TextVectorizeBody):
     """
     纯文本向量化：
     - 必填：content, fileId, fileName
@@ -389,37 +669,41 @@ def vectorize_text_endpoint(body: TextVectorizeBody):
         logger.info(
             f"收到文本向量化请求: fileId={body.fileId}, fileName={body.fileName}, userId={body.userId}"
         )
-        return process_text_content(
-            file_name=body.fileName,
-            text=body.content,
-            id=body.fileId,
-            user_id=body.userId or 0,
-            file_type=body.fileType,
-            folder_id=body.folderId or 0,
-            url=body.url or ""
-        )
+        with executors.ingest_limiter.reserve():
+            return await process_text_content(
+                file_name=body.fileName,
+                text=body.content,
+                id=body.fileId,
+                user_id=body.userId or 0,
+                file_type=body.fileType,
+                folder_id=body.folderId or 0,
+                url=body.url or ""
+            )
+    except QueueFullError as e:
+        raise _queue_full_exception(e)
     except Exception as e:
         logger.error(f"文本向量化失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"文本向量化失败: {str(e)}")
 
 @app.get("/files/{user_id}")
-def list_user_files(user_id: int):
+async def list_user_files(user_id: int, offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
     """
-    列出指定用户的所有文件信息
+    分页列出指定用户的文件信息，从文件目录中查询，不读取分块数据
+    返回文件列表，文件总数在响应头 X-Total-Count 中
     """
     try:
-        logger.info(f"收到列出用户 {user_id} 文件的请求")
-        embedder = embedding_utils.EmbeddingModel()
-        chroma = embedding_utils.ChromaDB(embedder)
+        logger.info(f"收到列出用户 {user_id} 文件的请求, offset={offset}, limit={limit}")
+        chroma = embedding_utils.get_chroma()
 
-        files = chroma.list_files_by_user(user_id=user_id)
+        files, total = await executors.search_executor.run(chroma.list_files_by_user, user_id=user_id, offset=offset, limit=limit)
 
         if not files:
             logger.info(f"用户 {user_id} 没有任何文件。")
-            return []
-
-        logger.info(f"成功为用户 {user_id} 找到 {len(files)} 个文件。")
-        return files
+        else:
+            logger.info(f"成功为用户 {user_id} 找到 {total} 个文件，返回 {len(files)} 个。")
+        return JSONResponse(content=files, headers={"X-Total-Count": str(total)})
+    except QueueFullError as e:
+        raise _queue_full_exception(e)
     except Exception as e:
         logger.error(f"列出用户 {user_id} 的文件失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"列出文件失败: {str(e)}")
@@ -73,6 +73,59 @@ class KnowledgeBaseTestCase(unittest.TestCase):
         print(f"ctest_personal_db_search测试花费时间: {time.time() - start_time}秒")
         print(f"调用的 server 是: {self.host}")
 
+    def test_personal_db_hybrid_search(self):
+        """
+        混合检索：向量检索和BM25关键词检索按RRF融合，结果带有scores
+        """
+        url = f"{self.base_url}/search"
+        data = {
+            "userId": 123456,
+            "query": "特斯拉 Robotaxi 普及",
+            "topk": 3,
+            "mode": "hybrid"
+        }
+        try:
+            response = httpx.post(url, json=data, timeout=20.0)
+            response.raise_for_status()
+            result = response.json()
+            self.assertIn("scores", result)
+            self.assertLessEqual(len(result["ids"][0]), 3)
+            self.assertEqual(result["scores"][0], sorted(result["scores"][0], reverse=True))
+            print("Response body:", result)
+        except (httpx.RequestError, httpx.HTTPStatusError) as exc:
+            self.fail(f"混合检索失败: {exc}")
+
+        response = httpx.post(url, json=dict(data, mode="unknown"), timeout=20.0)
+        self.assertEqual(response.status_code, 400)
+
+    def test_personal_db_batch_search(self):
+        """
+        批量搜索知识库，每个查询单独返回结果，并返回去重后的合并结果
+        """
+        url = f"{self.base_url}/search/batch"
+        data = {
+            "userId": 123456,
+            "queries": ["Robotaxi", "特斯拉", "Robotaxi"],
+            "keyword": "",
+            "topk": 3,
+            "merge": True
+        }
+        start_time = time.time()
+        try:
+            response = httpx.post(url, json=data, timeout=20.0)
+            response.raise_for_status()
+            result = response.json()
+            self.assertEqual(len(result["results"]), 3)
+            self.assertEqual([one["query"] for one in result["results"]], data["queries"])
+            self.assertEqual(result["results"][0]["ids"], result["results"][2]["ids"])
+            merged_ids = [one["id"] for one in result["merged"]]
+            self.assertEqual(len(merged_ids), len(set(merged_ids)))
+            self.assertLessEqual(len(merged_ids), 3)
+            print("Response body:", result)
+        except (httpx.RequestError, httpx.HTTPStatusError) as exc:
+            self.fail(f"批量搜索失败: {exc}")
+        print(f"test_personal_db_batch_search测试花费时间: {time.time() - start_time}秒")
+
     def test_upload_file_and_vectorize(self):
         """
         测试上传文件并向量化
@@ -166,6 +219,69 @@ class KnowledgeBaseTestCase(unittest.TestCase):
                 f"服务返回错误 {exc.response.status_code}，请求 {exc.request.url!r}：{exc.response.text}"
             )
 
+    def test_upload_file_background_job(self):
+        """
+        测试后台入库任务：上传后立即返回jobId，通过SSE查看进度直到完成
+        """
+        url = f"{self.base_url}/upload/"
+        file_content = "特斯拉Robotaxi平台即将开放公众使用，预计明年全面普及。\n" * 20
+        data = {
+            "userId": 123456,
+            "fileId": 989,
+            "folderId": 543,
+            "fileType": "txt",
+            "background": "true"
+        }
+        files = {"file": ("tesla_job.txt", file_content, "text/plain")}
+        start_time = time.time()
+        response = httpx.post(url, data=data, files=files, timeout=40.0)
+        print(f"提交后台任务花费时间: {time.time() - start_time}秒")
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()["jobId"]
+
+        events = []
+        with httpx.stream("GET", f"{self.base_url}/jobs/{job_id}/events", timeout=120.0) as stream:
+            for line in stream.iter_lines():
+                if not line.startswith("data: "):
+                    continue
+                payload = line[len("data: "):]
+                if payload == "[DONE]":
+                    break
+                event = json.loads(payload)
+                print(f"任务进度: {event['stage']} {event['progress']}")
+                events.append(event)
+        self.assertEqual(events[-1]["status"], "done")
+        self.assertTrue(any(event.get("markdown_content") for event in events))
+
+        job = httpx.get(f"{self.base_url}/jobs/{job_id}", timeout=10.0).json()
+        self.assertEqual(job["progress"]["embedded"], job["progress"]["chunks"])
+        print(f"后台任务总耗时: {time.time() - start_time}秒")
+
+    def test_convert_file(self):
+        """
+        测试只转换文件：立即返回markdown，向量化在后台任务中执行
+        """
+        url = f"{self.base_url}/convert"
+        file_content = "特斯拉Robotaxi平台即将开放公众使用，预计明年全面普及。\n" * 20
+        data = {
+            "userId": 123456,
+            "fileId": 990,
+            "folderId": 543,
+            "fileType": "txt"
+        }
+        files = {"file": ("tesla_convert.txt", file_content, "text/plain")}
+        start_time = time.time()
+        response = httpx.post(url, data=data, files=files, timeout=60.0)
+        print(f"test_convert_file 请求花费时间: {time.time() - start_time}秒")
+        response.raise_for_status()
+        result = response.json()
+        self.assertIn("Robotaxi", result["markdown_content"])
+        self.assertIn("jobId", result)
+
+        job = httpx.get(f"{self.base_url}/jobs/{result['jobId']}", timeout=10.0).json()
+        print(f"向量化任务状态: {job['status']} {job['progress']}")
+        self.assertIn(job["status"], ("queued", "running", "done"))
+
     def test_list_user_files(self):
         """
         测试列出用户文件接口
@@ -187,6 +303,13 @@ class KnowledgeBaseTestCase(unittest.TestCase):
 
             print(f"用户 {user_id} 的文件列表: {result}")
 
+            # 分页，文件总数在响应头中
+            response = httpx.get(list_url_with_files, params={"offset": 0, "limit": 1}, timeout=20.0)
+            response.raise_for_status()
+            self.assertEqual(len(response.json()), 1)
+            self.assertEqual(int(response.headers["X-Total-Count"]), len(result))
+            self.assertNotIn("documents", response.json()[0])
+
         except (httpx.RequestError, httpx.HTTPStatusError) as exc:
             self.fail(f"测试有文件的用户失败: {exc}")
 
@@ -3,6 +3,9 @@
 """
 
 import os
+import re
+import time
+import hashlib
 import requests
 from typing import Optional, Tuple
 from pathlib import Path
@@ -17,9 +20,19 @@ logger = logging.getLogger(__name__)
 class FileHandler:
     """文件处理器，支持本地文件和网络URL"""
     
-    def __init__(self, timeout: int = 30, max_size: int = 100 * 1024 * 1024):  # 100MB
+    def __init__(self, timeout: int = 30, max_size: int = 100 * 1024 * 1024,  # 100MB
+                 max_retries: int = 3, chunk_size: int = 1024 * 1024):
+        """
+        Args:
+            timeout: 请求超时时间（秒）
+            max_size: 允许下载的最大字节数
+            max_retries: 下载中断后最多续传的次数
+            chunk_size: 流式下载时每次读取的字节数
+        """
         self.timeout = timeout
         self.max_size = max_size
+        self.max_retries = max_retries
+        self.chunk_size = chunk_size
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'SummeryAnyFile/1.0 (Document Processing Tool)'
@@ -97,23 +110,7 @@ class FileHandler:
                 temp_file.close()
             
             # 下载文件
-            response = self.session.get(url, timeout=self.timeout, stream=True)
-            response.raise_for_status()
-            
-            downloaded_size = 0
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded_size += len(chunk)
-                        
-                        # 检查下载大小
-                        if downloaded_size > self.max_size:
-                            f.close()
-                            file_path.unlink()  # 删除部分下载的文件
-                            raise ValueError(f"下载文件太大: {downloaded_size} bytes")
-            
-            logger.info(f"下载完成: {file_path} ({downloaded_size} bytes)")
+            self.download_to_file(url, str(file_path))
             return str(file_path)
             
         except requests.RequestException as e:
@@ -123,6 +120,101 @@ class FileHandler:
             logger.error(f"处理URL时出错: {e}")
             raise
     
+    def download_to_file(self, url: str, file_path: str) -> Tuple[int, str]:
+        """
+        流式下载文件到 file_path，边下载边计算MD5
+        - 按块写入磁盘，不把整个文件读入内存
+        - 先按Content-Length检查大小，再按实际收到的字节数检查，超过max_size立即中止
+        - 连接中断时使用Range从已下载的位置续传，If-Range保证续传的是同一个文件
+        - 请求时使用Accept-Encoding: identity，Range按原始字节计算；服务器仍然压缩传输时不续传，从头下载
+        - 下载过程中写入 file_path + ".part"，完成后再改名，失败时删除
+
+        Args:
+            url: 文件URL
+            file_path: 保存路径
+
+        Returns:
+            (文件字节数, MD5哈希值)，MD5可以直接用于文件缓存查找，不必再读一遍文件
+
+        Raises:
+            ValueError: 文件超过大小限制
+            requests.RequestException: 网络请求失败（续传次数用完）
+        """
+        part_path = f"{file_path}.part"
+        hash_md5 = hashlib.md5()
+        downloaded = 0
+        validator = None
+        resumable = True
+        attempt = 0
+        logger.info(f"正在下载: {url}")
+        try:
+            while True:
+                # 压缩传输时已下载的是解压后的字节数，不能作为Range的起点
+                headers = {"Accept-Encoding": "identity"}
+                if downloaded:
+                    headers["Range"] = f"bytes={downloaded}-"
+                    if validator:
+                        headers["If-Range"] = validator
+                try:
+                    with self.session.get(url, timeout=self.timeout, stream=True, headers=headers) as response:
+                        response.raise_for_status()
+                        if downloaded and response.status_code != 206:
+                            # 服务器不支持Range，或者文件已经变化，从头下载
+                            logger.info(f"服务器未返回部分内容(状态码{response.status_code})，从头下载")
+                            downloaded = 0
+                            hash_md5 = hashlib.md5()
+                        resumable = response.headers.get("Content-Encoding", "identity").lower() == "identity"
+                        validator = response.headers.get("ETag") or response.headers.get("Last-Modified") or validator
+                        total_size = self._expected_size(response, downloaded)
+                        if total_size is not None and total_size > self.max_size:
+                            raise ValueError(f"文件太大: {total_size} bytes (最大: {self.max_size} bytes)")
+
+                        with open(part_path, "ab" if downloaded else "wb") as f:
+                            for chunk in response.iter_content(chunk_size=self.chunk_size):
+                                if not chunk:
+                                    continue
+                                downloaded += len(chunk)
+                                if downloaded > self.max_size:
+                                    raise ValueError(f"下载文件太大: 超过 {self.max_size} bytes")
+                                f.write(chunk)
+                                hash_md5.update(chunk)
+                    if total_size is not None and downloaded < total_size:
+                        raise requests.exceptions.ChunkedEncodingError(f"连接提前关闭，已下载 {downloaded}/{total_size} bytes")
+                    break
+                except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                        requests.exceptions.Timeout) as e:
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        raise
+                    delay = min(2 ** attempt, 10)
+                    if not resumable:
+                        logger.info("服务器使用压缩传输，无法续传，从头下载")
+                        downloaded = 0
+                        hash_md5 = hashlib.md5()
+                    logger.warning(f"下载中断，已下载 {downloaded} bytes，{delay}s后第{attempt}次续传: {e}")
+                    time.sleep(delay)
+            os.replace(part_path, file_path)
+        except Exception:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        md5_hash = hash_md5.hexdigest()
+        logger.info(f"下载完成: {file_path} ({downloaded} bytes, MD5: {md5_hash})")
+        return downloaded, md5_hash
+
+    @staticmethod
+    def _expected_size(response: requests.Response, offset: int) -> Optional[int]:
+        """根据Content-Range或Content-Length计算文件的总大小，未知时返回None"""
+        content_range = response.headers.get("Content-Range", "")
+        match = re.match(r"bytes \d+-\d+/(\d+)", content_range)
+        if response.status_code == 206 and match:
+            return int(match.group(1))
+        content_length = response.headers.get("Content-Length")
+        # 压缩传输时Content-Length是压缩后的大小，和解压后收到的字节数无法比较
+        if content_length and content_length.isdigit() and response.headers.get("Content-Encoding", "identity") == "identity":
+            return offset + int(content_length) if response.status_code == 206 else int(content_length)
+        return None
+
     def _extract_filename_from_url(self, url: str, headers: dict) -> str:
         """从URL和响应头中提取文件名"""
         # 尝试从Content-Disposition头获取
@@ -79,6 +79,16 @@ class ADKAgentExecutor(AgentExecutor):
         session_id = session_obj.id
 
         async for event in self._run_agent(session_id, new_message):
+            if event.partial:
+                # SSE流式模式下的增量token，直接转发，不读取session，也不序列化整个event打印日志
+                if event.content and event.content.parts:
+                    parts = convert_genai_parts_to_a2a(event.content.parts)
+                    if parts:
+                        await task_updater.update_status(
+                            TaskState.working,
+                            message=task_updater.new_agent_message(parts, metadata={"partial": True}),
+                        )
+                continue
 
             if event.is_final_response():
                 final_session = await self.runner.session_service.get_session(
@@ -91,6 +101,8 @@ class ADKAgentExecutor(AgentExecutor):
                 await task_updater.add_artifact(parts, metadata=final_metadata)
                 await task_updater.complete()
                 break
+            if not event.content or not event.content.parts:
+                continue
             if not event.get_function_calls():
                 logger.debug(f"Yielding update response, {event}")
                 await task_updater.update_status(
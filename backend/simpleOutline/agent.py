@@ -27,6 +27,9 @@ def before_model_callback(callback_context: CallbackContext, llm_request: LlmReq
     return None
 def after_model_callback(callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
     # 1. 检查用户输入，注意如果是llm的stream模式，那么response_data的结果是一个token的结果，还有可能是工具的调用
+    if llm_response.partial or not llm_response.content:
+        # 流式的单个token不打印，避免每个token都序列化一次metadata
+        return None
     agent_name = callback_context.agent_name
     response_parts = llm_response.content.parts
     part_texts =[]
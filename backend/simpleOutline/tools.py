@@ -9,7 +9,7 @@
 import logging
 from google.adk.tools import ToolContext
 from google.adk.tools.agent_tool import AgentTool
-from weixin_search import sogou_weixin_search,get_real_url,get_article_content
+from weixin_search import get_wechat_article
 import time
 from datetime import datetime
 import random
@@ -33,26 +33,10 @@ async def DocumentSearch(
         metadata = {}
     logger.info(f"调用工具：DocumentSearch时传入的metadata: {metadata}")
     logger.info("文档检索: " + keyword)
-    start_time = time.time()
-    results = sogou_weixin_search(keyword)
-    if not results:
-        return f"没有搜索到{keyword}相关的文章"
-    articles = []
-    results = results[:number]
-    for every_result in results:
-        sougou_link = every_result["link"]
-        real_url = get_real_url(sougou_link)
-        # referer：请求来源
-        content = get_article_content(real_url, referer=sougou_link)
-        article = {
-            "title": every_result["title"],
-            "publish_time": every_result["publish_time"],
-            "real_url": real_url,
-            "content": content
-        }
-        articles.append(article)
-    end_time = time.time()
-    logger.info(f"关键词{keyword}相关的文章已经获取完毕，获取到{len(articles)}篇, 耗时{end_time - start_time}秒")
+    # 每篇文章的链接解析和正文获取并发执行，耗时和获取一篇文章差不多
+    articles = await get_wechat_article(keyword, number=number)
+    if isinstance(articles, str):
+        return articles
     metadata["tool_document_ids"] = articles
     tool_context.state["metadata"] = metadata
     return articles
@@ -52,10 +52,62 @@ def extract_agent_names(agent: BaseAgent, names=None):
         extract_agent_names(sub, names)
     return names
 
+class SlideEventEmitter:
+    """
+    按 slide_index 输出幻灯片结果：
+    - ordered: 严格按页码顺序输出，先完成的页暂存在重排缓冲区，缓冲区超过 window 页时跳过缺失的页，避免无限等待；
+      window 应与 PPTGeneratorParallelAgent 的重排窗口一致，正常情况下缓冲区不会超过它，只有卡住的页才会被跳过
+    - ready: 每页完成后立即输出，由前端根据 slide_index 放到对应位置，首页不再需要等第 0 页
+    没有 slide_index 的结果直接输出。
+    """
+    MODES = ("ordered", "ready")
+
+    def __init__(self, mode: str = "ordered", window: int = 16):
+        if mode not in self.MODES:
+            raise ValueError(f"不支持的输出模式: {mode}, 可选: {self.MODES}")
+        self.mode = mode
+        self.window = max(1, window)
+        self._pending: Dict[int, Any] = {}
+        self._next_index = 0
+
+    def is_late(self, slide_index: Optional[int]) -> bool:
+        """ordered模式下，这一页的等待已经被跳过，到达时会乱序输出，需要带上slide_index由前端放到对应位置"""
+        return self.mode == "ordered" and slide_index is not None and slide_index < self._next_index
+
+    def push(self, slide_index: Optional[int], item: Any) -> List[Any]:
+        """放入一页结果，返回当前可以输出的结果列表"""
+        if self.mode == "ready" or slide_index is None:
+            return [item]
+        if slide_index < self._next_index:
+            # 已经被跳过的页，晚到了也直接输出
+            return [item]
+        self._pending[slide_index] = item
+        ready = self._drain()
+        if len(self._pending) > self.window:
+            skip_to = min(self._pending)
+            logger.warning(f"重排缓冲区超过{self.window}页，跳过第{self._next_index}到第{skip_to - 1}页的等待")
+            self._next_index = skip_to
+            ready.extend(self._drain())
+        return ready
+
+    def flush(self) -> List[Any]:
+        """流结束时，按页码顺序输出缓冲区中剩余的结果"""
+        ready = [self._pending[i] for i in sorted(self._pending)]
+        self._pending.clear()
+        return ready
+
+    def _drain(self) -> List[Any]:
+        ready = []
+        while self._next_index in self._pending:
+            ready.append(self._pending.pop(self._next_index))
+            self._next_index += 1
+        return ready
+
+
 class ADKAgentExecutor(AgentExecutor):
     """An AgentExecutor that runs an ADK-based Agent."""
 
-    def __init__(self, runner: Runner, card: AgentCard, run_config, show_agent):
+    def __init__(self, runner: Runner, card: AgentCard, run_config, show_agent, emit_mode: str = "ordered", reorder_window: int = 16):
         self.runner = runner
         self._card = card
 
@@ -63,6 +115,9 @@ class ADKAgentExecutor(AgentExecutor):
         self.run_config = run_config
         # show_agent代表和前端联动，显示xml的ppt的结果
         self.show_agent = show_agent
+        # 幻灯片结果的输出模式，ordered按页码顺序，ready按完成顺序（附带slide_index），请求的metadata中的emit_mode可覆盖
+        self.emit_mode = emit_mode
+        self.reorder_window = reorder_window
 
     def _run_agent(
         self, session_id, new_message: types.Content
@@ -97,6 +152,11 @@ class ADKAgentExecutor(AgentExecutor):
         logger.info(f"收到请求信息: {new_message}")
         agent_names = extract_agent_names(self.runner.agent)
         agent_names = list(agent_names)
+        emit_mode = metadata.get("emit_mode") or self.emit_mode
+        if emit_mode not in SlideEventEmitter.MODES:
+            logger.warning(f"不支持的输出模式: {emit_mode}，使用默认的输出模式: {self.emit_mode}")
+            emit_mode = self.emit_mode
+        emitter = SlideEventEmitter(mode=emit_mode, window=self.reorder_window)
         async for event in self._run_agent(session_id, new_message):
             agent_author = event.author
             if agent_author in self.show_agent:
@@ -107,13 +167,16 @@ class ADKAgentExecutor(AgentExecutor):
                     )
                     print("最终的session中的结果final_session中的state: ", final_session.state)
                     references = final_session.state.get("references", [])
-                    # 最后一个agent的输出了，输出成status
-                    await task_updater.update_status(
-                        TaskState.working,
-                        message=task_updater.new_agent_message(
-                            convert_genai_parts_to_a2a(event.content.parts), metadata={"author": agent_author, "show": True, "references": references}
-                        ),
-                    )
+                    slide_index = (event.custom_metadata or {}).get("slide_index")
+                    message_metadata = {"author": agent_author, "show": True, "references": references}
+                    if slide_index is not None and (emit_mode == "ready" or emitter.is_late(slide_index)):
+                        message_metadata["slide_index"] = slide_index
+                    # 最后一个agent的输出了，输出成status，按照输出模式决定是否需要等待前面的页
+                    for parts, one_metadata in emitter.push(slide_index, (convert_genai_parts_to_a2a(event.content.parts), message_metadata)):
+                        await task_updater.update_status(
+                            TaskState.working,
+                            message=task_updater.new_agent_message(parts, metadata=one_metadata),
+                        )
                     print(f"final_session中的parts: {event.content.parts}")
                     # await task_updater.complete()  # 这个会关掉event的Queue
                     # break
@@ -139,6 +202,7 @@ class ADKAgentExecutor(AgentExecutor):
                 await task_updater.add_artifact(parts=parts,metadata={"author": agent_author, "references": references})
                 if not agent_names:
                     # 说明任务整体完成了，没有要进行其它任务的Agent了，所有Agent都完成了自己的任务
+                    await self._flush_slides(emitter, task_updater)
                     await task_updater.complete()  # 这个会关掉event的Queue
                     break
             elif event.get_function_calls():
@@ -165,6 +229,15 @@ class ADKAgentExecutor(AgentExecutor):
                         convert_genai_parts_to_a2a(event.content.parts),metadata={"author": agent_author}
                     ),
                 )
+        # Agent运行结束，输出重排缓冲区中还没有输出的页（例如某一页一直没有结果）
+        await self._flush_slides(emitter, task_updater)
+
+    async def _flush_slides(self, emitter: SlideEventEmitter, task_updater: TaskUpdater) -> None:
+        for parts, one_metadata in emitter.flush():
+            await task_updater.update_status(
+                TaskState.working,
+                message=task_updater.new_agent_message(parts, metadata=one_metadata),
+            )
 
     async def execute(
         self,
@@ -42,6 +42,7 @@ from a2a.types import (
     AgentSkill,
 )
 from slide_agent.agent import root_agent
+from slide_agent.sub_agents.ppt_writer.agent import ppt_generator_parallel_agent
 
 @click.command()
 @click.option("--host", "host", default="localhost", help="服务器绑定的主机名（默认为 localhost,可以指定具体本机ip）")
@@ -102,7 +103,11 @@ def main(host, port, agent_url=""):
             streaming_mode=StreamingMode.NONE,
             max_llm_calls=500
         )
-    agent_executor = ADKAgentExecutor(runner, agent_card, run_config, show_agent)
+    # 幻灯片的输出模式: ordered 按页码顺序输出，ready 每页完成即输出（附带slide_index）
+    emit_mode = os.environ.get("CONTENT_EMIT_MODE", "ordered").lower()
+    # 重排缓冲区与并行生成的重排窗口保持一致，只有卡住的页才会被跳过
+    reorder_window = ppt_generator_parallel_agent.effective_reorder_window
+    agent_executor = ADKAgentExecutor(runner, agent_card, run_config, show_agent, emit_mode=emit_mode, reorder_window=reorder_window)
 
     # 初始化请求处理器
     request_handler = DefaultRequestHandler(
@@ -2,7 +2,8 @@ from google.adk.agents.sequential_agent import SequentialAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.genai import types  # 用于在回调里短路并给用户返回消息
 from dotenv import load_dotenv
-from .sub_agents.ppt_writer.agent import ppt_generator_loop_agent
+from .sub_agents.ppt_writer.agent import ppt_generator_loop_agent, ppt_generator_parallel_agent
+from .config import PPT_PARALLEL_CONFIG
 from .utils import parse_markdown_to_slides  # 复用你已有的解析函数
 
 # 在模块顶部加载环境变量
@@ -73,13 +74,19 @@ def before_agent_callback(callback_context: CallbackContext):
     state["outline_json"] = slides
     state["slides_plan_num"] = len(slides)
     state["makrdown"] = md_content
-    # 返回 None 继续执行后续 Agent: ppt_generator_loop_agent
+    # 返回 None 继续执行后续 Agent: ppt_generator_loop_agent 或 ppt_generator_parallel_agent
     return None
 
 
+# 并行模式下每页独立生成，按页码顺序输出；否则逐页串行生成
+if PPT_PARALLEL_CONFIG["enabled"]:
+    ppt_generator_agent = ppt_generator_parallel_agent
+else:
+    ppt_generator_agent = ppt_generator_loop_agent
+
 root_agent = SequentialAgent(
     name="WritingSystemAgent",
     description="多Agent写作系统的总协调器",
-    sub_agents=[ppt_generator_loop_agent],
+    sub_agents=[ppt_generator_agent],
     before_agent_callback=before_agent_callback
 )
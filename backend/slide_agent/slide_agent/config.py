@@ -38,4 +38,13 @@ PPT_CHECKER_AGENT_CONFIG = {
     "model": os.getenv("PPT_CHECKER_MODEL", "qwen-turbo-latest"),
     # "provider": "deepseek",
     # "model": "deepseek-chat",
-}
\ No newline at end of file
+}
+
+# 并行生成每一页PPT：开启后每页幻灯片拥有独立的历史记录和重试计数，按页并发生成
+PPT_PARALLEL_CONFIG = {
+    "enabled": os.getenv("PPT_WRITER_PARALLEL", "false").lower() == "true",
+    # 同时生成的最大页数，注意模型供应商的并发限制
+    "concurrency": int(os.getenv("PPT_WRITER_CONCURRENCY", "4")),
+    # 最多允许领先最早未完成页多少页开始生成，限制按序输出时需要缓存的页数
+    "reorder_window": int(os.getenv("PPT_REORDER_WINDOW", "8")),
+}
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2025/9/2 10:15
+# @File  : outline_parser.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : 单遍的大纲解析器，markdown大纲 -> 幻灯片JSON，slide_agent和训练数据脚本共用，不依赖其它模块
+import json
+from typing import Dict, Iterator, List, Optional, Tuple
+
+TITLE = "title"
+SECTION = "section"
+SUBSECTION = "subsection"
+ITEM = "item"
+
+
+def tokenize_line(line: str) -> Optional[Tuple[str, str]]:
+    """把一行大纲转换成 (token类型, 文本)，不是标题或条目的行返回None，每行只strip一次"""
+    line = line.strip()
+    # 条目行最多，先判断
+    if line[:2] == '- ':
+        return ITEM, line[2:].strip()
+    if line[:1] != '#':
+        return None
+    if line[:4] == '### ':
+        return SUBSECTION, line[4:].strip()
+    if line[:3] == '## ':
+        return SECTION, line[3:].strip()
+    if line[:2] == '# ':
+        return TITLE, line[2:].strip()
+    return None
+
+
+def tokenize_outline(markdown_text: str) -> Iterator[Tuple[str, str]]:
+    """逐行把大纲转换成token"""
+    for line in markdown_text.split('\n'):
+        token = tokenize_line(line)
+        if token is not None:
+            yield token
+
+
+class IncrementalSlideParser:
+    """
+    增量（推送式）的大纲解析器，大纲可以按任意大小的文本块（例如LLM流式输出的token）逐步传入。
+    每当某一页的标题块结束、并且它的页码已经确定时，就返回 (页码, 幻灯片骨架)。最终得到的幻灯片与 parse_markdown_to_slides 的结果一致。
+    注意：目前内容生成仍然在收到完整的大纲后才开始，还没有把大纲的流式输出接到 PPTGeneratorParallelAgent 上
+    - cover: 遇到一级标题 '# ' 时立即输出，页码为0
+    - transition: 遇到二级标题 '## ' 时立即输出
+    - content: 遇到下一个 '## '/'### ' 或大纲结束时输出
+    - contents: 需要所有章节，只能在 close() 时输出，它的页码在第一个 '## ' 出现时就已经预留
+    - end: close() 时输出
+    用法:
+        parser = IncrementalSlideParser()
+        for chunk in stream:
+            for index, slide in parser.feed(chunk):
+                ...
+        for index, slide in parser.close():
+            ...
+        parser.slides  # 完整的幻灯片列表
+    """
+
+    def __init__(self):
+        self.main_title: Optional[str] = None
+        self.sections: List[str] = []
+        self.slides: List[Dict] = []
+        self._buffer = ""
+        # 章节页和内容页，按出现顺序，页码 = 前面的封面页和目录页数量 + 在这里的位置
+        self._body: List[Dict] = []
+        self._body_emitted = 0
+        self._cover_emitted = False
+        self._subsection_title = ""
+        self._items: List[str] = []
+        self._closed = False
+
+    def feed(self, text: str) -> List[Tuple[int, Dict]]:
+        """传入一段文本，返回已经可以确定的幻灯片"""
+        if self._closed:
+            raise RuntimeError("解析器已经结束，不能继续传入内容")
+        if '\n' not in text:
+            # 一行还没有结束，不会产生新的幻灯片
+            self._buffer += text
+            return []
+        self._buffer += text
+        lines = self._buffer.split('\n')
+        # 最后一行可能还没有输出完整，留到下次
+        self._buffer = lines.pop()
+        for line in lines:
+            token = tokenize_line(line)
+            if token is not None:
+                self.feed_token(*token)
+        return self._drain(final=False)
+
+    def close(self) -> List[Tuple[int, Dict]]:
+        """大纲结束，返回剩余的幻灯片（目录页、最后一页内容页和结束页）"""
+        if self._closed:
+            return []
+        if self._buffer:
+            token = tokenize_line(self._buffer)
+            if token is not None:
+                self.feed_token(*token)
+            self._buffer = ""
+        self._close_subsection()
+        self._closed = True
+        ready = self._drain(final=True)
+        ready.append((len(self.slides), {"type": "end"}))
+        self.slides.append({"type": "end"})
+        return ready
+
+    def feed_token(self, kind: str, text: str) -> None:
+        """处理 tokenize_line 得到的一个 token"""
+        if kind == ITEM:
+            if self._subsection_title:
+                self._items.append(text)
+        elif kind == TITLE:
+            # 只使用第一个一级标题
+            if self.main_title is None:
+                self.main_title = text
+        elif kind == SECTION:
+            self._close_subsection()
+            self.sections.append(text)
+            self._body.append({"type": "transition", "data": {"title": text, "text": f"Exploring the topic of {text}"}})
+        elif kind == SUBSECTION:
+            self._close_subsection()
+            self._subsection_title = text
+
+    def _close_subsection(self) -> None:
+        if not self._subsection_title:
+            return
+        slide_items = [{"title": item, "text": f"Detailed content about {item}"} for item in self._items]
+        self._body.append({"type": "content", "data": {"title": self._subsection_title, "items": slide_items}})
+        self._subsection_title = ""
+        self._items = []
+
+    def _drain(self, final: bool) -> List[Tuple[int, Dict]]:
+        ready = []
+        if self.main_title is not None and not self._cover_emitted:
+            self._cover_emitted = True
+            cover = {"type": "cover", "data": {"title": self.main_title, "text": "A presentation generated by AI"}}
+            self.slides.append(cover)
+            ready.append((0, cover))
+        if not final and (self.main_title is None or not self.sections):
+            # 还不能确定是否有封面页和目录页，内容页的页码无法确定，先暂存
+            return ready
+        has_contents = bool(self.sections)
+        offset = int(self.main_title is not None) + int(has_contents)
+        if final and has_contents:
+            contents = {"type": "contents", "data": {"items": list(self.sections)}}
+            # 目录页的位置在封面之后，之前输出的内容页已经为它预留了页码
+            self.slides.insert(offset - 1, contents)
+            ready.append((offset - 1, contents))
+        while self._body_emitted < len(self._body):
+            slide = self._body[self._body_emitted]
+            self.slides.append(slide)
+            ready.append((offset + self._body_emitted, slide))
+            self._body_emitted += 1
+        return ready
+
+
+def parse_markdown_to_slides(markdown_text: str) -> List[Dict]:
+    """
+    把完整的markdown大纲解析成幻灯片列表，只遍历一次
+    结构: cover, contents, 每个章节的transition和其中每个三级标题的content, end
+    """
+    parser = IncrementalSlideParser()
+    feed_token = parser.feed_token
+    for kind, text in tokenize_outline(markdown_text.strip()):
+        feed_token(kind, text)
+    parser.close()
+    return parser.slides
+
+
+if __name__ == '__main__':
+    outline_markdown = """# 2025科技前沿动态
+
+## 人工智能新突破
+### 大语言模型的进化
+- 多模态大模型实现文本、图像、音频的深度融合理解
+- 参数效率优化，降低训练成本的同时提升性能
+- 自主推理和规划能力增强，接近人类思维方式
+
+### 生成式AI的商业应用
+- 内容创作行业全面变革，自动化生成高质量文章、视频和音乐
+- 药物研发周期缩短，AI辅助设计新分子结构
+- 工业设计领域实现快速原型迭代和优化
+
+### AI与脑科学的交叉研究
+- 脑机接口技术取得重大突破，实现更高精度的思维解码
+- 神经形态芯片模仿人脑结构，大幅提升能效比
+- AI辅助脑疾病诊断和治疗，实现精准医疗
+
+### 量子算法与应用
+- 量子化学模拟加速新材料和药物发现
+- 量子优化算法解决物流、金融等领域的复杂问题
+- 量子机器学习算法处理高维度数据更高效
+
+### 量子生态系统建设
+- 主要科技公司建立量子计算研究中心
+- 量子编程语言和开发工具链日趋成熟
+- 量子教育和人才培养体系逐步完善
+- 量子产业联盟形成，推动标准化和商业化
+- 政府加大量子技术投入，制定发展战略和政策
+
+### 精准医疗与个性化治疗
+- 基于基因组学的个性化治疗方案普及
+- 循环肿瘤DNA技术实现癌症早期筛查和监测
+- 微生物组研究揭示肠道健康与疾病的关系
+- 基因编辑细胞疗法在免疫治疗领域取得突破
+
+## 新能源与可持续发展
+### 清洁能源技术革新
+- 钙钛矿太阳能电池效率突破30%，成本持续下降
+- 核聚变能源实验取得突破，能量增益比显著提高
+- 氢燃料电池技术实现商业化，续航里程大幅提升
+- 海上浮式风电场建设加速，拓展清洁能源空间
+
+## 通信技术与连接未来
+### 6G网络与卫星互联网
+- 6G网络原型展示，传输速率达到1Tbps
+- 太赫兹通信技术实现高速数据传输
+- 低轨道卫星互联网实现全球无缝覆盖
+- 空天地一体化网络构建，支持万物互联
+- 量子通信卫星网络实现全球安全通信
+
+### 智能制造系统
+- 数字孪生工厂实现全流程模拟和优化
+- 自适应制造系统能够根据需求调整生产流程
+- 人工智能驱动的质量控制实现零缺陷生产
+- 供应链智能优化降低库存和物流成本
+- 可持续制造技术减少能源消耗和废弃物产生"""
+    json_slides = parse_markdown_to_slides(outline_markdown)
+    print(json.dumps(json_slides, indent=2, ensure_ascii=False))
+    # 模拟LLM流式输出大纲，每20个字符传入一次，观察每页幻灯片最早可以开始生成的时机
+    parser = IncrementalSlideParser()
+    for start in range(0, len(outline_markdown), 20):
+        for slide_index, slide in parser.feed(outline_markdown[start:start + 20]):
+            print(f"已输出{start + 20}个字符时，第{slide_index}页可以开始生成: {slide['type']}")
+    for slide_index, slide in parser.close():
+        print(f"大纲结束时，第{slide_index}页可以开始生成: {slide['type']}")
+    assert parser.slides == json_slides
\ No newline at end of file
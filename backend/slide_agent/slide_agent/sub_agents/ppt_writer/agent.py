@@ -1,4 +1,6 @@
 import json
+import copy
+import asyncio
 import logging
 from typing import Dict, List, Any, AsyncGenerator, Optional
 from google.genai import types
@@ -8,8 +10,9 @@ from google.adk.events import Event, EventActions
 from google.adk.agents.invocation_context import InvocationContext
 from google.adk.agents.callback_context import CallbackContext
 from google.adk.models import LlmRequest, LlmResponse
+from google.adk.sessions import Session
 from .tools import SearchImage, DocumentSearch,KnowledgeBaseSearch
-from ...config import PPT_WRITER_AGENT_CONFIG  # 保留导入，检查器不需要模型
+from ...config import PPT_WRITER_AGENT_CONFIG, PPT_PARALLEL_CONFIG  # 保留导入，检查器不需要模型
 from ...create_model import create_model
 from . import prompt
 from .utils import validate_slide
@@ -297,7 +300,8 @@ class ControllerAgent(BaseAgent):
             st["current_slide_index"] = current_slide_index + 1
             yield Event(
                 author=self.name,
-                content=types.Content(parts=[types.Part(text=return_slide_json)])
+                content=types.Content(parts=[types.Part(text=return_slide_json)]),
+                custom_metadata={"slide_index": current_slide_index},
             )
             print(f"第 {current_slide_index} 页已通过校验，进入下一页。")
         else:
@@ -326,7 +330,8 @@ class ControllerAgent(BaseAgent):
                 # 即使失败，也返回last_written_raw
                 yield Event(
                     author=self.name,
-                    content=types.Content(parts=[types.Part(text=return_slide_json)])
+                    content=types.Content(parts=[types.Part(text=return_slide_json)]),
+                    custom_metadata={"slide_index": current_slide_index},
                 )
 
         # 终止判断：到达最后一页后输出汇总并 escalate
@@ -358,6 +363,166 @@ def my_super_before_agent_callback(callback_context: CallbackContext):
     # attempts 不是必须，这里不做。
     return None
 
+# ========== 并行生成（每页独立的 Writer -> Checker -> Controller 循环） ==========
+class PPTGeneratorParallelAgent(BaseAgent):
+    """
+    按页并发生成幻灯片：
+    - 每一页拥有独立的 session（独立的事件历史、state、重试计数），互不干扰
+    - 最多同时生成 concurrency 页
+    - 每页完成后立即输出 ControllerAgent 的结果（custom_metadata 中带 slide_index），
+      由 ADKAgentExecutor 决定按页码顺序输出还是按完成顺序输出
+    - reorder_window 限制领先于"最早未完成页"的页数，保证按序输出时的重排缓冲区有界
+    整体耗时由所有页耗时之和，降低为约等于最慢的那一页
+    """
+    concurrency: int = 4
+    reorder_window: int = 8
+    max_iterations: int = 20  # 单页最多循环次数，重试由 ControllerAgent 控制
+
+    def __init__(self, **kwargs):
+        super().__init__(
+            name="PPTGeneratorParallelAgent",
+            description="按页并发生成幻灯片内容",
+            **kwargs
+        )
+
+    @property
+    def effective_reorder_window(self) -> int:
+        """实际使用的重排窗口，不小于并发数；ADKAgentExecutor 按序输出时使用同一个值作为重排缓冲区的大小"""
+        return max(max(1, int(self.concurrency)), int(self.reorder_window))
+
+    def _create_slide_session(self, ctx: InvocationContext, slide_index: int) -> Session:
+        """为某一页创建隔离的 session，复制父 session 的 state 后改写为只生成这一页"""
+        parent = ctx.session
+        state = copy.deepcopy(parent.state)
+        state["current_slide_index"] = slide_index
+        # ControllerAgent 在 current_slide_index >= slides_plan_num 时 escalate，这里即表示本页结束
+        state["slides_plan_num"] = slide_index + 1
+        state["retry_count_map"] = {}
+        state["generated_slides_content"] = []
+        # 视为"上一页已通过校验"，保证 Writer 首轮清空历史，而不是走重试分支
+        state["last_validation_passed"] = True
+        state["last_written_raw"] = None
+        state["last_slide_json"] = None
+        state["is_valid_json"] = False
+        return Session(
+            id=f"{parent.id}_slide_{slide_index}",
+            app_name=parent.app_name,
+            user_id=parent.user_id,
+            state=state,
+            events=[],
+        )
+
+    @staticmethod
+    def _append_slide_event(session: Session, event: Event) -> None:
+        """与 SessionService.append_event 一致：应用 state_delta 并记录事件，供本页后续的 LLM 调用使用"""
+        if event.partial:
+            return
+        if event.actions and event.actions.state_delta:
+            for key, value in event.actions.state_delta.items():
+                if key.startswith("temp:"):
+                    continue
+                session.state[key] = value
+        session.events.append(event)
+
+    @staticmethod
+    def _strip_state_delta(event: Event) -> Event:
+        """向上转发的事件去掉 state_delta，避免各页的中间态写入父 session 互相覆盖"""
+        if not event.actions or not event.actions.state_delta:
+            return event
+        actions = event.actions.model_copy(update={"state_delta": {}})
+        return event.model_copy(update={"actions": actions})
+
+    async def _run_slide(self, ctx: InvocationContext, slide_index: int, queue: asyncio.Queue) -> None:
+        """单页的生成循环，产生的事件放入队列，结束时放入 (slide_index, None)"""
+        print(f"[并行] 开始生成第{slide_index}页幻灯片")
+        try:
+            # 创建本页的session也可能失败(例如state无法深拷贝)，同样需要放入结束标记
+            slide_session = self._create_slide_session(ctx, slide_index)
+            slide_ctx = ctx.model_copy(update={"session": slide_session})
+            finished = False
+            for _ in range(self.max_iterations):
+                for sub_agent in self.sub_agents:
+                    async for event in sub_agent.run_async(slide_ctx):
+                        self._append_slide_event(slide_session, event)
+                        if event.actions and event.actions.escalate:
+                            finished = True
+                            continue
+                        await queue.put((slide_index, event))
+                    if finished:
+                        break
+                if finished:
+                    break
+            if not finished:
+                logger.warning(f"[并行] 第{slide_index}页超过最大循环次数{self.max_iterations}，停止生成")
+        except Exception as e:
+            # 单页失败不影响其它页，返回大纲中的原始结构，前端仍然可以展示这一页
+            logger.error(f"[并行] 第{slide_index}页生成失败: {e}", exc_info=True)
+            # 本页的session可能没有创建成功，大纲从父session中读取
+            fallback = json.dumps(ctx.session.state["outline_json"][slide_index], ensure_ascii=False)
+            await queue.put((slide_index, Event(
+                author="ControllerAgent",
+                content=types.Content(parts=[types.Part(text=fallback)]),
+                custom_metadata={"slide_index": slide_index},
+            )))
+        finally:
+            await queue.put((slide_index, None))
+            print(f"[并行] 第{slide_index}页处理结束")
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        outline_json: list = ctx.session.state.get("outline_json") or []
+        slides_plan_num = len(outline_json)
+        if slides_plan_num == 0:
+            return
+        concurrency = max(1, int(self.concurrency))
+        reorder_window = self.effective_reorder_window
+        logger.info(f"[并行] 共{slides_plan_num}页，并发数{concurrency}，重排窗口{reorder_window}")
+        queue: asyncio.Queue = asyncio.Queue()
+        tasks: Dict[int, asyncio.Task] = {}
+        done_slides = set()
+        # 最早的未完成页，新页只能在 [lowest_unfinished, lowest_unfinished + reorder_window) 内启动
+        lowest_unfinished = 0
+        next_to_start = 0
+        results: Dict[int, Any] = {}
+
+        def schedule() -> None:
+            nonlocal next_to_start
+            running = len(tasks) - len(done_slides)
+            while (next_to_start < slides_plan_num
+                   and running < concurrency
+                   and next_to_start < lowest_unfinished + reorder_window):
+                tasks[next_to_start] = asyncio.create_task(self._run_slide(ctx, next_to_start, queue))
+                next_to_start += 1
+                running += 1
+
+        try:
+            schedule()
+            while len(done_slides) < slides_plan_num:
+                slide_index, event = await queue.get()
+                if event is None:
+                    done_slides.add(slide_index)
+                    while lowest_unfinished in done_slides:
+                        lowest_unfinished += 1
+                    schedule()
+                    continue
+                if event.author == "ControllerAgent" and event.content and event.content.parts:
+                    result_text = event.content.parts[0].text
+                    try:
+                        results[slide_index] = json.loads(result_text)
+                    except (TypeError, ValueError):
+                        results[slide_index] = result_text
+                yield self._strip_state_delta(event)
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+        print(f"[并行] 全部{slides_plan_num}页处理完成")
+        # 按页码顺序汇总结果写回父 session
+        accumulated = [results[i] for i in sorted(results)]
+        yield Event(
+            author=self.name,
+            actions=EventActions(state_delta={"generated_slides_content": accumulated, "current_slide_index": slides_plan_num}),
+        )
+
 # --- 4. PPTGeneratorLoopAgent ---
 ppt_generator_loop_agent = LoopAgent(
     name="PPTGeneratorLoopAgent",
@@ -369,3 +534,15 @@ ppt_generator_loop_agent = LoopAgent(
     ],
     before_agent_callback=my_super_before_agent_callback,
 )
+
+# --- 5. PPTGeneratorParallelAgent，子 Agent 不能有多个父 Agent，需要单独的实例 ---
+ppt_generator_parallel_agent = PPTGeneratorParallelAgent(
+    concurrency=PPT_PARALLEL_CONFIG["concurrency"],
+    reorder_window=PPT_PARALLEL_CONFIG["reorder_window"],
+    sub_agents=[
+        PPTWriterSubAgent(),
+        CheckerAgent(),
+        ControllerAgent(),
+    ],
+    before_agent_callback=my_super_before_agent_callback,
+)
@@ -1,116 +1,344 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 # @Date  : 2024/10/29 14:17
-# @File  : monitor_utils.py
+# @File  : cache_utils.py
 # @Author:
-# @Desc  :
+# @Desc  : 函数结果缓存，用法 @cache_decorator 或 @cache_decorator(ttl=3600)，异步函数使用 async_cache_decorator
+# - 后端: disk(默认，目录+容量上限，超过后按最近访问时间淘汰)、memory(进程内LRU)、redis(可选，需要安装redis)
+# - 磁盘写入先写临时文件再改名，进程崩溃或并发写入不会留下损坏的缓存
+# - 每个函数可以单独设置TTL(秒)
+# - 缓存键为 模块名.函数名 + 参数的稳定哈希(参数按函数签名绑定，kwargs的顺序不影响结果)
+# - 统计命中、未命中、淘汰次数，cache_stats() 查看
+# 环境变量: CACHE_BACKEND(disk/memory/redis)、CACHE_DIR(默认cache)、CACHE_MAX_MB(默认512)、CACHE_TTL(默认TTL秒数，0为不过期)、CACHE_REDIS_URL
+# 注意：这个文件在 simpleOutline 和 slide_agent 中各有一份相同的副本，修改时需要同步
 
 import os
-import re
-import random
 import json
-import hashlib
+import time
 import pickle
-import asyncio
+import hashlib
+import inspect
+import logging
+import threading
+from collections import OrderedDict
 from functools import wraps
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 未命中的标记，缓存的值本身可能是None
+_MISSING = object()
+
 
 def cal_md5(content):
     content = str(content)
     result = hashlib.md5(content.encode())
     return result.hexdigest()
 
-def async_cache_decorator(func):
-    cache_path = "cache"
-    if not os.path.exists(cache_path):
-        os.mkdir(cache_path)
 
-    @wraps(func)
-    async def wrapper(*args, **kwargs):
-        usecache = kwargs.get("usecache", True)
-        if "usecache" in kwargs:
-            del kwargs["usecache"]
+class CacheStats:
+    """命中/未命中/淘汰计数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def incr(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class MemoryBackend:
+    """进程内LRU，按序列化后的字节数限制大小"""
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._items: "OrderedDict[str, Tuple[Optional[float], bytes]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return _MISSING
+            expires_at, data = item
+            if expires_at is not None and time.time() > expires_at:
+                self._items.pop(key)
+                self._size -= len(data)
+                return _MISSING
+            self._items.move_to_end(key)
+        return pickle.loads(data)
+
+    def set(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        data = pickle.dumps(value)
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+            self._items[key] = (time.time() + ttl if ttl else None, data)
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self._size -= len(evicted)
+                self.stats.incr("evictions")
 
-        if len(args)> 0:
-            if isinstance(args[0],(int, float, str, list, tuple, dict)):
-                key = str(args) + str(kwargs) + func.__name__
+
+class DiskBackend:
+    """每个键一个pickle文件，总大小超过上限时按文件的访问时间(mtime)淘汰"""
+
+    name = "disk"
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # 目录的总大小，第一次写入时扫描一次，之后按写入累加
+        self._size: Optional[int] = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + "_cache.pkl")
+
+    def get(self, key: str) -> Any:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                expires_at, value = pickle.load(f)
+        except FileNotFoundError:
+            return _MISSING
+        except Exception as e:
+            logger.warning(f"读取缓存文件失败 {path}: {e}")
+            return _MISSING
+        if expires_at is not None and time.time() > expires_at:
+            self._remove(path)
+            return _MISSING
+        try:
+            # 更新访问时间，淘汰时保留最近使用的
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        path = self._path(key)
+        data = pickle.dumps((time.time() + ttl if ttl else None, value))
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
             else:
-                # 第1个参数以后的内容
-                key = str(args[1:]) + str(kwargs) + func.__name__
-        else:
-            key = str(args) + str(kwargs) + func.__name__
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path: str) -> int:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except OSError:
+            return 0
+
+    def _scan(self):
+        files = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith("_cache.pkl"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, entry.path, stat.st_size))
+                total += stat.st_size
+        return files, total
+
+    def _evict(self) -> None:
+        """删除最久未访问的文件，直到总大小降到上限的90%"""
+        files, total = self._scan()
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for _, path, size in sorted(files):
+            if total <= target:
+                break
+            total -= self._remove(path)
+            evicted += 1
+        self._size = total
+        self.stats.incr("evictions", evicted)
+        logger.info(f"缓存目录 {self.cache_dir} 超过 {self.max_bytes // (1024 * 1024)}MB，淘汰了 {evicted} 个文件")
+
+
+class RedisBackend:
+    """Redis或兼容Redis协议的服务，TTL由Redis负责，淘汰策略由服务端的maxmemory-policy决定"""
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "cache:"):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("CACHE_BACKEND=redis 需要安装redis: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.stats = CacheStats()
 
-        key_file = os.path.join(cache_path, cal_md5(key) + "_cache.pkl")
+    def get(self, key: str) -> Any:
+        data = self.client.get(self.prefix + key)
+        if data is None:
+            return _MISSING
+        return pickle.loads(data)
 
-        if os.path.exists(key_file) and usecache:
-            print(f"缓存命中，读取缓存文件: {key_file}")
-            with open(key_file, 'rb') as f:
-                result = pickle.load(f)
-                return result
+    def set(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=int(ttl) if ttl else None)
 
-        # 使用 `await` 调用异步函数
-        result = await func(*args, **kwargs)
 
-        if isinstance(result, tuple) and result[0] == False:
-            print(f"函数 {func.__name__} 返回结果为 False, 不缓存")
-        else:
-            with open(key_file, 'wb') as f:
-                pickle.dump(result, f)
-            print(f"缓存未命中，结果缓存至文件: {key_file}")
+_backend = None
+_backend_lock = threading.Lock()
 
-        return result
 
-    return wrapper
+def get_backend():
+    """按环境变量创建缓存后端，进程内共享一个"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend = os.environ.get("CACHE_BACKEND", "disk").lower()
+                max_bytes = int(os.environ.get("CACHE_MAX_MB", "512")) * 1024 * 1024
+                if backend == "memory":
+                    _backend = MemoryBackend(max_bytes)
+                elif backend == "redis":
+                    _backend = RedisBackend(os.environ.get("CACHE_REDIS_URL", "redis://127.0.0.1:6379/0"))
+                else:
+                    _backend = DiskBackend(os.environ.get("CACHE_DIR", "cache"), max_bytes)
+                logger.info(f"函数结果缓存使用{_backend.name}后端")
+    return _backend
 
-def cache_decorator(func):
+
+def set_backend(backend) -> None:
+    """替换缓存后端，例如在程序入口使用MemoryBackend"""
+    global _backend
+    _backend = backend
+
+
+def cache_stats() -> Dict[str, Any]:
+    backend = get_backend()
+    return {"backend": backend.name, **backend.stats.as_dict()}
+
+
+def _is_plain(value) -> bool:
+    return isinstance(value, (int, float, str, list, tuple, dict, bool, type(None)))
+
+
+def make_key(func, args, kwargs) -> str:
     """
-    cache从文件中读取, 当func中存在usecache时，并且为False时，不使用缓存
+    按函数签名绑定参数后计算稳定的哈希，f(1) 和 f(x=1) 得到同一个键
+    装饰类中的方法时，第一个参数是实例，不参与计算
+    """
+    try:
+        bound = inspect.signature(func).bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        if args and not _is_plain(args[0]):
+            arguments.pop(next(iter(arguments)))
+    except TypeError:
+        arguments = {"args": list(args[1:] if args and not _is_plain(args[0]) else args), "kwargs": kwargs}
+    payload = json.dumps(arguments, sort_keys=True, ensure_ascii=False, default=repr)
+    return hashlib.sha256(f"{func.__module__}.{func.__qualname__}\x00{payload}".encode("utf-8")).hexdigest()
+
+
+def _should_cache(result) -> bool:
+    # 如果返回的数据是一个元祖，并且第1个参数是False,说明这个函数报错了，那么就不缓存了，这是我们自己的一个设定
+    return not (isinstance(result, tuple) and result and result[0] is False)
+
+
+def _default_ttl() -> Optional[float]:
+    ttl = float(os.environ.get("CACHE_TTL", "0"))
+    return ttl or None
+
+
+def _lookup(func, args, kwargs):
+    backend = get_backend()
+    key = make_key(func, args, kwargs)
+    try:
+        value = backend.get(key)
+    except Exception as e:
+        logger.warning(f"读取缓存失败 {func.__name__}: {e}")
+        value = _MISSING
+    backend.stats.incr("hits" if value is not _MISSING else "misses")
+    return backend, key, value
+
+
+def _store(backend, key, func, result, ttl) -> None:
+    if not _should_cache(result):
+        print(f"函数{func.__name__}被调用，返回结果为False，不缓存")
+        return
+    try:
+        backend.set(key, result, ttl)
+    except Exception as e:
+        logger.warning(f"写入缓存失败 {func.__name__}: {e}")
+
+
+def cache_decorator(func=None, *, ttl: Optional[float] = None):
+    """
+    缓存函数的返回值，调用时传入 usecache=False 跳过缓存读取(结果仍会写入)
     Args:
-        func ():
-    Returns:
+        ttl: 过期时间（秒），默认使用环境变量CACHE_TTL，为0或不设置时不过期
     """
-    cache_path = "cache" #cache目录
-    if not os.path.exists(cache_path):
-        os.mkdir(cache_path)
-
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        # 将args和kwargs转换为哈希键， 当装饰类中的函数的时候，args的第一个参数是实例化的类，这会通常导致改变，我们不想检测它是否改变，那么就忽略它
-        usecache = kwargs.get("usecache", True)
-        if "usecache" in kwargs:
-            del kwargs["usecache"]
-        if len(args)> 0:
-            if isinstance(args[0],(int, float, str, list, tuple, dict)):
-                key = str(args) + str(kwargs) + func.__name__
-            else:
-                # 第1个参数以后的内容
-                key = str(args[1:]) + str(kwargs) + func.__name__
-        else:
-            key = str(args) + str(kwargs) + func.__name__
-        # 变成md5字符串
-        key_file = os.path.join(cache_path, cal_md5(key) + "_cache.pkl")
-        # 如果结果已缓存，则返回缓存的结果
-        if os.path.exists(key_file) and usecache:
-            # 去掉kwargs中的usecache
-            print(f"函数{func.__name__}被调用，缓存被命中，使用已缓存结果，对于参数{key}, 读取文件:{key_file}")
-            try:
-                with open(key_file, 'rb') as f:
-                    result = pickle.load(f)
-                    return result
-            except Exception as e:
-                print(f"函数{func.__name__}被调用，缓存被命中，读取文件:{key_file}失败，错误信息:{e}")
-        result = func(*args, **kwargs)
-        # 将结果缓存到文件中
-        # 如果返回的数据是一个元祖，并且第1个参数是False,说明这个函数报错了，那么就不缓存了是我们自己的一个设定
-        if isinstance(result, tuple) and result[0] == False:
-            print(f"函数{func.__name__}被调用，返回结果为False，对于参数{key}, 不缓存")
-        else:
-            with open(key_file, 'wb') as f:
-                pickle.dump(result, f)
-            print(f"函数{func.__name__}被调用，缓存未命中，结果被缓存，对于参数{key}, 写入文件:{key_file}")
-        return result
-
-    return wrapper
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            usecache = kwargs.pop("usecache", True)
+            backend, key, value = _lookup(func, args, kwargs) if usecache else (get_backend(), make_key(func, args, kwargs), _MISSING)
+            if value is not _MISSING:
+                print(f"函数{func.__name__}被调用，缓存被命中，使用已缓存结果")
+                return value
+            result = func(*args, **kwargs)
+            _store(backend, key, func, result, ttl if ttl is not None else _default_ttl())
+            return result
+
+        return wrapper
+
+    return decorator(func) if func is not None else decorator
+
+
+def async_cache_decorator(func=None, *, ttl: Optional[float] = None):
+    """异步函数版本的cache_decorator"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            usecache = kwargs.pop("usecache", True)
+            backend, key, value = _lookup(func, args, kwargs) if usecache else (get_backend(), make_key(func, args, kwargs), _MISSING)
+            if value is not _MISSING:
+                print(f"函数{func.__name__}被调用，缓存被命中，使用已缓存结果")
+                return value
+            result = await func(*args, **kwargs)
+            _store(backend, key, func, result, ttl if ttl is not None else _default_ttl())
+            return result
+
+        return wrapper
+
+    return decorator(func) if func is not None else decorator
 
 
 if __name__ == "__main__":
-    cal_md5("hello")
\ No newline at end of file
+    @cache_decorator(ttl=60)
+    def add(a, b=1):
+        return a + b
+
+    print(add(1, b=2), add(a=1, b=2), cache_stats())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2025/9/3
+# @File  : knowledge_base.py
+# @Desc  : 异步调用知识库(personaldb)的搜索接口，供KnowledgeBaseSearch工具使用
+# - 使用共享连接池的httpx.AsyncClient，不再每次搜索都新建连接
+# - 相同的(user_id, query, topk)正在请求时，后来的调用等待同一个请求的结果，不重复请求
+# - 每个会话保留最近的搜索结果(LRU)，并行生成的各页共用父会话的缓存
+# 环境变量: PERSONAL_DB(知识库地址)、KB_SEARCH_TIMEOUT(请求超时秒数，默认20)、KB_CACHE_SIZE(每个会话缓存的结果数，默认32)、
+#          KB_CACHE_SESSIONS(最多缓存的会话数，默认64)、KB_CACHE_TTL(缓存有效期秒数，默认300)
+
+import os
+import re
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+KB_SEARCH_TIMEOUT = float(os.environ.get("KB_SEARCH_TIMEOUT", "20"))
+KB_CACHE_SIZE = int(os.environ.get("KB_CACHE_SIZE", "32"))
+KB_CACHE_SESSIONS = int(os.environ.get("KB_CACHE_SESSIONS", "64"))
+KB_CACHE_TTL = float(os.environ.get("KB_CACHE_TTL", "300"))
+
+SearchKey = Tuple[str, str, int]
+
+
+class SessionLRU:
+    """按会话隔离的LRU缓存，会话数和每个会话的条目数都有上限"""
+
+    def __init__(self, max_sessions: int, max_items: int, ttl: float):
+        self.max_sessions = max_sessions
+        self.max_items = max_items
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, OrderedDict[SearchKey, Tuple[float, Any]]]" = OrderedDict()
+
+    def get(self, session_id: str, key: SearchKey) -> Optional[Any]:
+        items = self._sessions.get(session_id)
+        if items is None:
+            return None
+        self._sessions.move_to_end(session_id)
+        item = items.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if time.monotonic() > expires_at:
+            items.pop(key)
+            return None
+        items.move_to_end(key)
+        return value
+
+    def set(self, session_id: str, key: SearchKey, value: Any) -> None:
+        if self.max_sessions <= 0 or self.max_items <= 0:
+            return
+        items = self._sessions.get(session_id)
+        if items is None:
+            items = self._sessions[session_id] = OrderedDict()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        items[key] = (time.monotonic() + self.ttl, value)
+        items.move_to_end(key)
+        while len(items) > self.max_items:
+            items.popitem(last=False)
+
+
+class _ClientState:
+    """共享的httpx客户端和正在进行的请求，都绑定事件循环，事件循环变化时重新创建"""
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.client: Optional[httpx.AsyncClient] = None
+        self.inflight: Dict[SearchKey, asyncio.Task] = {}
+
+
+_state = _ClientState()
+_cache = SessionLRU(KB_CACHE_SESSIONS, KB_CACHE_SIZE, KB_CACHE_TTL)
+
+
+def _get_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    if _state.client is None or _state.loop is not loop:
+        _state.loop = loop
+        _state.inflight = {}
+        _state.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(KB_SEARCH_TIMEOUT),
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            trust_env=False,
+        )
+    return _state.client
+
+
+def cache_session_id(session_id: str) -> str:
+    """并行生成时每页的会话id是 {父会话id}_slide_{页码}，去掉后缀，让同一份PPT的各页共用缓存"""
+    return re.sub(r"_slide_\d+$", "", session_id or "")
+
+
+async def _post_search(key: SearchKey) -> Dict[str, Any]:
+    user_id, query, topk = key
+    PERSONAL_DB = os.environ.get('PERSONAL_DB', '')
+    assert PERSONAL_DB, "PERSONAL_DB is not set"
+    url = f"{PERSONAL_DB}/search"
+    data = {
+        "userId": user_id,
+        "query": query,
+        "keyword": "",  # 关键词匹配，是否需要强制包含一些关键词
+        "topk": topk
+    }
+    response = await _get_client().post(url, json=data, headers={'content-type': 'application/json'})
+    response.raise_for_status()
+    result = response.json()
+    logger.info(f"{PERSONAL_DB}搜索知识库返回状态: {response.status_code}")
+    return {"documents": result.get("documents", []), "metadatas": result.get("metadatas", [])}
+
+
+async def search_knowledge_base(user_id, query: str, topk: int = 5, session_id: str = "") -> Dict[str, Any]:
+    """
+    搜索知识库，返回 {"documents": [...], "metadatas": [...]}，请求失败时抛出异常
+    Args:
+        user_id: 知识库所属的用户id
+        query: 搜索内容
+        topk: 返回的结果数
+        session_id: ADK会话id，用于会话内的结果缓存
+    """
+    key: SearchKey = (str(user_id), query, int(topk))
+    session_id = cache_session_id(session_id)
+    cached = _cache.get(session_id, key)
+    if cached is not None:
+        logger.info(f"知识库搜索命中会话缓存: {key}")
+        return cached
+    _get_client()
+    task = _state.inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_post_search(key))
+        _state.inflight[key] = task
+        task.add_done_callback(lambda _: _state.inflight.pop(key, None))
+    else:
+        logger.info(f"知识库搜索合并到正在进行的相同请求: {key}")
+    # shield: 某个调用方被取消时，不影响等待同一个请求的其它调用方
+    data = await asyncio.shield(task)
+    _cache.set(session_id, key, data)
+    return data
+
+
+async def close_client() -> None:
+    """关闭共享的客户端"""
+    if _state.client is not None:
+        await _state.client.aclose()
+        _state.client = None
+        _state.loop = None
+        _state.inflight = {}
@@ -20,7 +20,8 @@ import requests
 from urllib.parse import quote
 import json
 from typing import List, Dict, Any
-from .weixin_search import sogou_weixin_search,get_real_url,get_article_content
+from .weixin_search import get_wechat_article
+from .knowledge_base import search_knowledge_base
 
 logger = logging.getLogger(__name__)
 
@@ -172,31 +173,15 @@ async def DocumentSearch(
         metadata = {}
     print(f"调用工具：DocumentSearch时传入的metadata: {metadata}")
     print("文档检索: " + keyword)
-    start_time = time.time()
-    results = sogou_weixin_search(keyword)
-    if not results:
-        return f"没有搜索到{keyword}相关的文章"
-    articles = []
-    results = results[:number]
-    for every_result in results:
-        sougou_link = every_result["link"]
-        real_url = get_real_url(sougou_link)
-        # referer：请求来源
-        content = get_article_content(real_url, referer=sougou_link)
-        article = {
-            "title": every_result["title"],
-            "publish_time": every_result["publish_time"],
-            "real_url": real_url,
-            "content": content
-        }
-        articles.append(article)
-    end_time = time.time()
-    print(f"关键词{keyword}相关的文章已经获取完毕，获取到{len(articles)}篇, 耗时{end_time - start_time}秒")
+    # 每篇文章的链接解析和正文获取并发执行，耗时和获取一篇文章差不多
+    articles = await get_wechat_article(keyword, number=number)
+    if isinstance(articles, str):
+        return articles
     metadata["tool_document_ids"] = articles
     tool_context.state["metadata"] = metadata
     return articles
 
-def KnowledgeBaseSearch(keyword: str, tool_context: ToolContext):
+async def KnowledgeBaseSearch(keyword: str, tool_context: ToolContext):
     """
     根据关键词搜索文档库
     :param keyword: str, 搜索的相关文档的关键词
@@ -211,33 +196,10 @@ def KnowledgeBaseSearch(keyword: str, tool_context: ToolContext):
     logger.info(f"❤️❤️❤️❤️😜😜😜😜😜调用知识库搜索接口, user_id: {user_id}, query: {keyword}, topk: {topk}")
     print(f"❤️❤️❤️❤️😜😜😜😜😜调用知识库搜索接口, user_id: {user_id}, query: {keyword}, topk: {topk}")
     PERSONAL_DB = os.environ.get('PERSONAL_DB', '')
-    assert PERSONAL_DB, "PERSONAL_DB is not set"
-    url = f"{PERSONAL_DB}/search"
-    # 正确的请求数据格式
-    data = {
-        "userId": user_id,
-        "query": keyword,
-        "keyword": "",  # 关键词匹配，是否需要强制包含一些关键词
-        "topk": topk
-    }
-    headers = {'content-type': 'application/json'}
+    session_id = tool_context._invocation_context.session.id
     try:
-        # 发送POST请求
-        response = httpx.post(url, json=data, headers=headers, timeout=20.0, trust_env=False)
-
-        # 检查HTTP状态码
-        response.raise_for_status()
-        assert response.status_code == 200, f"{PERSONAL_DB}搜索知识库报错"
-
-        # 解析返回的JSON数据
-        result = response.json()
-        documents = result.get("documents", [])
-        metadatas = result.get("metadatas", [])
-        data = {"documents": documents, "metadatas": metadatas}
-        print("Response status:", response.status_code)
-        print("Response body:", result)
-        logger.info(f"{PERSONAL_DB}搜索知识库返回状态: {response.status_code}")
-        logger.info(f"{PERSONAL_DB}搜索知识库返回结果: {result}")
+        # 共享连接池，相同的请求合并，会话内缓存最近的结果，并行生成的多页不会堆积阻塞的HTTP请求
+        data = await search_knowledge_base(user_id, keyword, topk, session_id=session_id)
         logger.info(f"{PERSONAL_DB}搜索知识库成功, 返回结果: {data}")
         return True, data
     except Exception as e:
@@ -5,18 +5,106 @@
 # @Author: johnson
 # @Contact : github: johnson7788
 # @Desc  : 使用搜索搜索微信公众号文章，先关机关键词搜索搜狗，获取链接，然后使用get_real_url获取真实链接，最后使用真实链接获取公众号内容。
-import json
+# - 使用共享连接池的httpx.AsyncClient，不阻塞事件循环
+# - 每篇文章的真实链接解析和正文获取并发执行，按域名限制并发数和请求间隔，所有请求都有超时
+# 环境变量: WEIXIN_TIMEOUT(单次请求超时秒数，默认10)、WEIXIN_HOST_CONCURRENCY(每个域名的并发数，默认4)、WEIXIN_HOST_INTERVAL(同一域名两次请求的最小间隔秒数，默认0.2)
+# 注意：这个文件在 simpleOutline 和 slide_agent 中各有一份副本，修改时需要同步
+import os
+import time
 import asyncio
-from typing import Any, Dict, List, Optional
-import requests
+import logging
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import quote, urlsplit
+import httpx
 from lxml import html
-from urllib.parse import quote
-from .cache_utils import cache_decorator
-import time
+from .cache_utils import async_cache_decorator
+
+logger = logging.getLogger(__name__)
+
+WEIXIN_TIMEOUT = float(os.environ.get("WEIXIN_TIMEOUT", "10"))
+WEIXIN_HOST_CONCURRENCY = int(os.environ.get("WEIXIN_HOST_CONCURRENCY", "4"))
+WEIXIN_HOST_INTERVAL = float(os.environ.get("WEIXIN_HOST_INTERVAL", "0.2"))
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36 Edg/137.0.0.0'
+
+
+class _HostLimiter:
+    """单个域名的限流：同时进行的请求数不超过concurrency，相邻两次请求的开始时间至少间隔interval秒"""
+
+    def __init__(self, concurrency: int, interval: float):
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._interval = interval
+        self._lock = asyncio.Lock()
+        self._next_start = 0.0
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        if self._interval > 0:
+            async with self._lock:
+                now = time.monotonic()
+                wait = self._next_start - now
+                self._next_start = max(now, self._next_start) + self._interval
+            if wait > 0:
+                await asyncio.sleep(wait)
+        return self
+
+    async def __aexit__(self, *exc):
+        self._semaphore.release()
+
+
+class _ClientState:
+    """共享的httpx客户端和各域名的限流器，AsyncClient和asyncio原语都绑定事件循环，事件循环变化时重新创建"""
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.client: Optional[httpx.AsyncClient] = None
+        self.limiters: Dict[str, _HostLimiter] = {}
+
+
+_state = _ClientState()
+
 
-@cache_decorator
-def sogou_weixin_search(query: str) -> List[Dict[str, str]]:
-    """在搜狗微信搜索中搜索指定关键词并返回结果列表"""
+def _get_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    if _state.client is None or _state.loop is not loop:
+        _state.loop = loop
+        _state.limiters = {}
+        _state.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(WEIXIN_TIMEOUT),
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            follow_redirects=True,
+        )
+    return _state.client
+
+
+def _get_limiter(url: str) -> _HostLimiter:
+    host = urlsplit(url).netloc
+    limiter = _state.limiters.get(host)
+    if limiter is None:
+        limiter = _state.limiters[host] = _HostLimiter(WEIXIN_HOST_CONCURRENCY, WEIXIN_HOST_INTERVAL)
+    return limiter
+
+
+async def _get(url: str, **kwargs) -> httpx.Response:
+    """使用共享客户端发送GET请求，按域名限流"""
+    client = _get_client()
+    async with _get_limiter(url):
+        return await client.get(url, **kwargs)
+
+
+async def close_client() -> None:
+    """关闭共享的客户端，服务退出或脚本结束时调用"""
+    if _state.client is not None:
+        await _state.client.aclose()
+        _state.client = None
+        _state.loop = None
+        _state.limiters = {}
+
+
+# 搜索结果会随时间变化，缓存6小时；文章链接和正文基本不变，缓存时间更长
+@async_cache_decorator(ttl=6 * 3600)
+async def sogou_weixin_search(query: str) -> Union[List[Dict[str, str]], Tuple[bool, List]]:
+    """在搜狗微信搜索中搜索指定关键词并返回结果列表，请求失败时返回(False, [])，不写入缓存"""
     headers = {
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
         'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6',
@@ -24,7 +112,7 @@ def sogou_weixin_search(query: str) -> List[Dict[str, str]]:
         'Connection': 'keep-alive',
         'Pragma': 'no-cache',
         'Referer': f'https://weixin.sogou.com/weixin?query={quote(query)}',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36 Edg/137.0.0.0',
+        'User-Agent': USER_AGENT,
     }
 
     params = {
@@ -37,7 +125,7 @@ def sogou_weixin_search(query: str) -> List[Dict[str, str]]:
     }
 
     try:
-        response = requests.get('https://weixin.sogou.com/weixin', params=params, headers=headers)
+        response = await _get('https://weixin.sogou.com/weixin', params=params, headers=headers)
 
         if response.status_code == 200:
             tree = html.fromstring(response.text)
@@ -60,25 +148,28 @@ def sogou_weixin_search(query: str) -> List[Dict[str, str]]:
 
             return results
         else:
-            return []
+            logger.warning(f"搜狗微信搜索失败 {query}: 状态码{response.status_code}")
+            return False, []
     except Exception as e:
-        return []
+        logger.warning(f"搜狗微信搜索失败 {query}: {e}")
+        return False, []
 
-@cache_decorator
-def get_real_url(sogou_url: str) -> str:
-    """从搜狗微信链接获取真实的微信公众号文章链接"""
+@async_cache_decorator(ttl=24 * 3600)
+async def get_real_url(sogou_url: str) -> Union[str, Tuple[bool, str]]:
+    """从搜狗微信链接获取真实的微信公众号文章链接，解析失败时返回(False, "")，不写入缓存"""
     headers = {
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
         'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6',
         'Cache-Control': 'no-cache',
         'Connection': 'keep-alive',
         'Pragma': 'no-cache',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36 Edg/137.0.0.0',
+        'User-Agent': USER_AGENT,
         'Cookie': 'ABTEST=7|1750756616|v1; SUID=0A5BF4788E52A20B00000000685A6D08; IPLOC=CN1100; SUID=605BF4783954A20B00000000685A6D08; SUV=006817F578F45BFE685A6D0B913DA642; SNUID=B3E34CC0B8BF80F5737E3561B9B78454; ariaDefaultTheme=undefined',
     }
 
     try:
-        response = requests.get(sogou_url, headers=headers)
+        # 搜狗返回的是拼接链接的js，不能跟随跳转
+        response = await _get(sogou_url, headers=headers, follow_redirects=False)
 
         script_content = response.text
         start_index = script_content.find("url += '") + len("url += '")
@@ -92,13 +183,17 @@ def get_real_url(sogou_url: str) -> str:
             url_parts.append(part)
             start_index = part_end + 1
 
+        if not url_parts:
+            logger.warning(f"获取真实链接失败 {sogou_url}: 页面中没有文章链接")
+            return False, ""
         full_url = ''.join(url_parts).replace("@", "")
         return "https://mp." + full_url
     except Exception as e:
-        return ""
+        logger.warning(f"获取真实链接失败 {sogou_url}: {e}")
+        return False, ""
 
-@cache_decorator
-def get_article_content(real_url: str, referer: str) -> str:
+@async_cache_decorator(ttl=7 * 24 * 3600)
+async def get_article_content(real_url: str, referer: str) -> str:
     """获取微信公众号文章的正文内容"""
     headers = {
         'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
@@ -115,45 +210,62 @@ def get_article_content(real_url: str, referer: str) -> str:
         'sec-fetch-site': 'cross-site',
         'sec-fetch-user': '?1',
         'upgrade-insecure-requests': '1',
-        'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36 Edg/137.0.0.0',
+        'user-agent': USER_AGENT,
     }
 
     try:
-        response = requests.get(real_url, headers=headers)
+        response = await _get(real_url, headers=headers)
         tree = html.fromstring(response.text)
         content_elements = tree.xpath("//div[@id='js_content']//text()")
         cleaned_content = [text.strip() for text in content_elements if text.strip()]
         main_content = '\n'.join(cleaned_content)
         return main_content
     except Exception as e:
-        return f"获取文章内容失败: {str(e)}"
+        # 返回(False, 错误信息)时不会写入缓存，下次调用重新获取
+        return False, f"获取文章内容失败: {str(e)}"
 
-def get_wechat_article(query: str, number=10):
+
+async def _fetch_article(result: Dict[str, str]) -> Dict[str, Any]:
+    """解析一篇搜索结果的真实链接并获取正文"""
+    sougou_link = result["link"]
+    real_url = await get_real_url(sougou_link)
+    if isinstance(real_url, tuple):
+        real_url = real_url[1]
+    if real_url:
+        # referer：请求来源
+        content = await get_article_content(real_url, referer=sougou_link)
+        if isinstance(content, tuple):
+            content = content[1]
+    else:
+        content = "获取文章内容失败: 无法解析文章链接"
+    return {
+        "title": result["title"],
+        "publish_time": result["publish_time"],
+        "real_url": real_url,
+        "content": content
+    }
+
+
+async def get_wechat_article(query: str, number=10) -> Union[str, List[Dict[str, Any]]]:
     """
-    获取前10篇文章
+    获取前number篇文章，每篇文章的链接解析和正文获取并发执行
     """
     start_time = time.time()
-    results = sogou_weixin_search(query)
+    results = await sogou_weixin_search(query)
+    if isinstance(results, tuple):
+        results = results[1]
     if not results:
         return f"没有搜索到{query}相关的文章"
-    articles = []
-    results = results[:number]
-    for every_result in results:
-        sougou_link = every_result["link"]
-        real_url = get_real_url(sougou_link)
-        # referer：请求来源
-        content = get_article_content(real_url, referer=sougou_link)
-        article = {
-            "title": every_result["title"],
-            "publish_time": every_result["publish_time"],
-            "real_url": real_url,
-            "content": content
-        }
-        articles.append(article)
+    articles = await asyncio.gather(*(_fetch_article(result) for result in results[:number]))
     end_time = time.time()
     print(f"关键词{query}相关的文章已经获取完毕，获取到{len(articles)}篇, 耗时{end_time - start_time}秒")
-    return articles
+    return list(articles)
 
 if __name__ == '__main__':
-    result = get_wechat_article(query="吉利汽车",number=2)
-    print(result)
+    async def main():
+        try:
+            return await get_wechat_article(query="吉利汽车", number=2)
+        finally:
+            await close_client()
+
+    print(asyncio.run(main()))
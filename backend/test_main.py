@@ -73,6 +73,32 @@ class PPTBaseTestCase(unittest.IsolatedAsyncioTestCase):
         print(f"Outline no-stream test took: {time.time() - start_time}s")
         print(f"Server called: {self.host}")
 
+    def test_outline_ttfb_metric(self):
+        """
+        Test the outline time-to-first-byte metric
+        """
+        url = f"{self.base_url}/tools/aippt_outline"
+        data = {
+            "content": "电动汽车发展",
+            "language": "Chinese",
+            "model": "gpt-4",
+            "stream": True
+        }
+        start_time = time.time()
+        first_chunk_time = None
+        with httpx.stream("POST", url, json=data, timeout=None) as response:
+            self.assertEqual(response.status_code, 200)
+            for chunk in response.iter_text():
+                if chunk and first_chunk_time is None:
+                    first_chunk_time = time.time() - start_time
+        print(f"Outline first chunk took: {first_chunk_time}s")
+        response = httpx.get(f"{self.base_url}/metrics")
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        print(f"metrics: {result}")
+        self.assertIn("outline_ttfb", result)
+        self.assertGreaterEqual(result["outline_ttfb"]["count"], 1)
+
     async def test_get_template(self):
         """
         Test getting a template file
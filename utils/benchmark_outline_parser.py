@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2025/9/2 10:40
+# @File  : benchmark_outline_parser.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : 大纲解析器的性能测试，分别测试10、100、1000个章节的大纲，解析是生成PPT前的必经步骤，改动解析器后运行一下，避免性能回退
+
+# 用法: python benchmark_outline_parser.py [--sections 10 100 1000] [--repeat 5] [--chunk-size 8]
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "slide_agent", "slide_agent"))
+from outline_parser import IncrementalSlideParser, parse_markdown_to_slides
+
+
+def build_outline(section_num, subsection_num=3, item_num=5):
+    """构造指定章节数的大纲，每个章节3个小节，每个小节5个条目"""
+    lines = ["# 性能测试大纲", ""]
+    for i in range(section_num):
+        lines.append(f"## 第{i + 1}章 章节标题")
+        for j in range(subsection_num):
+            lines.append(f"### 第{i + 1}.{j + 1}节 小节标题")
+            for k in range(item_num):
+                lines.append(f"- 条目{k + 1}：这里是一段用于测试的要点内容，长度接近真实的大纲")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def parse_streaming(markdown_text, chunk_size):
+    """模拟LLM流式输出，每次传入chunk_size个字符"""
+    parser = IncrementalSlideParser()
+    for start in range(0, len(markdown_text), chunk_size):
+        parser.feed(markdown_text[start:start + chunk_size])
+    parser.close()
+    return parser.slides
+
+
+def run_benchmark(section_nums, repeat, chunk_size):
+    print(f"{'章节数':>8} {'字符数':>10} {'幻灯片数':>8} {'整篇解析(ms)':>14} {'流式解析(ms)':>14}")
+    for section_num in section_nums:
+        markdown_text = build_outline(section_num)
+        slides = parse_markdown_to_slides(markdown_text)
+        assert parse_streaming(markdown_text, chunk_size) == slides, "流式解析和整篇解析的结果不一致"
+        number = max(1, 1000 // section_num)
+        full_cost = min(timeit.repeat(lambda: parse_markdown_to_slides(markdown_text), repeat=repeat, number=number)) / number
+        stream_cost = min(timeit.repeat(lambda: parse_streaming(markdown_text, chunk_size), repeat=repeat, number=number)) / number
+        print(f"{section_num:>8} {len(markdown_text):>10} {len(slides):>8} {full_cost * 1000:>14.3f} {stream_cost * 1000:>14.3f}")
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="大纲解析器性能测试")
+    arg_parser.add_argument("--sections", type=int, nargs="+", default=[10, 100, 1000], help="测试的章节数")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="重复次数，取最快的一次")
+    arg_parser.add_argument("--chunk-size", type=int, default=8, help="流式解析时每次传入的字符数")
+    args = arg_parser.parse_args()
+    run_benchmark(args.sections, args.repeat, args.chunk_size)
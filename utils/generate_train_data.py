@@ -14,11 +14,16 @@ import httpx
 import requests
 import re
 import os
+import sys
+
+# 与slide_agent共用同一个大纲解析器
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "slide_agent", "slide_agent"))
+from outline_parser import parse_markdown_to_slides
 
 def parse_markdown_to_json(markdown_text):
     """
-    Parses a markdown outline into a nested JSON structure.
-    Handles headings (#, ##, ...) and list items (- or *).
+    Parses a markdown outline into the slide JSON used by slide_agent.
+    Text before the first '# ' heading is dropped.
     """
     match = re.search(r"(# .*)", markdown_text, flags=re.DOTALL)
 
@@ -26,64 +31,7 @@ def parse_markdown_to_json(markdown_text):
         result = markdown_text[match.start():]
     else:
         result = markdown_text
-    slides = []
-    lines = result.strip().split('\n')
-
-    # Find title
-    main_title = ""
-    for line in lines:
-        if line.startswith('# '):
-            main_title = line[2:].strip()
-            # Use a generic subtitle
-            slides.append({"type": "cover", "data": {"title": main_title, "text": "A presentation generated by AI"}})
-            break
-
-    # Find sections for contents page
-    sections = []
-    for line in lines:
-        if line.startswith('## '):
-            sections.append(line[2:].strip())
-    if sections:
-        slides.append({"type": "contents", "data": {"items": sections}})
-
-    # Process each section and its subsections
-    current_section_title = ""
-    current_subsection_title = ""
-    current_items = []
-
-    for line in lines:
-        line = line.strip()
-        if line.startswith('## '):
-            if current_subsection_title:
-                slide_items = []
-                for item in current_items:
-                    slide_items.append({"title": item, "text": f"Detailed content about {item}"})
-                slides.append({"type": "content", "data": {"title": current_subsection_title, "items": slide_items}})
-                current_items = []
-
-            current_section_title = line[2:].strip()
-            current_subsection_title = ""
-            slides.append({"type": "transition", "data": {"title": current_section_title, "text": f"Exploring the topic of {current_section_title}"}})
-        elif line.startswith('### '):
-            if current_subsection_title:
-                slide_items = []
-                for item in current_items:
-                    slide_items.append({"title": item, "text": f"Detailed content about {item}"})
-                slides.append({"type": "content", "data": {"title": current_subsection_title, "items": slide_items}})
-                current_items = []
-            current_subsection_title = line[4:].strip()
-        elif line.startswith('- '):
-            if current_subsection_title:
-                current_items.append(line[2:].strip())
-
-    if current_subsection_title:
-        slide_items = []
-        for item in current_items:
-            slide_items.append({"title": item, "text": f"Detailed content about {item}"})
-        slides.append({"type": "content", "data": {"title": current_subsection_title, "items": slide_items}})
-
-    slides.append({"type": "end"})
-    return slides
+    return parse_markdown_to_slides(result)
 
 def generate_data():
     # The backend API is expected to be running.